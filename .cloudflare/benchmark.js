@@ -0,0 +1,279 @@
+/**
+ * Submission latency benchmark for the edit worker
+ *
+ * Runs worker.js in a sandbox with the globals Cloudflare provides, pointed
+ * at an in-process mock GitHub API (mock-github.js) that waits a simulated
+ * round trip on every request. Sends a mix of submissions (suggestions
+ * appended to an existing note, full replacements and new notes, with
+ * non-ASCII text), checks every committed file came out as intended, and
+ * prints p50/p90/p99 submission time and GitHub requests per submission.
+ *
+ * With --queue, the worker gets an in-memory EDIT_QUEUE_KV: submissions are
+ * acknowledged right away and batched into pull requests by the queue
+ * flushes (cron runs are simulated once every submission is acknowledged),
+ * and the status of each submission is read back through /status.
+ *
+ * The worker caches the base branch head and file contents. --cold runs
+ * every submission in a fresh worker instance (empty memory cache),
+ * --cache-kv binds an in-memory GITHUB_CACHE_KV, --ref-cache-seconds sets
+ * how long the head is used before it is revalidated, and --push-every N
+ * pushes a change to the base branch every N submissions, delivering the
+ * signed push webhook (unless --no-webhook).
+ *
+ * Usage:
+ *   node benchmark.js [--submissions 200] [--concurrency 4] [--latency 80] [--jitter 0.25]
+ *                     [--queue] [--flush-size 10] [--cold] [--cache-kv] [--ref-cache-seconds 60]
+ *                     [--push-every N] [--no-webhook]
+ *
+ * Needs Node 18 or later (global fetch); no packages to install.
+ */
+
+const crypto = require('crypto');
+const fs = require('fs');
+const path = require('path');
+const vm = require('vm');
+const { startMockGitHub, MockKV } = require('./mock-github');
+
+const ORIGIN = 'https://compendium.example';
+const WORKER_URL = 'https://worker.example';
+const BASE_BRANCH = 'main';
+const WEBHOOK_SECRET = 'benchmark-secret';
+const FILES = {
+  'Characters/Aldric.md': '# Aldric\n\nA knight of the Silver Order.\n',
+  'Locations/Émerveille.md': '# Émerveille\n\nThe city of lanterns — « la ville des lanternes ».\n'
+};
+
+/**
+ * Load worker.js into a fresh context; returns its event listeners by type
+ */
+function loadWorker(bindings) {
+  const listeners = {};
+  const context = vm.createContext({
+    addEventListener: (type, listener) => {
+      listeners[type] = listener;
+    },
+    fetch, Request, Response, Headers, URL, TextEncoder, TextDecoder, btoa, atob, console,
+    crypto: globalThis.crypto,
+    GITHUB_TOKEN: 'mock-token',
+    GITHUB_REPO: 'mock/repo',
+    GITHUB_BASE_BRANCH: BASE_BRANCH,
+    ALLOWED_ORIGINS: ORIGIN,
+    GITHUB_WEBHOOK_SECRET: WEBHOOK_SECRET,
+    RATE_LIMIT_PER_HOUR: 0,
+    ...bindings
+  });
+  vm.runInContext(fs.readFileSync(path.join(__dirname, 'worker.js'), 'utf8'), context, { filename: 'worker.js' });
+  return listeners;
+}
+
+/**
+ * Dispatch a request to the worker like the runtime does; resolves to its
+ * response. Work passed to waitUntil is collected into background.
+ */
+function dispatch(listeners, request, background) {
+  return new Promise((resolve, reject) => {
+    listeners.fetch({
+      request,
+      respondWith: response => Promise.resolve(response).then(resolve, reject),
+      waitUntil: promise => background.push(promise)
+    });
+  });
+}
+
+/**
+ * Run the worker's cron trigger once
+ */
+function scheduled(listeners) {
+  const work = [];
+  listeners.scheduled({ cron: '* * * * *', scheduledTime: Date.now(), waitUntil: promise => work.push(promise) });
+  return Promise.all(work);
+}
+
+/**
+ * Deliver a signed push webhook for the base branch to the worker
+ */
+async function deliverPush(listeners, oid, background) {
+  const body = JSON.stringify({
+    ref: `refs/heads/${BASE_BRANCH}`,
+    after: oid,
+    deleted: false,
+    repository: { node_id: 'R_mock', full_name: 'mock/repo' }
+  });
+  const signature = crypto.createHmac('sha256', WEBHOOK_SECRET).update(body).digest('hex');
+  const request = new Request(`${WORKER_URL}/webhook`, {
+    method: 'POST',
+    headers: { 'X-GitHub-Event': 'push', 'X-Hub-Signature-256': `sha256=${signature}` },
+    body
+  });
+  const response = await dispatch(listeners, request, background);
+  if (response.status !== 204) {
+    throw new Error(`Webhook rejected: ${response.status}`);
+  }
+}
+
+/**
+ * The n-th submission
+ */
+function submission(n) {
+  const description = `Fix the spelling of « Émerveille » — edit #${n} 🐉`;
+  switch (n % 3) {
+    case 0:
+      return { file: 'Characters/Aldric.md', description };
+    case 1: {
+      const content = `# Émerveille\n\nThe city of lanterns — “la ville des lanternes”, 灯の都. Edit ${n}.\n`;
+      return { file: 'Locations/Émerveille.md', description, content, name: 'Zoë' };
+    }
+    default:
+      return { file: `Characters/New Note ${n}.md`, description };
+  }
+}
+
+/**
+ * The files a pull request should have committed, given its suggestions in
+ * order and the files of the commit it is based on
+ */
+function expectedFiles(suggestions, baseFiles) {
+  const files = new Map();
+  for (const suggestion of suggestions) {
+    const current = files.has(suggestion.file) ? files.get(suggestion.file) : baseFiles.get(suggestion.file) || '';
+    files.set(suggestion.file, suggestion.content || current + `\n\n<!-- Suggested edit: ${suggestion.description} -->`);
+  }
+  return files;
+}
+
+/**
+ * Check the files of every pull request; returns the problems found
+ */
+function verifyPullRequests(repo, submissions) {
+  const byDescription = new Map(submissions.map(body => [body.description, body]));
+  const problems = [];
+  for (const pr of repo.pullRequests) {
+    const commit = repo.commits.get(repo.refs.get(`refs/heads/${pr.head}`));
+    // The commit message lists the batch's descriptions in the order they were applied
+    const suggestions = commit.message.body.split('\n\n').map(description => byDescription.get(description));
+    const baseFiles = repo.commits.get(commit.parent).files;
+    for (const [file, expected] of expectedFiles(suggestions, baseFiles)) {
+      const committed = commit.files.get(file);
+      if (committed !== expected) {
+        problems.push(`PR #${pr.number}: ${file} committed as ${JSON.stringify(committed)}`);
+      }
+    }
+  }
+  return problems;
+}
+
+function percentile(sorted, p) {
+  return sorted[Math.min(sorted.length - 1, Math.ceil(p / 100 * sorted.length) - 1)];
+}
+
+function option(args, name, fallback) {
+  const index = args.indexOf(`--${name}`);
+  return index === -1 ? fallback : Number(args[index + 1]);
+}
+
+async function main() {
+  const args = process.argv.slice(2);
+  const submissions = option(args, 'submissions', 200);
+  const concurrency = option(args, 'concurrency', 4);
+  const latency = option(args, 'latency', 80);
+  const jitter = option(args, 'jitter', 0.25);
+  const queue = args.includes('--queue');
+  const cold = args.includes('--cold');
+  const pushEvery = option(args, 'push-every', 0);
+  const webhook = !args.includes('--no-webhook');
+
+  const mock = await startMockGitHub({ latency, jitter, baseBranch: BASE_BRANCH, files: FILES });
+  const kv = new MockKV();
+  const cacheKv = new MockKV();
+  const bindings = { GITHUB_API_URL: mock.url, REF_CACHE_SECONDS: option(args, 'ref-cache-seconds', 60) };
+  if (queue) {
+    bindings.EDIT_QUEUE_KV = kv;
+    bindings.QUEUE_FLUSH_SIZE = option(args, 'flush-size', 10);
+  }
+  if (args.includes('--cache-kv')) {
+    bindings.GITHUB_CACHE_KV = cacheKv;
+  }
+  let listeners = loadWorker(bindings);
+  let pushes = 0;
+  const sent = [];
+  const timings = [];
+  const failures = [];
+  const background = [];
+  const tokens = [];
+  let next = 0;
+
+  const run = async () => {
+    while (next < submissions) {
+      const n = next++;
+      if (pushEvery && n && n % pushEvery === 0) {
+        const oid = mock.push({ 'Characters/Aldric.md': `# Aldric\n\nA knight of the Silver Order. Push ${++pushes}.\n` });
+        if (webhook) {
+          await deliverPush(listeners, oid, background);
+        }
+      }
+      if (cold) {
+        listeners = loadWorker(bindings);
+      }
+      const body = submission(n);
+      sent.push(body);
+      const request = new Request(`${WORKER_URL}/`, {
+        method: 'POST',
+        headers: { 'Origin': ORIGIN, 'Content-Type': 'application/json', 'CF-Connecting-IP': '203.0.113.1' },
+        body: JSON.stringify(body)
+      });
+
+      const start = performance.now();
+      const response = await dispatch(listeners, request, background);
+      const result = await response.json();
+      timings.push(performance.now() - start);
+
+      if (!result.success) {
+        failures.push(`${body.description}: ${result.error}`);
+      } else if (result.queued) {
+        tokens.push(result.token);
+      }
+    }
+  };
+  const started = performance.now();
+  await Promise.all(Array.from({ length: concurrency }, run));
+
+  if (queue) {
+    // Let flushes started by submissions finish, then run the cron until the queue is empty
+    await Promise.all(background);
+    for (let runs = 0; runs < submissions && (await kv.list({ prefix: 'queue:' })).keys.length; runs++) {
+      await scheduled(listeners);
+    }
+    for (const token of tokens) {
+      const request = new Request(`${WORKER_URL}/status?token=${token}`, { headers: { 'Origin': ORIGIN } });
+      const status = await (await dispatch(listeners, request, background)).json();
+      if (status.status !== 'submitted') {
+        failures.push(`${token}: ${JSON.stringify(status)}`);
+      }
+    }
+  }
+  const elapsed = performance.now() - started;
+  await mock.close();
+  failures.push(...verifyPullRequests(mock.repo, sent));
+
+  const sorted = timings.slice().sort((a, b) => a - b);
+  const requests = Object.values(mock.repo.requests).reduce((sum, count) => sum + count, 0);
+  const ms = value => `${value.toFixed(1)} ms`;
+  console.log(`${submissions} submissions${queue ? ' (queued)' : ''}${cold ? ' (cold instances)' : ''}, ` +
+              `concurrency ${concurrency}, GitHub round trip ${latency} ms ± ${Math.round(jitter * 100)}%` +
+              (pushes ? `, ${pushes} push(es)${webhook ? ' with webhook' : ''}` : ''));
+  console.log(`  ${queue ? 'acknowledged' : 'submitted'}: p50 ${ms(percentile(sorted, 50))}  ` +
+              `p90 ${ms(percentile(sorted, 90))}  p99 ${ms(percentile(sorted, 99))}  max ${ms(sorted[sorted.length - 1])}`);
+  console.log(`  GitHub requests per submission: ${(requests / submissions).toFixed(2)} ` +
+              `(${JSON.stringify(mock.repo.requests)}), ${mock.repo.pullRequests.length} pull request(s)`);
+  if (queue) {
+    console.log(`  all submissions in pull requests after ${ms(elapsed)}, ` +
+                `${(kv.operations / submissions).toFixed(1)} KV operations per submission`);
+  }
+  if (failures.length) {
+    console.log(`  ${failures.length} failed submission(s):`);
+    failures.slice(0, 10).forEach(failure => console.log(`    ${failure}`));
+    process.exitCode = 1;
+  }
+}
+
+main();
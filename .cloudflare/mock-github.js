@@ -0,0 +1,321 @@
+/**
+ * Mock GitHub GraphQL API for the edit worker
+ *
+ * Answers the operations worker.js sends (EditBase, EditSuggestion and
+ * DeleteEditBranch, plus the REST ref lookup it revalidates its cache with)
+ * from an in-memory repository, so submissions can be tested and timed
+ * without a token or network access. Every request waits for a simulated
+ * round trip first.
+ *
+ * Usage:
+ *   node mock-github.js [--port 8788] [--latency 80] [--jitter 0.25]
+ *
+ * Then point the worker at it, e.g. in .dev.vars for `wrangler dev`:
+ *   GITHUB_API_URL=http://localhost:8788
+ *
+ * benchmark.js starts one in-process through startMockGitHub(); MockKV
+ * stands in for the worker's KV namespaces.
+ */
+
+const http = require('http');
+const crypto = require('crypto');
+
+const REPOSITORY_ID = 'R_mock';
+
+/**
+ * Seed files of the mock repository's base branch
+ */
+const SEED_FILES = {
+  'Characters/Aldric.md': '# Aldric\n\nA knight of the Silver Order.\n',
+  'Locations/Émerveille.md': '# Émerveille\n\nThe city of lanterns — « la ville des lanternes ».\n'
+};
+
+/**
+ * Create an in-memory repository with one base branch
+ */
+function createRepository(baseBranch, files) {
+  const oid = crypto.randomBytes(20).toString('hex');
+  return {
+    commits: new Map([[oid, { files: new Map(Object.entries(files)), parent: null }]]),
+    refs: new Map([[`refs/heads/${baseBranch}`, oid]]),
+    refIds: new Map(),
+    pullRequests: [],
+    requests: {}
+  };
+}
+
+/**
+ * Random round trip time: latency in ms, give or take jitter (a fraction of it)
+ */
+function roundTrip(latency, jitter) {
+  const delay = latency * (1 + jitter * (Math.random() * 2 - 1));
+  return new Promise(resolve => setTimeout(resolve, Math.max(0, delay)));
+}
+
+function graphQLError(message) {
+  return { message };
+}
+
+/**
+ * Answer the EditBase query, for the head of $ref or the commit $oid;
+ * file0, file1... are the files at $path0, $path1...
+ */
+function editBase(repo, variables) {
+  const oid = variables.oid || repo.refs.get(variables.ref);
+  if (!repo.commits.has(oid)) {
+    return { data: { repository: { id: REPOSITORY_ID, ref: null, object: null } } };
+  }
+  const commit = { oid };
+  for (let i = 0; `path${i}` in variables; i++) {
+    const text = repo.commits.get(oid).files.get(variables[`path${i}`]);
+    commit[`file${i}`] = text === undefined ? null : { object: { text, isBinary: false, isTruncated: false } };
+  }
+  if (variables.oid) {
+    return { data: { repository: { id: REPOSITORY_ID, object: commit } } };
+  }
+  return { data: { repository: { id: REPOSITORY_ID, ref: { target: commit } } } };
+}
+
+/**
+ * Answer the EditSuggestion mutation; like GitHub, its fields run in order
+ * and a failed field leaves the ones before it applied
+ */
+function editSuggestion(repo, variables) {
+  const data = { createRef: null, createCommitOnBranch: null, createPullRequest: null };
+
+  // createRef
+  if (repo.refs.has(variables.ref)) {
+    return { data, errors: [graphQLError(`Reference already exists: ${variables.ref}`)] };
+  }
+  if (!repo.commits.has(variables.oid)) {
+    return { data, errors: [graphQLError(`Object not found: ${variables.oid}`)] };
+  }
+  const refId = `REF_${crypto.randomBytes(6).toString('hex')}`;
+  repo.refs.set(variables.ref, variables.oid);
+  repo.refIds.set(refId, variables.ref);
+  data.createRef = { ref: { id: refId } };
+
+  // createCommitOnBranch
+  const branchRef = `refs/heads/${variables.branch.branchName}`;
+  const head = repo.refs.get(branchRef);
+  if (head !== variables.oid) {
+    return { data, errors: [graphQLError(`Expected branch to point to ${variables.oid}`)] };
+  }
+  const files = new Map(repo.commits.get(head).files);
+  for (const addition of variables.changes.additions) {
+    // GitHub decodes the contents as bytes; a wrong encoding shows up as mojibake here
+    files.set(addition.path, Buffer.from(addition.contents, 'base64').toString('utf8'));
+  }
+  const oid = crypto.randomBytes(20).toString('hex');
+  repo.commits.set(oid, { files, message: variables.message, parent: head });
+  repo.refs.set(branchRef, oid);
+  data.createCommitOnBranch = { commit: { oid } };
+
+  // createPullRequest
+  const number = repo.pullRequests.length + 1;
+  repo.pullRequests.push({
+    number,
+    base: variables.base,
+    head: variables.head,
+    title: variables.title,
+    body: variables.body
+  });
+  data.createPullRequest = {
+    pullRequest: { number, url: `https://github.com/mock/repo/pull/${number}` }
+  };
+  return { data };
+}
+
+/**
+ * Answer the DeleteEditBranch mutation
+ */
+function deleteEditBranch(repo, variables) {
+  const ref = repo.refIds.get(variables.refId);
+  if (!ref) {
+    return { data: { deleteRef: null }, errors: [graphQLError(`Ref not found: ${variables.refId}`)] };
+  }
+  repo.refs.delete(ref);
+  repo.refIds.delete(variables.refId);
+  return { data: { deleteRef: { clientMutationId: null } } };
+}
+
+/**
+ * Answer GET /repos/{owner}/{name}/git/ref/heads/{branch}, honoring If-None-Match
+ */
+function getRef(repo, branch, ifNoneMatch) {
+  const oid = repo.refs.get(`refs/heads/${branch}`);
+  if (!oid) {
+    return { status: 404, body: { message: 'Not Found' } };
+  }
+  const etag = `W/"${oid}"`;
+  if (ifNoneMatch === etag) {
+    return { status: 304, etag };
+  }
+  return { status: 200, etag, body: { ref: `refs/heads/${branch}`, object: { sha: oid, type: 'commit' } } };
+}
+
+/**
+ * Commit changed files onto a branch of the repository, as a push would;
+ * returns the new head
+ */
+function push(repo, branch, changes) {
+  const ref = `refs/heads/${branch}`;
+  const parent = repo.refs.get(ref);
+  const files = new Map(repo.commits.get(parent).files);
+  for (const [path, text] of Object.entries(changes)) {
+    files.set(path, text);
+  }
+  const oid = crypto.randomBytes(20).toString('hex');
+  repo.commits.set(oid, { files, message: { headline: 'Push' }, parent });
+  repo.refs.set(ref, oid);
+  return oid;
+}
+
+/**
+ * In-memory stand-in for a Workers KV namespace
+ *
+ * Implements the calls worker.js makes (get, put, delete and list), with
+ * expirations. Unlike KV it is strongly consistent.
+ */
+class MockKV {
+  constructor() {
+    this.entries = new Map();
+    this.operations = 0;
+  }
+
+  live(key) {
+    const entry = this.entries.get(key);
+    if (entry && entry.expires && entry.expires <= Date.now()) {
+      this.entries.delete(key);
+      return undefined;
+    }
+    return entry;
+  }
+
+  async get(key, options) {
+    this.operations++;
+    const entry = this.live(key);
+    if (!entry) return null;
+    const type = typeof options === 'string' ? options : (options && options.type) || 'text';
+    return type === 'json' ? JSON.parse(entry.value) : entry.value;
+  }
+
+  async put(key, value, options = {}) {
+    this.operations++;
+    const expires = options.expirationTtl ? Date.now() + options.expirationTtl * 1000 : null;
+    this.entries.set(key, { value: String(value), expires });
+  }
+
+  async delete(key) {
+    this.operations++;
+    this.entries.delete(key);
+  }
+
+  async list(options = {}) {
+    this.operations++;
+    const prefix = options.prefix || '';
+    const limit = options.limit || 1000;
+    const names = [...this.entries.keys()]
+      .filter(name => name.startsWith(prefix) && this.live(name))
+      .sort();
+    const start = options.cursor ? Number(options.cursor) : 0;
+    const keys = names.slice(start, start + limit).map(name => ({ name }));
+    const complete = start + limit >= names.length;
+    return { keys, list_complete: complete, cursor: complete ? undefined : String(start + limit) };
+  }
+}
+
+const OPERATIONS = {
+  EditBase: editBase,
+  EditSuggestion: editSuggestion,
+  DeleteEditBranch: deleteEditBranch
+};
+
+/**
+ * Start a mock GitHub API server
+ *
+ * Options: port (0 picks a free one), latency (ms per round trip), jitter
+ * (fraction of latency), baseBranch, files ({path: text} of the base branch).
+ * Resolves to { url, repo, push(changes), close() }: repo.requests counts
+ * requests per operation, and push() commits {path: text} onto the base branch.
+ */
+function startMockGitHub(options = {}) {
+  const latency = options.latency ?? 80;
+  const jitter = options.jitter ?? 0.25;
+  const baseBranch = options.baseBranch || 'main';
+  const repo = createRepository(baseBranch, options.files || SEED_FILES);
+
+  const server = http.createServer((req, res) => {
+    const chunks = [];
+    req.on('data', chunk => chunks.push(chunk));
+    req.on('end', async () => {
+      await roundTrip(latency, jitter);
+      const reply = (status, body, headers = {}) => {
+        res.writeHead(status, { 'Content-Type': 'application/json', ...headers });
+        res.end(body === undefined ? '' : JSON.stringify(body));
+      };
+
+      if (!/^bearer \S+/i.test(req.headers.authorization || '')) {
+        return reply(401, { message: 'Bad credentials' });
+      }
+      const refPath = req.method === 'GET' && req.url.match(/^\/repos\/[^/]+\/[^/]+\/git\/ref\/heads\/(.+)$/);
+      if (refPath) {
+        const answer = getRef(repo, decodeURIComponent(refPath[1]), req.headers['if-none-match']);
+        const counter = answer.status === 304 ? 'GetRef (not modified)' : 'GetRef';
+        repo.requests[counter] = (repo.requests[counter] || 0) + 1;
+        return reply(answer.status, answer.body, answer.etag ? { 'ETag': answer.etag } : {});
+      }
+      if (req.method !== 'POST' || req.url !== '/graphql') {
+        return reply(404, { message: 'Not Found' });
+      }
+
+      let request;
+      try {
+        request = JSON.parse(Buffer.concat(chunks).toString('utf8'));
+      } catch (e) {
+        return reply(400, { message: 'Problems parsing JSON' });
+      }
+      const operation = OPERATIONS[request.operationName];
+      if (!operation) {
+        return reply(200, { errors: [graphQLError(`Unknown operation: ${request.operationName}`)] });
+      }
+      repo.requests[request.operationName] = (repo.requests[request.operationName] || 0) + 1;
+      reply(200, operation(repo, request.variables || {}));
+    });
+  });
+
+  return new Promise(resolve => {
+    server.listen(options.port || 0, '127.0.0.1', () => {
+      resolve({
+        url: `http://127.0.0.1:${server.address().port}`,
+        repo,
+        push: changes => push(repo, baseBranch, changes),
+        close: () => new Promise(done => {
+          server.closeAllConnections();
+          server.close(done);
+        })
+      });
+    });
+  });
+}
+
+/**
+ * Read a --name value option from the command line
+ */
+function option(args, name, fallback) {
+  const index = args.indexOf(`--${name}`);
+  return index === -1 ? fallback : Number(args[index + 1]);
+}
+
+module.exports = { startMockGitHub, MockKV };
+
+if (require.main === module) {
+  const args = process.argv.slice(2);
+  startMockGitHub({
+    port: option(args, 'port', 8788),
+    latency: option(args, 'latency', 80),
+    jitter: option(args, 'jitter', 0.25)
+  }).then(mock => {
+    console.log(`Mock GitHub API listening on ${mock.url}`);
+  });
+}
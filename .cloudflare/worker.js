@@ -11,6 +11,18 @@
  * 
  * Optional Environment Variables:
  * - RATE_LIMIT_PER_HOUR: Number of submissions allowed per IP per hour (default: 5)
+ * - GITHUB_API_URL: GitHub API base URL (default: https://api.github.com)
+ * - QUEUE_FLUSH_SIZE: Queued suggestions that trigger a flush before the next cron run (default: 10)
+ * - REF_CACHE_SECONDS: How long a cached base branch head is used before revalidating it (default: 60)
+ * - GITHUB_WEBHOOK_SECRET: Secret of the repository's push webhook (POST /webhook), which
+ *   updates the cached base branch head as soon as it moves
+ *
+ * Optional KV Bindings:
+ * - RATE_LIMIT_KV: Per-IP submission timestamps for rate limiting
+ * - EDIT_QUEUE_KV: Suggestion queue; when bound, suggestions are acknowledged
+ *   right away and opened as pull requests in batches (see flushQueue)
+ * - GITHUB_CACHE_KV: Cache of the base branch head and file contents shared by
+ *   every worker instance (see getEditBase); without it each instance caches its own
  */
 
 // Configuration
@@ -19,48 +31,77 @@ const CONFIG = {
   excludedPaths: ['Journal', 'TODO', 'Feelings', 'Private', 'Templates'],
   rateLimitPerHour: 5,
   maxContentLength: 50000, // 50KB max content size
-  maxDescriptionLength: 2000
+  maxDescriptionLength: 2000,
+  queueFlushSize: 10,
+  maxBatchSize: 25, // Most suggestions turned into one pull request
+  maxFlushAttempts: 3, // Flushes a suggestion may fail before it is dropped
+  statusTtl: 60 * 60 * 24 * 7, // Keep submission statuses for a week
+  refCacheSeconds: 60, // Use the cached base branch head this long before revalidating it
+  refStateTtl: 60 * 60 * 24, // Drop cached base branch heads unused for a day
+  fileCacheTtl: 60 * 60 * 24, // Drop cached file contents unused for a day
+  memoryCacheEntries: 200 // Most cache entries kept in a worker instance's memory
 };
 
 /**
  * Main worker entry point
  */
 addEventListener('fetch', event => {
-  event.respondWith(handleRequest(event.request));
+  event.respondWith(handleRequest(event.request, event));
+});
+
+/**
+ * Cron trigger: open a pull request for the queued suggestions
+ */
+addEventListener('scheduled', event => {
+  event.waitUntil(flushQueue());
 });
 
 /**
  * Handle incoming requests
  */
-async function handleRequest(request) {
+async function handleRequest(request, event) {
   // Handle CORS preflight
   if (request.method === 'OPTIONS') {
     return handleCORS(request);
   }
 
+  // GitHub push webhook (server to server, no Origin)
+  if (request.method === 'POST' && new URL(request.url).pathname === '/webhook') {
+    return handleWebhook(request);
+  }
+
+  // Check CORS
+  const origin = request.headers.get('Origin');
+
+  // Status of a queued submission
+  if (request.method === 'GET' && new URL(request.url).pathname === '/status') {
+    if (!isAllowedOrigin(origin)) {
+      return jsonResponse({ error: 'Origin not allowed' }, 403);
+    }
+    return handleStatus(request, origin);
+  }
+
   // Only allow POST requests
   if (request.method !== 'POST') {
     return jsonResponse({ error: 'Method not allowed' }, 405);
   }
 
-  // Check CORS
-  const origin = request.headers.get('Origin');
   if (!isAllowedOrigin(origin)) {
     return jsonResponse({ error: 'Origin not allowed' }, 403);
   }
 
   try {
-    // Check rate limit
+    // Check rate limit while the request body is parsed
     const ip = request.headers.get('CF-Connecting-IP') || 'unknown';
-    const rateLimitExceeded = await checkRateLimit(ip);
+    const [rateLimitExceeded, body] = await Promise.all([
+      checkRateLimit(ip),
+      request.json()
+    ]);
     if (rateLimitExceeded) {
       return jsonResponse({ 
         error: 'Rate limit exceeded. Please try again later.' 
       }, 429);
     }
-
-    // Parse request body
-    const body = await request.json();
     
     // Validate submission
     const validation = validateSubmission(body);
@@ -68,11 +109,26 @@ async function handleRequest(request) {
       return jsonResponse({ error: validation.error }, 400);
     }
 
+    // Queue the suggestion for the next batch when a queue is bound
+    if (queueEnabled()) {
+      const { token, pending } = await enqueueSubmission(body);
+      event.waitUntil(updateRateLimit(ip));
+      if (pending >= queueFlushSize()) {
+        event.waitUntil(flushQueue());
+      }
+      return jsonResponse({
+        success: true,
+        queued: true,
+        token,
+        statusUrl: `${new URL(request.url).origin}/status?token=${encodeURIComponent(token)}`
+      }, 202, origin);
+    }
+
     // Create pull request
-    const result = await createPullRequest(body);
+    const result = await createPullRequest([body]);
     
-    // Update rate limit
-    await updateRateLimit(ip);
+    // Update rate limit after the response is sent
+    event.waitUntil(updateRateLimit(ip));
 
     // Return success response with CORS headers
     return jsonResponse({
@@ -139,150 +195,447 @@ function validateSubmission(body) {
 }
 
 /**
- * Create a pull request on GitHub
+ * Base URL of the GitHub API; GITHUB_API_URL points the worker at another
+ * server (e.g. the mock server used by benchmark.js)
  */
-async function createPullRequest(submission) {
-  const token = GITHUB_TOKEN; // Environment variable
-  const repo = GITHUB_REPO; // Environment variable (format: "owner/repo")
-  const baseBranch = GITHUB_BASE_BRANCH || 'main'; // Environment variable
-  
-  const [owner, repoName] = repo.split('/');
-  
-  // Create a unique branch name
-  const timestamp = Date.now();
-  const sanitizedFile = submission.file.replace(/[^a-zA-Z0-9]/g, '-').toLowerCase();
-  const branchName = `edit-suggestion/${sanitizedFile}-${timestamp}`;
-  
-  const githubAPI = `https://api.github.com/repos/${repo}`;
+function githubApiUrl() {
+  if (typeof GITHUB_API_URL !== 'undefined' && GITHUB_API_URL) {
+    return GITHUB_API_URL.replace(/\/+$/, '');
+  }
+  return 'https://api.github.com';
+}
+
+/**
+ * Base64-encode text as UTF-8 (btoa alone throws on anything outside Latin-1)
+ */
+function encodeBase64(text) {
+  const bytes = new TextEncoder().encode(text);
+  let binary = '';
+  // Convert in chunks to stay under the engine's argument count limit
+  for (let i = 0; i < bytes.length; i += 0x8000) {
+    binary += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
+  }
+  return btoa(binary);
+}
+
+/**
+ * Run a GitHub GraphQL operation; returns { data, errors }
+ */
+async function githubGraphQL(operationName, query, variables) {
+  const response = await fetch(`${githubApiUrl()}/graphql`, {
+    method: 'POST',
+    headers: {
+      'Authorization': `bearer ${GITHUB_TOKEN}`,
+      'Content-Type': 'application/json',
+      'User-Agent': 'DnD-Compendium-Edit-Bot'
+    },
+    body: JSON.stringify({ query, variables, operationName })
+  });
+
+  if (!response.ok) {
+    const error = await response.text();
+    throw new Error(`GitHub ${operationName} request failed: ${response.status} ${error}`);
+  }
+  return response.json();
+}
+
+/**
+ * Query for the repository, the base branch head (or the commit $oid when
+ * atCommit) and the files at that commit (file0 for $path0, file1 for $path1, ...)
+ */
+function editBaseQuery(fileCount, atCommit) {
+  const paths = [];
+  const files = [];
+  for (let i = 0; i < fileCount; i++) {
+    paths.push(`, $path${i}: String!`);
+    files.push(`
+        file${i}: file(path: $path${i}) {
+          object {
+            ... on Blob { text isBinary isTruncated }
+          }
+        }`);
+  }
+  const commit = `
+      oid
+      ... on Commit {${files.join('')}
+      }`;
+  const target = atCommit
+    ? `object(oid: $oid) {${commit}
+    }`
+    : `ref(qualifiedName: $ref) {
+      target {${commit}
+      }
+    }`;
+  return `
+query EditBase($owner: String!, $name: String!${atCommit ? ', $oid: GitObjectID!' : ', $ref: String!'}${paths.join('')}) {
+  repository(owner: $owner, name: $name) {
+    id
+    ${target}
+  }
+}`;
+}
+
+/**
+ * Read a cache entry: from this instance's memory, then GITHUB_CACHE_KV
+ */
+async function cacheGet(key) {
+  if (memoryCache.has(key)) {
+    return memoryCache.get(key);
+  }
+  if (typeof GITHUB_CACHE_KV === 'undefined') {
+    return null;
+  }
+  const value = await GITHUB_CACHE_KV.get(key, 'json');
+  // File contents never change for a commit, so they can stay in memory
+  if (value !== null && key.startsWith('file:')) {
+    remember(key, value);
+  }
+  return value;
+}
+
+/**
+ * Write a cache entry; ttl is in seconds
+ *
+ * The base branch head only goes to memory when there is no KV namespace,
+ * so that a webhook reaching one instance updates every instance.
+ */
+async function cachePut(key, value, ttl) {
+  if (typeof GITHUB_CACHE_KV === 'undefined') {
+    remember(key, value);
+    return;
+  }
+  if (key.startsWith('file:')) {
+    remember(key, value);
+  }
+  await GITHUB_CACHE_KV.put(key, JSON.stringify(value), { expirationTtl: ttl });
+}
+
+// In-memory cache of this worker instance, oldest entries first
+const memoryCache = new Map();
+
+function remember(key, value) {
+  memoryCache.delete(key);
+  memoryCache.set(key, value);
+  if (memoryCache.size > CONFIG.memoryCacheEntries) {
+    memoryCache.delete(memoryCache.keys().next().value);
+  }
+}
+
+function refCacheSeconds() {
+  if (typeof REF_CACHE_SECONDS !== 'undefined' && REF_CACHE_SECONDS !== '') {
+    return Number(REF_CACHE_SECONDS);
+  }
+  return CONFIG.refCacheSeconds;
+}
+
+function refCacheKey(repo, branch) {
+  return `ref:${repo}:${branch}`;
+}
+
+function fileCacheKey(repo, oid, path) {
+  return `file:${repo}:${oid}:${path}`;
+}
+
+/**
+ * Revalidate a cached base branch head with its ETag
+ *
+ * A 304 answer doesn't count against the GitHub rate limit. Returns the
+ * updated state, or null if GitHub couldn't be asked.
+ */
+async function revalidateRef(repo, branch, state) {
   const headers = {
-    'Authorization': `token ${token}`,
-    'Accept': 'application/vnd.github.v3+json',
-    'Content-Type': 'application/json',
+    'Authorization': `bearer ${GITHUB_TOKEN}`,
+    'Accept': 'application/vnd.github+json',
     'User-Agent': 'DnD-Compendium-Edit-Bot'
   };
+  if (state.etag) {
+    headers['If-None-Match'] = state.etag;
+  }
+  const response = await fetch(`${githubApiUrl()}/repos/${repo}/git/ref/heads/${branch}`, { headers });
+
+  let updated;
+  if (response.status === 304) {
+    updated = { ...state, checkedAt: Date.now() };
+  } else if (response.ok) {
+    const ref = await response.json();
+    updated = { ...state, oid: ref.object.sha, etag: response.headers.get('ETag'), checkedAt: Date.now() };
+  } else {
+    console.error('Failed to revalidate base branch:', response.status);
+    return null;
+  }
+  await cachePut(refCacheKey(repo, branch), updated, CONFIG.refStateTtl);
+  return updated;
+}
 
-  try {
-    // 1. Get the SHA of the base branch
-    const refResponse = await fetch(`${githubAPI}/git/refs/heads/${baseBranch}`, {
-      headers
-    });
-    
-    if (!refResponse.ok) {
-      throw new Error(`Failed to get base branch: ${refResponse.statusText}`);
-    }
-    
-    const refData = await refResponse.json();
-    const baseSha = refData.object.sha;
-
-    // 2. Create a new branch
-    const createRefResponse = await fetch(`${githubAPI}/git/refs`, {
-      method: 'POST',
-      headers,
-      body: JSON.stringify({
-        ref: `refs/heads/${branchName}`,
-        sha: baseSha
-      })
+/**
+ * Get the repository ID, the base branch head and the text of files at it
+ *
+ * The head is cached for REF_CACHE_SECONDS, then revalidated with its
+ * ETag; the push webhook replaces it as soon as the branch moves. File
+ * contents are cached by commit and path, so they never go stale. Only what
+ * isn't cached is fetched, in one GraphQL query. Returns
+ * { repositoryId, oid, files: Map(path -> text, '' for a missing file) }.
+ */
+async function getEditBase(repo, baseBranch, paths) {
+  const [owner, repoName] = repo.split('/');
+  const refKey = refCacheKey(repo, baseBranch);
+
+  let state = await cacheGet(refKey);
+  if (state && Date.now() - state.checkedAt >= refCacheSeconds() * 1000) {
+    state = await revalidateRef(repo, baseBranch, state);
+  }
+
+  const files = new Map();
+  if (state) {
+    const cached = await Promise.all(paths.map(path => cacheGet(fileCacheKey(repo, state.oid, path))));
+    paths.forEach((path, i) => {
+      if (cached[i] !== null) {
+        files.set(path, cached[i].text);
+      }
     });
+  }
+  const missing = paths.filter(path => !files.has(path));
+  if (state && !missing.length) {
+    return { repositoryId: state.repositoryId, oid: state.oid, files };
+  }
+
+  const variables = { owner, name: repoName };
+  if (state) {
+    variables.oid = state.oid;
+  } else {
+    variables.ref = `refs/heads/${baseBranch}`;
+  }
+  missing.forEach((path, i) => { variables[`path${i}`] = path; });
+  const base = await githubGraphQL('EditBase', editBaseQuery(missing.length, Boolean(state)), variables);
+
+  const repository = base.data && base.data.repository;
+  const commit = repository && (state ? repository.object : repository.ref && repository.ref.target);
+  if (!commit) {
+    throw new Error(`Failed to get base branch: ${JSON.stringify(base.errors || 'not found')}`);
+  }
 
-    if (!createRefResponse.ok) {
-      const error = await createRefResponse.text();
-      throw new Error(`Failed to create branch: ${error}`);
+  const writes = [];
+  if (!state) {
+    state = { repositoryId: repository.id, oid: commit.oid, etag: null, checkedAt: Date.now() };
+    writes.push(cachePut(refKey, state, CONFIG.refStateTtl));
+  }
+  missing.forEach((path, i) => {
+    const file = commit[`file${i}`];
+    const blob = file && file.object;
+    if (blob && (blob.isBinary || blob.isTruncated)) {
+      throw new Error(`Cannot append to ${path}: file is binary or too large`);
     }
+    // A file that doesn't exist yet starts out empty
+    const text = (blob && blob.text) || '';
+    files.set(path, text);
+    writes.push(cachePut(fileCacheKey(repo, state.oid, path), { text }, CONFIG.fileCacheTtl));
+  });
+  await Promise.all(writes);
+  return { repositoryId: state.repositoryId, oid: state.oid, files };
+}
 
-    // 3. Get current file content (if it exists)
-    let currentContent = '';
-    let currentSha = null;
-    
-    try {
-      const fileResponse = await fetch(`${githubAPI}/contents/${submission.file}?ref=${baseBranch}`, {
-        headers
-      });
-      
-      if (fileResponse.ok) {
-        const fileData = await fileResponse.json();
-        currentSha = fileData.sha;
-        // Decode base64 content safely
-        try {
-          currentContent = atob(fileData.content);
-        } catch (e) {
-          // If atob fails (e.g., invalid base64), treat as empty
-          console.error('Failed to decode file content:', e);
-          currentContent = '';
-        }
-      }
-    } catch (e) {
-      // File doesn't exist yet, which is fine
+/**
+ * Check a webhook delivery's X-Hub-Signature-256 header
+ */
+async function verifyWebhookSignature(body, signature) {
+  if (!signature || !signature.startsWith('sha256=')) {
+    return false;
+  }
+  const hex = signature.slice('sha256='.length);
+  if (!/^[0-9a-f]{64}$/i.test(hex)) {
+    return false;
+  }
+  const encoder = new TextEncoder();
+  const key = await crypto.subtle.importKey(
+    'raw', encoder.encode(GITHUB_WEBHOOK_SECRET), { name: 'HMAC', hash: 'SHA-256' }, false, ['verify']
+  );
+  const bytes = new Uint8Array(hex.match(/../g).map(byte => parseInt(byte, 16)));
+  return crypto.subtle.verify('HMAC', key, bytes, encoder.encode(body));
+}
+
+/**
+ * Handle the repository's push webhook: cache the new base branch head
+ */
+async function handleWebhook(request) {
+  if (typeof GITHUB_WEBHOOK_SECRET === 'undefined' || !GITHUB_WEBHOOK_SECRET) {
+    return jsonResponse({ error: 'Not found' }, 404);
+  }
+  const body = await request.text();
+  if (!await verifyWebhookSignature(body, request.headers.get('X-Hub-Signature-256'))) {
+    return jsonResponse({ error: 'Invalid signature' }, 401);
+  }
+  if (request.headers.get('X-GitHub-Event') !== 'push') {
+    return new Response(null, { status: 204 });
+  }
+
+  const push = JSON.parse(body);
+  const baseBranch = GITHUB_BASE_BRANCH || 'main';
+  if (push.ref === `refs/heads/${baseBranch}` && !push.deleted) {
+    await cachePut(refCacheKey(GITHUB_REPO, baseBranch), {
+      repositoryId: push.repository.node_id,
+      oid: push.after,
+      etag: null,
+      checkedAt: Date.now()
+    }, CONFIG.refStateTtl);
+  }
+  return new Response(null, { status: 204 });
+}
+
+// Top-level mutation fields run one after another, so the branch exists before
+// the commit goes on it, and the commit before the pull request is opened
+const EDIT_SUGGESTION_MUTATION = `
+mutation EditSuggestion($repositoryId: ID!, $ref: String!, $oid: GitObjectID!, $branch: CommittableBranch!,
+                        $message: CommitMessage!, $changes: FileChanges!, $base: String!, $head: String!,
+                        $title: String!, $body: String!) {
+  createRef(input: {repositoryId: $repositoryId, name: $ref, oid: $oid}) {
+    ref { id }
+  }
+  createCommitOnBranch(input: {branch: $branch, message: $message, fileChanges: $changes, expectedHeadOid: $oid}) {
+    commit { oid }
+  }
+  createPullRequest(input: {repositoryId: $repositoryId, baseRefName: $base, headRefName: $head,
+                            title: $title, body: $body}) {
+    pullRequest { number url }
+  }
+}`;
+
+const DELETE_REF_MUTATION = `
+mutation DeleteEditBranch($refId: ID!) {
+  deleteRef(input: {refId: $refId}) { clientMutationId }
+}`;
+
+/**
+ * Suggestions grouped by file, in submission order
+ */
+function groupByFile(submissions) {
+  const files = new Map();
+  for (const submission of submissions) {
+    if (!files.has(submission.file)) {
+      files.set(submission.file, []);
     }
+    files.get(submission.file).push(submission);
+  }
+  return files;
+}
 
-    // 4. Prepare new content
-    let newContent;
-    if (submission.content) {
+/**
+ * Apply a file's suggestions in order: full content replaces the file, a
+ * description alone is appended to it as a comment
+ */
+function applySuggestions(currentContent, suggestions) {
+  let content = currentContent;
+  for (const suggestion of suggestions) {
+    if (suggestion.content) {
       // User provided full content
-      newContent = submission.content;
+      content = suggestion.content;
     } else {
       // User only provided description, append as comment
       // Sanitize description to prevent comment injection
-      const sanitizedDescription = submission.description
+      const sanitizedDescription = suggestion.description
         .replace(/-->/g, '-- >')
         .replace(/<!--/g, '<! --');
-      newContent = currentContent + `\n\n<!-- Suggested edit: ${sanitizedDescription} -->`;
+      content = content + `\n\n<!-- Suggested edit: ${sanitizedDescription} -->`;
     }
+  }
+  return content;
+}
 
-    // 5. Create or update file in the new branch
-    const updateFileResponse = await fetch(`${githubAPI}/contents/${submission.file}`, {
-      method: 'PUT',
-      headers,
-      body: JSON.stringify({
-        message: `Edit suggestion: ${submission.file}\n\n${submission.description}`,
-        content: btoa(newContent), // Encode to base64
-        branch: branchName,
-        sha: currentSha // Include if updating existing file
-      })
-    });
-
-    if (!updateFileResponse.ok) {
-      const error = await updateFileResponse.text();
-      throw new Error(`Failed to update file: ${error}`);
-    }
-
-    // 6. Create pull request
-    const prBody = `
-## Edit Suggestion
-
+/**
+ * Pull request body listing every suggestion of a batch
+ */
+function pullRequestBody(submissions) {
+  const heading = submissions.length === 1 ? '## Edit Suggestion' : `## Edit Suggestions (${submissions.length})`;
+  const suggestions = submissions.map(submission => `
 **Submitted by:** ${submission.name || 'Anonymous Contributor'}
 
 **Description:**
 ${submission.description}
 
 **File:** \`${submission.file}\`
+`.trim());
+
+  return `
+${heading}
+
+${suggestions.join('\n\n---\n\n')}
 
 ---
 
-This edit was submitted via the anonymous edit suggestion feature.
+${submissions.length === 1 ? 'This edit was' : 'These edits were'} submitted via the anonymous edit suggestion feature.
 Please review the changes and merge if appropriate.
-    `.trim();
-
-    const createPRResponse = await fetch(`${githubAPI}/pulls`, {
-      method: 'POST',
-      headers,
-      body: JSON.stringify({
-        title: `Edit suggestion: ${submission.file}`,
-        head: branchName,
-        base: baseBranch,
-        body: prBody
-      })
+  `.trim();
+}
+
+/**
+ * Create a pull request on GitHub
+ *
+ * Suggestions for the same file are applied in order and committed
+ * together, so a batch makes one commit and one pull request. Takes at
+ * most two round trips to GitHub whatever the batch size: one query for
+ * the base commit (and the current text of the files suggestions are
+ * appended to), skipped when they are cached (see getEditBase), then one
+ * request that creates the branch, commits the files onto it and opens the
+ * pull request. File contents travel as UTF-8 text and UTF-8 base64.
+ */
+async function createPullRequest(submissions) {
+  const repo = GITHUB_REPO; // Environment variable (format: "owner/repo")
+  const baseBranch = GITHUB_BASE_BRANCH || 'main'; // Environment variable
+
+  const files = groupByFile(submissions);
+  const paths = [...files.keys()];
+
+  // Create a unique branch name (the suffix keeps simultaneous edits of a file apart)
+  const timestamp = Date.now();
+  const suffix = Math.random().toString(36).slice(2, 8);
+  const sanitizedFile = paths.length === 1 ? paths[0].replace(/[^a-zA-Z0-9]/g, '-').toLowerCase() : 'batch';
+  const branchName = `edit-suggestion/${sanitizedFile}-${timestamp}-${suffix}`;
+
+  // Files whose first suggestion is appended need their current text
+  const appendedPaths = paths.filter(path => !files.get(path)[0].content);
+
+  try {
+    // 1. Get the base branch head, plus the current files we append to
+    const base = await getEditBase(repo, baseBranch, appendedPaths);
+
+    // 2. Prepare new content
+    const additions = paths.map(path => ({
+      path,
+      contents: encodeBase64(applySuggestions(base.files.get(path) || '', files.get(path)))
+    }));
+
+    const title = paths.length === 1
+      ? `Edit suggestion${submissions.length === 1 ? '' : 's'}: ${paths[0]}`
+      : `Edit suggestions: ${paths.length} files`;
+
+    // 3. Create the branch, commit the files onto it and open the pull request
+    const result = await githubGraphQL('EditSuggestion', EDIT_SUGGESTION_MUTATION, {
+      repositoryId: base.repositoryId,
+      ref: `refs/heads/${branchName}`,
+      oid: base.oid,
+      branch: { repositoryNameWithOwner: repo, branchName },
+      message: { headline: title, body: submissions.map(submission => submission.description).join('\n\n') },
+      changes: { additions },
+      base: baseBranch,
+      head: branchName,
+      title,
+      body: pullRequestBody(submissions)
     });
 
-    if (!createPRResponse.ok) {
-      const error = await createPRResponse.text();
-      throw new Error(`Failed to create PR: ${error}`);
+    const data = result.data || {};
+    const pullRequest = data.createPullRequest && data.createPullRequest.pullRequest;
+    if (result.errors || !pullRequest) {
+      // Don't leave a half-made suggestion branch behind
+      const ref = data.createRef && data.createRef.ref;
+      if (ref) {
+        await githubGraphQL('DeleteEditBranch', DELETE_REF_MUTATION, { refId: ref.id })
+          .catch(e => console.error('Failed to delete branch:', e));
+      }
+      throw new Error(`Failed to create PR: ${JSON.stringify(result.errors)}`);
     }
 
-    const prData = await createPRResponse.json();
-    
     return {
-      number: prData.number,
-      html_url: prData.html_url
+      number: pullRequest.number,
+      html_url: pullRequest.url
     };
 
   } catch (error) {
@@ -291,6 +644,150 @@ Please review the changes and merge if appropriate.
   }
 }
 
+/**
+ * Check if suggestions are queued instead of submitted right away
+ */
+function queueEnabled() {
+  return typeof EDIT_QUEUE_KV !== 'undefined';
+}
+
+function queueFlushSize() {
+  return (typeof QUEUE_FLUSH_SIZE !== 'undefined' && Number(QUEUE_FLUSH_SIZE)) || CONFIG.queueFlushSize;
+}
+
+/**
+ * Queue a validated suggestion
+ *
+ * Each suggestion is its own key, named so that listing the queue returns
+ * suggestions in the order they arrived. Returns its status token and the
+ * number of queued suggestions (up to the flush size).
+ */
+async function enqueueSubmission(submission) {
+  const token = crypto.randomUUID();
+  const key = `queue:${String(Date.now()).padStart(15, '0')}-${token}`;
+  const submissionFields = {
+    file: submission.file,
+    description: submission.description,
+    content: submission.content || '',
+    name: submission.name || ''
+  };
+
+  await Promise.all([
+    EDIT_QUEUE_KV.put(key, JSON.stringify({ token, submission: submissionFields, attempts: 0 })),
+    setStatus(token, { status: 'queued' })
+  ]);
+  const queued = await EDIT_QUEUE_KV.list({ prefix: 'queue:', limit: queueFlushSize() });
+  return { token, pending: queued.keys.length };
+}
+
+function setStatus(token, status) {
+  return EDIT_QUEUE_KV.put(`status:${token}`, JSON.stringify(status), { expirationTtl: CONFIG.statusTtl });
+}
+
+/**
+ * Mark queued suggestions as submitted in a pull request and take them off the queue
+ */
+function markSubmitted(entries, result) {
+  const status = { status: 'submitted', pullRequestNumber: result.number, pullRequestUrl: result.html_url };
+  return Promise.all(entries.map(entry => Promise.all([
+    setStatus(entry.token, status),
+    EDIT_QUEUE_KV.delete(entry.key)
+  ])));
+}
+
+/**
+ * Count a failed attempt of a queued suggestion; it is kept for the next
+ * flush, or marked failed and dropped after maxFlushAttempts
+ */
+function markFailed(entry) {
+  if (entry.attempts + 1 >= CONFIG.maxFlushAttempts) {
+    return Promise.all([
+      setStatus(entry.token, { status: 'failed' }),
+      EDIT_QUEUE_KV.delete(entry.key)
+    ]);
+  }
+  return EDIT_QUEUE_KV.put(entry.key, JSON.stringify({
+    token: entry.token,
+    submission: entry.submission,
+    attempts: entry.attempts + 1
+  }));
+}
+
+/**
+ * Open one pull request for the oldest queued suggestions
+ *
+ * Run by the cron trigger, and after a submission fills the queue up to
+ * QUEUE_FLUSH_SIZE. If the batch's pull request can't be made, each
+ * suggestion is submitted on its own, so one bad suggestion (say, a
+ * description appended to a binary file) doesn't hold back or drop the
+ * others; only the ones that fail again count an attempt. KV has no
+ * transactions: the lock key only keeps overlapping flushes apart on a
+ * best-effort basis, and a suggestion stays queued until its pull request
+ * exists (or it failed maxFlushAttempts times).
+ */
+async function flushQueue() {
+  if (!queueEnabled()) {
+    return;
+  }
+  if (await EDIT_QUEUE_KV.get('queue-lock')) {
+    return;
+  }
+  // 60 seconds is the shortest expiration KV allows
+  await EDIT_QUEUE_KV.put('queue-lock', String(Date.now()), { expirationTtl: 60 });
+
+  try {
+    const queued = await EDIT_QUEUE_KV.list({ prefix: 'queue:', limit: CONFIG.maxBatchSize });
+    const entries = (await Promise.all(queued.keys.map(async key => {
+      const entry = await EDIT_QUEUE_KV.get(key.name, 'json');
+      return entry && { key: key.name, ...entry };
+    }))).filter(entry => entry);
+    if (!entries.length) {
+      return;
+    }
+
+    try {
+      const result = await createPullRequest(entries.map(entry => entry.submission));
+      await markSubmitted(entries, result);
+      return;
+    } catch (error) {
+      if (entries.length === 1) {
+        console.error('Queue flush error:', error);
+        await markFailed(entries[0]);
+        return;
+      }
+      console.error('Queue flush error, submitting the suggestions one by one:', error);
+    }
+
+    // One at a time, like the suggestions that arrive without a queue
+    for (const entry of entries) {
+      try {
+        await markSubmitted([entry], await createPullRequest([entry.submission]));
+      } catch (error) {
+        console.error(`Queued suggestion for ${entry.submission.file} failed:`, error);
+        // Retry on the next flush; give up on suggestions that keep failing
+        await markFailed(entry);
+      }
+    }
+  } finally {
+    await EDIT_QUEUE_KV.delete('queue-lock');
+  }
+}
+
+/**
+ * Return the status of a queued submission
+ */
+async function handleStatus(request, origin) {
+  const token = new URL(request.url).searchParams.get('token');
+  if (!queueEnabled() || !token) {
+    return jsonResponse({ error: 'Unknown submission' }, 404, origin);
+  }
+  const status = await EDIT_QUEUE_KV.get(`status:${token}`, 'json');
+  if (!status) {
+    return jsonResponse({ error: 'Unknown submission' }, 404, origin);
+  }
+  return jsonResponse(status, 200, origin);
+}
+
 /**
  * Check if origin is allowed
  */
@@ -314,7 +811,7 @@ function handleCORS(request) {
   return new Response(null, {
     headers: {
       'Access-Control-Allow-Origin': origin,
-      'Access-Control-Allow-Methods': 'POST, OPTIONS',
+      'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
       'Access-Control-Allow-Headers': 'Content-Type',
       'Access-Control-Max-Age': '86400'
     }
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Link unlinked mentions of notes, in one pass over each page.
+
+Every note name of the build (the mapping), plus the aliases set in info
+boxes (an Alias, Aliases or AKA field, comma-separated), is compiled once
+per build into a single Aho-Corasick automaton. Each page is then scanned
+once, in time linear in its length however many names there are, and the
+first mention of every note it doesn't link to yet becomes a wikilink
+([[Name]], or [[Name|mention]] for aliases), which the wikilinks stage
+converts like any other.
+
+Mentions are matched case-sensitively and on word boundaries. Headings,
+code blocks, inline code, existing links, HTML (such as info boxes) and
+URLs are left alone, and so are names shared by several notes or shorter
+than MIN_NAME_LENGTH.
+"""
+
+import hashlib
+import json
+import re
+from collections import deque
+
+from convert_wikilinks import extract_link_targets
+
+# Shorter names match too many ordinary words
+MIN_NAME_LENGTH = 4
+
+# Info box fields listing other names of a note (compared case-insensitively)
+ALIAS_FIELDS = {'alias', 'aliases', 'aka', 'also known as'}
+
+# Characters that would break the wikilink written for a name
+UNSAFE_NAME = re.compile(r'[\[\]|#^\n]')
+
+FENCE = re.compile(r'^\s{0,3}(```|~~~)')
+
+# Parts of a line that are never linked: inline code, wikilinks, markdown links and images, HTML tags and URLs
+PROTECTED = re.compile(r'(`+).*?\1|!?\[\[[^\]]*\]\]|!?\[[^\]]*\]\([^)]*\)|<[^>]+>|\b\w+://\S+')
+
+
+class Automaton:
+    """
+    Aho-Corasick automaton over a list of words.
+
+    States are indexes into goto (char -> next state), fail (the longest
+    proper suffix that is also a state) and out (indexes of the words ending
+    at a state, longest first).
+    """
+
+    def __init__(self, words):
+        self.words = list(words)
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for index, word in enumerate(self.words):
+            state = 0
+            for char in word:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = self.goto[state][char] = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                state = next_state
+            self.out[state].append(index)
+
+        # Breadth first, so every fail target is complete before it is used
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[next_state] = target if target != next_state else 0
+                self.out[next_state] = self.out[next_state] + self.out[self.fail[next_state]]
+
+    def matches(self, text, start=0, end=None):
+        """Yield (start, end, word index) of every occurrence of a word in text[start:end]."""
+        goto = self.goto
+        fail = self.fail
+        out = self.out
+        words = self.words
+        state = 0
+        for position in range(start, len(text) if end is None else end):
+            char = text[position]
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in out[state]:
+                yield position + 1 - len(words[index]), position + 1, index
+
+
+def is_word_char(char):
+    return char.isalnum() or char == '_'
+
+
+def alias_values(value):
+    """Split an alias field into names, dropping wikilink brackets and quotes."""
+    aliases = []
+    for alias in value.split(','):
+        alias = alias.strip().strip('"\'')
+        if alias.startswith('[[') and alias.endswith(']]'):
+            alias = alias[2:-2].split('|')[-1]
+        aliases.append(alias.strip())
+    return aliases
+
+
+def collect_names(resolver, pages):
+    """
+    Return {text to match: (note name to link, output path)} for a build.
+
+    Args:
+        resolver: The LinkResolver of the build (its mapping holds every note name)
+        pages: (key, output, metadata) of every note, as for DataviewIndex
+    """
+    ambiguous = resolver.ambiguous_names()
+    # Output path -> the name a wikilink reaches it by
+    names_by_output = {}
+    for name, output in resolver.mapping.items():
+        if name not in ambiguous and resolver.resolve(name) == output:
+            names_by_output.setdefault(output, name)
+
+    found = {}
+
+    def add(text, output):
+        if len(text) < MIN_NAME_LENGTH or UNSAFE_NAME.search(text) or output not in names_by_output:
+            return
+        # Text naming several notes: don't guess
+        found[text] = output if found.get(text, output) == output else None
+
+    for name, output in resolver.mapping.items():
+        add(name, None if name in ambiguous else output)
+    for key, output, metadata in pages:
+        for field, value in metadata.get('fields', {}).items():
+            if field.strip().casefold() in ALIAS_FIELDS and isinstance(value, str):
+                for alias in alias_values(value):
+                    add(alias, output)
+    return {text: (names_by_output[output], output) for text, output in sorted(found.items()) if output is not None}
+
+
+class Autolinker:
+    """Links the first unlinked mention of every note on a page; built once per build."""
+
+    def __init__(self, names):
+        self.names = names
+        self.texts = list(names)
+        self.automaton = Automaton(self.texts)
+
+    def mentions(self, text, start=0, end=None):
+        """Yield (start, end, text index) of every whole-word mention in text[start:end], leftmost longest first."""
+        found = sorted(((match_start, -match_end, index) for match_start, match_end, index
+                        in self.automaton.matches(text, start, end)
+                        if (match_start == 0 or not is_word_char(text[match_start - 1]))
+                        and (match_end == len(text) or not is_word_char(text[match_end]))))
+        last_end = start
+        for match_start, negative_end, index in found:
+            if match_start >= last_end:
+                last_end = -negative_end
+                yield match_start, last_end, index
+
+    def fingerprint(self, content):
+        """
+        Return a fingerprint of the names mentioned anywhere in a note's source, or None.
+
+        A page's autolinks can only change when this does (a note it mentions
+        is added, removed or moved), so it goes into the build manifest.
+        """
+        mentioned = sorted({(self.texts[index], self.names[self.texts[index]][1])
+                            for _, _, index in self.mentions(content)})
+        if not mentioned:
+            return None
+        return hashlib.sha256(json.dumps(mentioned).encode('utf-8')).hexdigest()[:16]
+
+    def link(self, content, output, resolver):
+        """Return content with the first mention of every note it doesn't link to yet turned into a wikilink."""
+        linked = {resolver.resolve(target) for target in extract_link_targets(content)}
+        linked.add(output)
+        lines = content.split('\n')
+        in_fence = False
+        for number, line in enumerate(lines):
+            if FENCE.match(line):
+                in_fence = not in_fence
+                continue
+            stripped = line.lstrip()
+            if in_fence or not stripped or stripped.startswith(('#', '<')):
+                continue
+            lines[number] = self.link_line(line, linked, stripped.startswith('|'))
+        return '\n'.join(lines)
+
+    def link_line(self, line, linked, in_table=False):
+        """Link the mentions in the unprotected parts of a line; linked collects the outputs already linked."""
+        parts = []
+        position = 0
+        for protected in list(PROTECTED.finditer(line)) + [None]:
+            end = protected.start() if protected is not None else len(line)
+            for start, match_end, index in self.mentions(line, position, end):
+                text = self.texts[index]
+                name, target = self.names[text]
+                if target in linked:
+                    continue
+                linked.add(target)
+                parts.append(line[position:start])
+                separator = '\\|' if in_table else '|'
+                parts.append(f'[[{name}]]' if text == name else f'[[{name}{separator}{text}]]')
+                position = match_end
+            parts.append(line[position:end])
+            if protected is not None:
+                parts.append(protected.group(0))
+                position = protected.end()
+        return ''.join(parts)
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Benchmark the build stages on reproducible synthetic vaults.
+
+For every vault size (1k notes by default; 10k and 100k on request) this:
+1. Generates a synthetic vault once (same seed, same vault): nested folders
+   with .pages files and section notes, <block> info boxes, wikilinks at
+   roughly the density of the real notes (some aliased, folder-qualified or
+   unresolved), dataview fences and image assets
+2. Runs each stage in a fresh process inside the vault, the way
+   run_local.sh lays it out: scan, reorganize, preprocess, wikilinks and
+   assets (the standalone scripts), then the end-to-end pipeline build and
+   an incremental rebuild with nothing changed
+3. Records wall time (the best of --repeat runs of the whole sequence),
+   peak RSS (including worker processes) and the number of files each
+   stage wrote
+4. Compares the results with a baseline JSON and exits with status 1 on a
+   regression
+
+Usage:
+    benchmark.py [--sizes 1k 10k 100k] [--baseline FILE] [--save-baseline]
+                 [--workdir DIR] [--jobs N] [--repeat N] [--output FILE]
+"""
+
+import argparse
+import contextlib
+import glob
+import json
+import os
+import random
+import shutil
+import struct
+import subprocess
+import sys
+import time
+import zlib
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Bump when the generator changes, so cached vaults are regenerated
+VAULT_VERSION = 1
+
+BASELINE_FORMAT = 1
+
+DEFAULT_BASELINE = os.path.join(SCRIPTS_DIR, 'benchmark_baseline.json')
+
+# Stage -> the directories (relative to the vault) it writes to, in the order they run
+STAGE_OUTPUTS = {
+    'scan': ['.site_content_temp'],
+    'reorganize': ['.site_content'],
+    'preprocess': ['.site_content'],
+    'wikilinks': ['.site_content'],
+    'assets': ['.site_content'],
+    'build': ['.site_content_temp', '.site_build', '.image_cache'],
+    'rebuild': ['.site_content_temp', '.site_build', '.image_cache'],
+}
+STAGES = list(STAGE_OUTPUTS)
+
+# Regressions smaller than this are noise, whatever the ratio
+MIN_SECONDS_DELTA = 0.1
+MIN_RSS_DELTA_MB = 16
+
+SECTIONS = ['Locations', 'NPCs', 'Groups', 'Miscellaneous', 'PCs', 'Maps']
+
+ADJECTIVES = ['Hollow', 'Crimson', 'Gilded', 'Silent', 'Broken', 'Elder', 'Sunken', 'Iron', 'Whispering',
+              'Ashen', 'Verdant', 'Frozen', 'Gloom', 'Bright', 'Thorned', 'Salt', 'Storm', 'Moss']
+NOUNS = ['Root', 'Covenant', 'Tower', 'Hollow', 'Keep', 'Market', 'Warden', 'Blade', 'Grove', 'Harbor',
+         'Crown', 'Lantern', 'Well', 'Pass', 'Spire', 'Sanctum', 'Barrow', 'Ford', 'Kettle', 'Star']
+FIELDS = ['Race', 'Class', 'Occupation', 'Alignment', 'Status', 'Region', 'Founded', 'Population']
+VALUES = ['Human', 'Half-Elf', 'Dwarf', 'Goliath', 'Aasimar', 'Alive', 'Deceased', 'Unknown', 'Chaotic Good',
+          'Lawful Neutral', 'Bartender', 'Druid', 'Merchant']
+WORDS = ('the of and to a in was with that for on as by at from his her they their it an were which '
+         'party storm road village ancient forest river council pact secret guard ruins spell night '
+         'travelled returned fought spoke found hidden beneath beyond north east old stone').split()
+
+
+def parse_size(text):
+    """Parse a vault size such as 1000, 10k or 100k."""
+    text = text.strip().lower()
+    return int(float(text[:-1]) * 1000) if text.endswith('k') else int(text)
+
+
+def size_label(size):
+    return f'{size // 1000}k' if size % 1000 == 0 else str(size)
+
+
+def png_bytes(width, height, color):
+    """Return a valid single-color RGB PNG (no Pillow needed)."""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    row = b'\x00' + bytes(color) * width
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(row * height))
+            + chunk(b'IEND', b''))
+
+
+def generate_vault(vault_dir, note_count, seed=0):
+    """
+    Generate a synthetic vault of note_count notes into vault_dir (deterministic for a seed).
+
+    Skipped when vault_dir already holds the vault for these parameters.
+    """
+    stamp_file = os.path.join(vault_dir, '.benchmark_vault.json')
+    stamp = {'version': VAULT_VERSION, 'notes': note_count, 'seed': seed}
+    if os.path.exists(stamp_file):
+        with open(stamp_file, 'r', encoding='utf-8') as f:
+            if json.load(f) == stamp:
+                return
+    if os.path.exists(vault_dir):
+        shutil.rmtree(vault_dir)
+    os.makedirs(vault_dir)
+    rng = random.Random(seed)
+
+    def title():
+        return f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}'
+
+    # Nested folders (up to four levels), each with a .pages title and a section note
+    folders = list(SECTIONS)
+    while len(folders) < max(len(SECTIONS), note_count // 25):
+        parent = rng.choice(folders)
+        if parent.count('/') < 3:
+            folders.append(f'{parent}/{title()} {len(folders)}')
+    for folder in folders:
+        os.makedirs(os.path.join(vault_dir, folder), exist_ok=True)
+        with open(os.path.join(vault_dir, folder, '.pages'), 'w', encoding='utf-8') as f:
+            f.write(f'title: The {os.path.basename(folder)}\n')
+
+    images = [f'image {i}.png' for i in range(max(5, note_count // 20))]
+    os.makedirs(os.path.join(vault_dir, 'Assets'))
+    for image in images:
+        with open(os.path.join(vault_dir, 'Assets', image), 'wb') as f:
+            f.write(png_bytes(rng.randint(16, 48), rng.randint(16, 48), [rng.randrange(256) for _ in range(3)]))
+
+    notes = [(folder, os.path.basename(folder)) for folder in folders[len(SECTIONS):]]
+    while len(notes) < note_count:
+        # About 1% of names are shared by two notes, like a person and a place
+        name = rng.choice(notes)[1] if notes and rng.random() < 0.01 else f'{title()} {len(notes)}'
+        notes.append((rng.choice(folders), name))
+    notes = notes[:note_count]
+
+    def link():
+        roll = rng.random()
+        folder, name = rng.choice(notes)
+        if roll < 0.03:
+            return f'[[Missing {rng.randrange(1000)}]]'
+        if roll < 0.25:
+            return f'[[{name}|{name.split()[0]}]]'
+        if roll < 0.30:
+            return f'[[{folder}/{name}]]'
+        return f'[[{name}]]'
+
+    def paragraph():
+        words = [rng.choice(WORDS) for _ in range(rng.randint(30, 90))]
+        words[0] = words[0].capitalize()
+        for _ in range(max(1, len(words) // 25)):
+            words.insert(rng.randrange(1, len(words)), link())
+        return ' '.join(words) + '.'
+
+    for folder, name in notes:
+        parts = []
+        if rng.random() < 0.7:
+            lines = [f'![[{rng.choice(images)}]]'] if rng.random() < 0.6 else []
+            for field in rng.sample(FIELDS, rng.randint(2, 5)):
+                lines.append(f'{field}: {link() if rng.random() < 0.3 else rng.choice(VALUES)}')
+            parts.append('<block>\n' + '\n'.join(lines) + '\n</block>')
+        for _ in range(rng.randint(2, 6)):
+            if rng.random() < 0.2:
+                parts.append(f'## {title()}')
+            parts.append(paragraph())
+            if rng.random() < 0.3:
+                parts.append('\n'.join(f'- {link()} {rng.choice(WORDS)}' for _ in range(rng.randint(2, 5))))
+        if rng.random() < 0.03:
+            parts.append(f'```dataview\nTABLE {", ".join(rng.sample(FIELDS, 2))}\nFROM "{rng.choice(SECTIONS)}"\n'
+                         f'WHERE {rng.choice(FIELDS)}\nSORT file.name\n```')
+        if rng.random() < 0.9:
+            parts.append('#wiki')
+        path = os.path.join(vault_dir, folder, name + '.md')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n\n'.join(parts) + '\n')
+
+    with open(stamp_file, 'w', encoding='utf-8') as f:
+        json.dump(stamp, f)
+
+
+def collect_sources():
+    """The scan stage: copy the published notes (and .pages files) into .site_content_temp."""
+    from vault_scanner import copy_notes, scan_vault, walk_vault
+    shutil.rmtree('.site_content_temp', ignore_errors=True)
+    copy_notes('.', '.site_content_temp', scan_vault('.'))
+    copy_notes('.', '.site_content_temp', [path for path in walk_vault('.') if os.path.basename(path) == '.pages'])
+
+
+def run_stage(stage, jobs, responsive_images):
+    """Run one stage in the current directory (the vault)."""
+    if stage == 'scan':
+        collect_sources()
+    elif stage == 'reorganize':
+        from reorganize_files import copy_and_reorganize
+        shutil.rmtree('.site_content', ignore_errors=True)
+        copy_and_reorganize('.site_content_temp', '.site_content', '.site_mapping.json', jobs=jobs)
+    elif stage == 'preprocess':
+        from dataview import index_directory
+        from preprocess_dataviews import process_files
+        files = glob.glob(os.path.join('.site_content', '**', '*.md'), recursive=True)
+        process_files(files, jobs, index_directory('.site_content'))
+    elif stage == 'wikilinks':
+        from convert_wikilinks import load_mapping, process_directory
+        process_directory('.site_content', load_mapping('.site_mapping.json'), jobs=jobs)
+    elif stage == 'assets':
+        from reorganize_files import copy_assets
+        copy_assets('.site_content_temp', '.site_content')
+    else:
+        from build_manifest import BuildManifest
+        from link_graph import LinkGraph
+        from pipeline import build
+        if stage == 'build':
+            for path in ['.site_build', '.site_build_manifest.json', '.site_build_graph.sqlite', '.image_cache']:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                elif os.path.exists(path):
+                    os.remove(path)
+        # End to end, as run_local.sh does it
+        collect_sources()
+        graph = LinkGraph('.site_build_graph.sqlite')
+        build('.site_content_temp', '.site_build', '.site_build_mapping.json',
+              BuildManifest('.site_build_manifest.json'), jobs=jobs, responsive_images=responsive_images,
+              graph=graph, backlinks=True)
+        graph.close()
+
+
+def snapshot(vault_dir, directories):
+    """Return path -> (size, mtime, ctime) of every file in some of the vault's build directories."""
+    files = {}
+    for directory in directories:
+        for root, dirs, filenames in os.walk(os.path.join(vault_dir, directory)):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                st = os.stat(path)
+                # ctime changes on every write, even when copy2 restores the mtime
+                files[path] = (st.st_size, st.st_mtime_ns, st.st_ctime_ns)
+    return files
+
+
+def measure_stage(vault_dir, stage, jobs, responsive_images):
+    """Run a stage in a fresh process; return its seconds, peak RSS and files written."""
+    before = snapshot(vault_dir, STAGE_OUTPUTS[stage])
+    command = [sys.executable, os.path.abspath(__file__), '--run-stage', stage, '--jobs', str(jobs)]
+    if responsive_images:
+        command.append('--responsive-images')
+    result = subprocess.run(command, cwd=vault_dir, capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.stderr.write(result.stdout + result.stderr)
+        raise SystemExit(f"Stage {stage} failed")
+    measured = json.loads(result.stdout.strip().splitlines()[-1])
+    after = snapshot(vault_dir, STAGE_OUTPUTS[stage])
+    measured['files_written'] = sum(1 for path, state in after.items() if before.get(path) != state)
+    return measured
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of regression messages of results against a baseline."""
+    regressions = []
+    for size, stages in results.items():
+        for stage, measured in stages.items():
+            expected = baseline.get(size, {}).get(stage)
+            if expected is None:
+                continue
+            label = f"{size} {stage}"
+            if (measured['seconds'] > expected['seconds'] * (1 + tolerance)
+                    and measured['seconds'] - expected['seconds'] > MIN_SECONDS_DELTA):
+                regressions.append(f"{label}: {expected['seconds']:.2f}s -> {measured['seconds']:.2f}s")
+            if (measured['peak_rss_mb'] > expected['peak_rss_mb'] * (1 + tolerance)
+                    and measured['peak_rss_mb'] - expected['peak_rss_mb'] > MIN_RSS_DELTA_MB):
+                regressions.append(f"{label}: peak RSS {expected['peak_rss_mb']:.0f} MB -> "
+                                   f"{measured['peak_rss_mb']:.0f} MB")
+            # The vault is deterministic, so this one is exact
+            if measured['files_written'] != expected['files_written']:
+                regressions.append(f"{label}: files written {expected['files_written']} -> "
+                                   f"{measured['files_written']}")
+    return regressions
+
+
+def load_baseline(path):
+    """Load a baseline saved with --save-baseline (empty if missing)."""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('format') != BASELINE_FORMAT:
+        print(f"Warning: Ignoring baseline {path} in an old format")
+        return {}
+    return data.get('results', {})
+
+
+def save_baseline(path, results):
+    """Merge results into the baseline file (other sizes are kept)."""
+    merged = load_baseline(path)
+    merged.update(results)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'format': BASELINE_FORMAT, 'results': merged}, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def benchmark(sizes, workdir, seed=0, jobs=1, responsive_images=False, repeat=3):
+    """Generate the vaults and measure every stage; return {size label: {stage: measurements}}."""
+    results = {}
+    for size in sizes:
+        label = size_label(size)
+        vault_dir = os.path.join(workdir, f'vault-{label}')
+        start = time.perf_counter()
+        generate_vault(vault_dir, size, seed)
+        print(f"Vault {label}: ready in {time.perf_counter() - start:.1f}s ({vault_dir})")
+        results[label] = {}
+        # Stages build on each other's output, so the whole sequence is repeated
+        for run in range(repeat):
+            for stage in STAGES:
+                measured = measure_stage(vault_dir, stage, jobs, responsive_images)
+                best = results[label].get(stage)
+                if best is None or measured['seconds'] < best['seconds']:
+                    results[label][stage] = measured
+        for stage, measured in results[label].items():
+            print(f"  {stage:<11} {measured['seconds']:8.2f}s {measured['peak_rss_mb']:8.0f} MB "
+                  f"{measured['files_written']:8d} files written")
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the build stages on synthetic vaults.')
+    parser.add_argument('--sizes', nargs='+', default=['1k'], help='Vault sizes in notes (default: 1k)')
+    parser.add_argument('--seed', type=int, default=0, help='Vault generator seed (default: 0)')
+    parser.add_argument('--workdir', default='.benchmark',
+                        help='Where generated vaults are kept between runs (default: .benchmark)')
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help='Number of worker processes (0 means one per CPU)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Runs of the stage sequence per vault; the fastest counts (default: 3)')
+    parser.add_argument('--responsive-images', action='store_true',
+                        help='Include image derivatives in the pipeline build (needs Pillow)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help='Baseline to compare with (default: .scripts/benchmark_baseline.json)')
+    parser.add_argument('--save-baseline', action='store_true', help='Save the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='Allowed slowdown / memory growth as a fraction (default: 0.5)')
+    parser.add_argument('--output', help='Also write the results to this JSON file')
+    parser.add_argument('--run-stage', choices=STAGES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stage:
+        # Child process: run one stage in the vault (the current directory) and report
+        import logging
+        import resource
+        sys.path.insert(0, SCRIPTS_DIR)
+        from tracing import setup_logging
+        # The synthetic vault has unresolved links and shared names on purpose; don't time their warnings
+        setup_logging(logging.ERROR)
+        start = time.perf_counter()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            run_stage(args.run_stage, args.jobs, args.responsive_images)
+        seconds = time.perf_counter() - start
+        # ru_maxrss is in KiB on Linux and bytes on macOS
+        scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+        peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                   resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+        print(json.dumps({'seconds': round(seconds, 3), 'peak_rss_mb': round(peak / scale, 1)}))
+        sys.exit(0)
+
+    results = benchmark([parse_size(size) for size in args.sizes], args.workdir, args.seed, args.jobs,
+                        args.responsive_images, args.repeat)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print(f"Baseline saved to {args.baseline}")
+        sys.exit(0)
+
+    baseline = load_baseline(args.baseline)
+    if not baseline:
+        print("No baseline to compare with (run with --save-baseline to record one)")
+        sys.exit(0)
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"Regression: {regression}")
+    if regressions:
+        sys.exit(1)
+    print("No regressions against the baseline")
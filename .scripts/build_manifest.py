@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Persisted build manifest for incremental site builds.
+
+The manifest records, for every published note:
+1. The hash of its source file (as copied into .site_content_temp)
+2. The hash of the final output written by the last stage
+3. The stage versions that produced that output
+4. How each of its outgoing wikilinks resolved in the mapping
+5. Its backlinks, when they are injected from the link graph
+6. Its tags and info box fields (for the Dataview index) and a fingerprint
+   of the results of its Dataview queries
+
+On the next run only notes whose source changed, whose output was modified
+or deleted, whose link targets were added, removed or moved, or whose
+Dataview queries return something else are pushed through reorganize ->
+preprocess -> wikilink conversion again.
+"""
+
+import hashlib
+import json
+import logging
+import os
+
+from convert_wikilinks import extract_image_targets, extract_link_targets
+from dataview import extract_metadata
+
+log = logging.getLogger(__name__)
+
+MANIFEST_FORMAT = 3
+
+# Bump a stage's version whenever it produces different output for the same
+# input, so every note is rebuilt once with the new code.
+STAGE_VERSIONS = {
+    'reorganize': 1,
+    'preprocess': 2,
+    'wikilinks': 4,
+}
+
+
+def stage_version():
+    """Return a single string identifying the versions of all stages."""
+    return ';'.join(f'{stage}={version}' for stage, version in sorted(STAGE_VERSIONS.items()))
+
+
+def hash_text(text):
+    """Return the SHA-256 hex digest of a string encoded as UTF-8."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def hash_file(path):
+    """Return the SHA-256 hex digest of a file, or None if it doesn't exist."""
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+def file_stat(path):
+    """Return [size, mtime_ns] for a file, or None if it doesn't exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def resolve_links(targets, mapping):
+    """Return how each link target resolves (None if unresolved); mapping is usually a LinkResolver."""
+    return {target: mapping.get(target) for target in targets}
+
+
+def resolve_images(targets, images, mapping=None):
+    """
+    Return a fingerprint of each embedded image's stored file and image index entry (None if absent).
+
+    Stored files are looked up through mapping when it is a LinkResolver
+    with the asset manifest (their names change with their content).
+    """
+    asset_name = getattr(mapping, 'asset_name', None)
+    resolved = {}
+    for target in targets:
+        stored = asset_name(target) if asset_name is not None else target
+        info = (images or {}).get(stored)
+        if info or stored != target:
+            resolved[target] = hash_text(json.dumps([stored, info], sort_keys=True))[:16]
+        else:
+            resolved[target] = None
+    return resolved
+
+
+def make_entry(content, output, mapping, images=None, backlinks=None, dataview=None, autolinks=None):
+    """Build the manifest entry for a note that is being (re)written."""
+    targets = extract_link_targets(content)
+    image_targets = extract_image_targets(content)
+    return {
+        'source_hash': hash_text(content),
+        'stage_version': stage_version(),
+        'output': output,
+        'link_targets': targets,
+        'links': resolve_links(targets, mapping),
+        'image_targets': image_targets,
+        'images': resolve_images(image_targets, images, mapping),
+        'backlinks': backlinks,
+        'metadata': extract_metadata(content),
+        'dataview': dataview,
+        'autolinks': autolinks,
+        'output_hash': None,
+        'output_stat': None,
+    }
+
+
+class BuildManifest:
+    """
+    Per-note build state shared by the reorganize, preprocess and wikilink stages.
+
+    Notes are keyed by their path relative to the source directory. Outputs are
+    paths relative to the destination (docs) directory. Outputs rewritten by the
+    reorganize stage are kept in `pending` until the wikilink stage finalizes
+    them, so an interrupted build is picked up again on the next run.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.notes = {}
+        self.pending = set()
+        self.load()
+
+    def load(self):
+        """Load the manifest from disk; a missing or unreadable manifest means a full build."""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            log.warning(f"Could not read build manifest {self.path}, rebuilding everything: {e}")
+            return
+        if data.get('format') != MANIFEST_FORMAT:
+            return
+        self.notes = data.get('notes', {})
+        self.pending = set(data.get('pending', []))
+
+    def save(self):
+        """Write the manifest to disk."""
+        data = {
+            'format': MANIFEST_FORMAT,
+            'notes': self.notes,
+            'pending': sorted(self.pending),
+        }
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def needs_rebuild(self, source, content, output, mapping, dest_dir, images=None, backlinks=None,
+                      dataview=None, autolinks=None):
+        """
+        Decide whether a note has to go through the stages again.
+
+        Args:
+            source: Note path relative to the source directory
+            content: The note's source content
+            output: Output path relative to dest_dir
+            mapping: The mapping for this build
+            dest_dir: The destination (docs) directory
+            images: The image index for this build, if responsive images are enabled
+            backlinks: The note's backlinks from the link graph, if they are injected
+            dataview: Fingerprint of the note's Dataview query results (see DataviewIndex.fingerprint)
+            autolinks: Fingerprint of the note names it mentions, if unlinked mentions
+                are linked (see Autolinker.fingerprint)
+        """
+        entry = self.notes.get(source)
+        if entry is None or output in self.pending:
+            return True
+        if (entry.get('source_hash') != hash_text(content)
+                or entry.get('stage_version') != stage_version()
+                or entry.get('output') != output):
+            return True
+        # Source unchanged, so the link targets are too; only their resolution may differ
+        if entry.get('links') != resolve_links(entry.get('link_targets', []), mapping):
+            return True
+        if entry.get('images', {}) != resolve_images(entry.get('image_targets', []), images, mapping):
+            return True
+        if (entry.get('backlinks') != backlinks or entry.get('dataview') != dataview
+                or entry.get('autolinks') != autolinks):
+            return True
+        # Make sure nothing touched the output since the last build (cheap stat first)
+        output_path = os.path.join(dest_dir, output)
+        if file_stat(output_path) == entry.get('output_stat'):
+            return False
+        return hash_file(output_path) != entry.get('output_hash')
+
+    def set_entry(self, source, entry):
+        """Store an entry built by make_entry() (e.g. in a worker process) for a rewritten note."""
+        self.notes[source] = entry
+        self.pending.add(entry['output'])
+
+    def prune(self, planned, dest_dir):
+        """
+        Forget notes that are no longer published and delete outputs that moved.
+
+        Must run before any output of this build is written, so a path that is
+        reused by another note is never deleted.
+
+        Args:
+            planned: Dictionary of note path (relative to the source directory) -> output path
+            dest_dir: The destination (docs) directory
+
+        Returns the list of removed output paths (relative to dest_dir).
+        """
+        planned_outputs = set(planned.values())
+        removed = []
+        for source in sorted(self.notes):
+            output = self.notes[source]['output']
+            if source not in planned:
+                del self.notes[source]
+                self.pending.discard(output)
+            elif planned[source] == output:
+                continue
+            if output in planned_outputs:
+                continue
+            output_path = os.path.join(dest_dir, output)
+            if os.path.exists(output_path):
+                os.remove(output_path)
+                remove_empty_dirs(os.path.dirname(output_path), dest_dir)
+                removed.append(output)
+        return removed
+
+    def stale_files(self, directory):
+        """
+        Return the markdown files in directory that the later stages must process.
+
+        That is every pending output plus any markdown file not produced by the
+        reorganize stage (index.md and friends are copied in fresh on every run).
+        """
+        tracked = {entry['output'] for entry in self.notes.values()}
+        files = []
+        for root, dirs, filenames in os.walk(directory):
+            # Like glob('**/*.md'), skip hidden directories such as .overrides
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            for filename in filenames:
+                if not filename.endswith('.md') or filename.startswith('.'):
+                    continue
+                filepath = os.path.join(root, filename)
+                relative_path = os.path.relpath(filepath, directory).replace(os.sep, '/')
+                if relative_path in self.pending or relative_path not in tracked:
+                    files.append(filepath)
+        return files
+
+    def finalize(self, dest_dir):
+        """Record the final output hashes of every pending note once the last stage ran."""
+        for entry in self.notes.values():
+            if entry['output'] in self.pending:
+                output_path = os.path.join(dest_dir, entry['output'])
+                entry['output_hash'] = hash_file(output_path)
+                entry['output_stat'] = file_stat(output_path)
+        self.pending.clear()
+
+
+def remove_empty_dirs(directory, stop_dir):
+    """Remove directory and its parents while they are empty, stopping at stop_dir."""
+    stop_dir = os.path.abspath(stop_dir)
+    directory = os.path.abspath(directory)
+    while directory != stop_dir and directory.startswith(stop_dir + os.sep):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            break
+        directory = os.path.dirname(directory)
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Build, serve or check the site from the vault in a single process.
+
+    compendium.py build [--full] [--content-only] [--no-compress] [--autolink] [--only PATH]
+        Collect the #wiki notes, build .site_content, run mkdocs build, then
+        minify the site and write .gz/.br siblings of its text files
+    compendium.py serve [--no-watch] [--autolink] [--only PATH]
+        Build .site_content, then run mkdocs serve while rebuilding notes as they change
+    compendium.py check
+        Build every note in memory (nothing is written) and report broken
+        links, ambiguous note names and unsupported queries; exits 1 if any
+
+With --only, build and serve preview part of the vault instead: just the
+notes under PATH, the pages they link to and the assets they embed are
+built, into .site_preview, with the URLs they have on the full site.
+
+Run it from the root of the repository (the vault); run_local.sh and the
+deploy workflow are thin wrappers around it. Each command only imports the
+modules it needs, so --help and check start fast. The stage scripts still
+work on their own too.
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import sys
+
+SOURCE_DIR = '.site_content_temp'
+DEST_DIR = '.site_content'
+SITE_DIR = 'site'
+PREVIEW_DIR = '.site_preview'  # Docs directory of --only builds, so they never touch .site_content
+PREVIEW_POLL_SECONDS = 1
+MAPPING_FILE = '.site_mapping.json'
+MANIFEST_FILE = '.site_manifest.json'
+GRAPH_FILE = '.site_graph.sqlite'
+SCAN_CACHE = '.site_scan_cache.json'
+IMAGE_CACHE = '.image_cache'
+RENDER_CACHE = '.site_render_cache'  # Rendered page HTML, kept by the docs/hooks.py MkDocs hooks
+COMPRESS_CACHE = '.site_compress_cache'  # Minified and compressed site files, by content
+
+# Files only kept to make the next build incremental; removed by --full
+BUILD_STATE = [DEST_DIR, MAPPING_FILE, MANIFEST_FILE, GRAPH_FILE, SCAN_CACHE, IMAGE_CACHE, RENDER_CACHE,
+               COMPRESS_CACHE]
+
+log = logging.getLogger(__name__)
+
+
+def remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def index_pages():
+    """Return the extra pages to build into the root of the site (the index page, if there is one)."""
+    for page in ('docs/index.md', 'index.md'):
+        if os.path.isfile(page):
+            return [page]
+    log.info("No index.md found")
+    return []
+
+
+def copy_theme(dest_dir=DEST_DIR):
+    """Copy the theme overrides, stylesheets and scripts into the docs directory (unchanged files are left alone)."""
+    from output_files import copy_if_changed
+
+    overrides = next((path for path in ('docs/.overrides', '.overrides') if os.path.isdir(path)), None)
+    for path in (overrides, 'docs/stylesheets', 'docs/javascripts'):
+        if path is not None and os.path.isdir(path):
+            shutil.copytree(path, os.path.join(dest_dir, os.path.basename(path)), dirs_exist_ok=True,
+                            copy_function=copy_if_changed)
+            log.info(f"Copied {path}")
+
+
+def build_content(args):
+    """Collect the published notes and bring .site_content up to date with them."""
+    from build_manifest import BuildManifest
+    from link_graph import LinkGraph
+    from pipeline import build
+    from tracing import span
+    from vault_scanner import copy_notes, scan_vault
+
+    if args.full:
+        for path in BUILD_STATE:
+            remove(path)
+    remove(SOURCE_DIR)
+    remove(SITE_DIR)
+    os.makedirs(SOURCE_DIR)
+
+    log.info(f"==> Copying #wiki-tagged notes to {SOURCE_DIR}")
+    with span('scan vault'):
+        notes = scan_vault('.', SCAN_CACHE)
+    with span('copy notes'):
+        copy_notes('.', SOURCE_DIR, notes)
+    log.info(f"Published notes: {len(notes)}")
+
+    log.info("==> Copying overrides and theme assets")
+    os.makedirs(DEST_DIR, exist_ok=True)
+    copy_theme()
+
+    log.info("==> Building content (reorganize, preprocess, wikilinks) and assets")
+    graph = LinkGraph(GRAPH_FILE)
+    try:
+        build(SOURCE_DIR, DEST_DIR, MAPPING_FILE, BuildManifest(MANIFEST_FILE), index_pages(), args.jobs,
+              responsive_images=True, image_cache=IMAGE_CACHE, graph=graph, backlinks=True,
+              search_index=True, autolink=args.autolink)
+    finally:
+        graph.close()
+
+
+def build_preview(args):
+    """
+    Build the notes under the --only paths (and the pages they link to) into .site_preview.
+
+    Notes are read straight from the vault, without copying them to
+    .site_content_temp, and the whole vault is planned, so pages get the
+    paths and links of the full site. The manifest and link graph of the
+    last full build, if any, are only read: queries and backlinks still
+    list the notes that aren't built.
+    """
+    from build_manifest import BuildManifest
+    from link_graph import LinkGraph
+    from pipeline import build_partial
+    from tracing import span
+    from vault_scanner import scan_vault
+
+    if args.full:
+        remove(PREVIEW_DIR)
+    remove(SITE_DIR)
+    with span('scan vault'):
+        notes = scan_vault('.', SCAN_CACHE)
+
+    os.makedirs(PREVIEW_DIR, exist_ok=True)
+    copy_theme(PREVIEW_DIR)
+    log.info(f"==> Building a preview of {', '.join(args.only)}")
+    graph = LinkGraph(GRAPH_FILE) if os.path.exists(GRAPH_FILE) else None
+    try:
+        build_partial('.', PREVIEW_DIR, args.only, index_pages(), args.jobs, paths=notes, responsive_images=True,
+                      image_cache=IMAGE_CACHE, manifest=BuildManifest(MANIFEST_FILE), graph=graph, backlinks=True,
+                      autolink=args.autolink)
+    finally:
+        if graph is not None:
+            graph.close()
+
+
+def preview_signature(only):
+    """Return the modification time of every markdown file under the --only paths."""
+    signature = {}
+    for selected in only:
+        if os.path.isdir(selected):
+            for root, dirs, files in os.walk(selected):
+                for filename in files:
+                    if filename.endswith('.md'):
+                        path = os.path.join(root, filename)
+                        signature[path] = os.stat(path).st_mtime_ns
+        for path in (selected, selected + '.md'):
+            if os.path.isfile(path):
+                signature[path] = os.stat(path).st_mtime_ns
+    return signature
+
+
+def watch_preview(args):
+    """Rebuild the preview whenever a note under the --only paths changes, until the process exits."""
+    import time
+
+    signature = preview_signature(args.only)
+    while True:
+        time.sleep(PREVIEW_POLL_SECONDS)
+        current = preview_signature(args.only)
+        if current == signature:
+            continue
+        signature = current
+        try:
+            build_preview(args)
+        except Exception as e:
+            log.error(f"Preview build failed: {e}")
+
+
+def watch_vault(args):
+    """Rebuild changed notes (and the notes linking to them) until the process exits."""
+    from build_manifest import BuildManifest
+    from link_graph import LinkGraph
+    from watch import WatchedSite, start, watch
+
+    # Created on the watching thread: the link graph's connection can't be shared between threads
+    site = WatchedSite('.', SOURCE_DIR, DEST_DIR, MAPPING_FILE, BuildManifest(MANIFEST_FILE), index_pages(),
+                       responsive_images=True, image_cache=IMAGE_CACHE, jobs=args.jobs,
+                       graph=LinkGraph(GRAPH_FILE), backlinks=True, search_index=True, autolink=args.autolink)
+    watch(site, start(site))
+
+
+def docs_dir(args):
+    """Return the MkDocs config overrides for the docs directory the command built."""
+    return {'docs_dir': PREVIEW_DIR} if args.only else {}
+
+
+def build_command(args):
+    if args.only:
+        build_preview(args)
+    else:
+        build_content(args)
+    if args.content_only:
+        return 0
+    from mkdocs.commands.build import build
+    from mkdocs.config import load_config
+
+    log.info("==> Running mkdocs build")
+    build(load_config(config_file='mkdocs.yml', **docs_dir(args)))
+    if args.compress:
+        from compress_site import compress_site
+        from tracing import span
+
+        log.info("==> Minifying and precompressing the site")
+        with span('compress site'):
+            compress_site(SITE_DIR, COMPRESS_CACHE, args.jobs)
+    return 0
+
+
+def serve_command(args):
+    if args.only:
+        build_preview(args)
+    else:
+        build_content(args)
+    if args.watch:
+        import threading
+
+        log.info("==> Watching the vault for changes")
+        threading.Thread(target=watch_preview if args.only else watch_vault, args=(args,), name='watch',
+                         daemon=True).start()
+    from mkdocs.commands.serve import serve
+
+    log.info("==> Running mkdocs serve")
+    serve(config_file='mkdocs.yml', **docs_dir(args))
+    return 0
+
+
+class ProblemCounter(logging.Handler):
+    """Counts the warnings logged during a check."""
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+
+def check_command(args):
+    from pipeline import render_documents
+    from vault_scanner import scan_vault
+
+    documents = {}
+    # No verdict cache: check writes nothing, not even .site_scan_cache.json
+    for path in scan_vault('.', None):
+        with open(path, 'r', encoding='utf-8') as f:
+            documents[path] = f.read()
+    extra_pages = {}
+    for page in index_pages():
+        with open(page, 'r', encoding='utf-8') as f:
+            extra_pages[page] = f.read()
+
+    problems = ProblemCounter()
+    logging.getLogger().addHandler(problems)
+    pages = render_documents(documents, extra_pages, backlinks=True)[0]
+    logging.getLogger().removeHandler(problems)
+
+    log.info(f"Checked {len(pages)} pages: {problems.count or 'no'} problem(s)")
+    return 1 if problems.count else 0
+
+
+def parse_args(argv=None):
+    import tracing
+
+    common = argparse.ArgumentParser(add_help=False)
+    tracing.add_arguments(common)
+    building = argparse.ArgumentParser(add_help=False)
+    building.add_argument('--jobs', '-j', type=int, default=0,
+                          help='Number of worker processes (default: 0, one per CPU)')
+    building.add_argument('--full', action='store_true',
+                          help='Remove the previous build and its caches first instead of building incrementally')
+    building.add_argument('--autolink', action='store_true',
+                          help='Link the first unlinked mention of every note (and info box alias) on each page')
+    building.add_argument('--only', action='append', metavar='PATH',
+                          help='Preview the notes under PATH (a note or folder of the vault; repeatable), the pages '
+                               f'they link to and the assets they embed, built into {PREVIEW_DIR}')
+
+    parser = argparse.ArgumentParser(description='Build, serve or check the site from the vault.')
+    commands = parser.add_subparsers(dest='command', required=True, metavar='{build,serve,check}')
+    build_parser = commands.add_parser('build', parents=[common, building], help='Build the site into site/')
+    build_parser.add_argument('--content-only', action='store_true',
+                              help='Only build .site_content, without running mkdocs build')
+    build_parser.add_argument('--no-compress', action='store_false', dest='compress',
+                              help="Leave the built site as MkDocs wrote it, without minifying it or "
+                                   "writing .gz/.br files")
+    build_parser.set_defaults(run=build_command)
+    serve_parser = commands.add_parser('serve', parents=[common, building],
+                                       help='Serve the site, rebuilding notes as they change')
+    serve_parser.add_argument('--no-watch', action='store_false', dest='watch',
+                              help="Serve the content as built, without watching the vault")
+    serve_parser.set_defaults(run=serve_command)
+    check_parser = commands.add_parser('check', parents=[common],
+                                       help='Report broken links and other problems without writing anything')
+    check_parser.set_defaults(run=check_command)
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    import tracing
+
+    args = parse_args()
+    tracing.setup(args)
+    sys.exit(args.run(args))
@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+"""
+Minify and precompress the built site.
+
+Run after mkdocs build, this stage:
+1. Minifies every HTML, CSS and JavaScript file of the site in place
+   (already minified *.min.css/*.min.js files are left as they are)
+2. Writes .gz and .br siblings of every text file worth compressing, at the
+   maximum compression level, for static hosts (and CDNs) that serve
+   precompressed files instead of compressing each response
+3. Reports the bytes saved per file type
+
+Minification is conservative: comments and indentation go, but line breaks
+are kept, and so is everything inside strings, templates, regular
+expressions and <pre>/<code>/<textarea>/<script> blocks, so a page never
+renders or runs differently. Results are kept in a content-addressed cache
+(.site_compress_cache), so only files whose content changed since an earlier
+build are minified and compressed again; the rest are copied from the cache.
+
+Brotli is optional: without the brotli package only .gz files are written,
+with a warning.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+
+from tracing import span
+
+log = logging.getLogger(__name__)
+
+# Bump when the minifiers or compression settings change so the cache is regenerated
+COMPRESS_VERSION = 1
+
+MINIFY_EXTENSIONS = ['.html', '.css', '.js']
+COMPRESS_EXTENSIONS = ['.html', '.css', '.js', '.json', '.svg', '.xml', '.txt', '.map']
+
+# Smaller files gain less than the bytes of an extra request header
+MIN_COMPRESS_SIZE = 256
+
+# Least recently used cache entries are evicted above this size
+COMPRESS_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Blocks of a page whose whitespace matters (or that aren't HTML), and comments
+HTML_RAW_BLOCKS = re.compile(r'<(pre|code|textarea|script|style)\b(?:"[^"]*"|\'[^\']*\'|[^\'">])*>.*?</\1\s*>|<!--.*?-->',
+                             re.DOTALL | re.IGNORECASE)
+HTML_TAG = re.compile(r'<(?:"[^"]*"|\'[^\']*\'|[^\'">])*>')
+STYLE_BLOCK = re.compile(r'(<style\b[^>]*>)(.*?)(</style\s*>)', re.DOTALL | re.IGNORECASE)
+
+CSS_TOKENS = re.compile(r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|/\*.*?\*/|\s+|[^"\'/\s]+|/', re.DOTALL)
+# No whitespace is needed after / before these
+CSS_OPEN = set('{};,>(:')
+CSS_CLOSE = set('{};,>)')
+
+# No whitespace is needed next to these in JavaScript (line breaks are always kept)
+JS_PUNCTUATION = set('{}()[];,:=<>?|&!*%^~')
+# A / after one of these starts a regular expression, not a division
+JS_REGEX_AFTER = set('(,=:[!&|?{};+-*%<>~^')
+JS_REGEX_KEYWORDS = {'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete', 'void', 'throw',
+                     'instanceof', 'yield', 'await'}
+
+
+def brotli_module():
+    """Return the brotli module, or None if it isn't installed."""
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def minify_css(text):
+    """Remove comments and the whitespace CSS doesn't need (strings are kept as they are)."""
+    parts = []
+    space = False
+    for token in CSS_TOKENS.findall(text):
+        if token.isspace() or (token.startswith('/*') and not token.startswith('/*!')):
+            space = True
+            continue
+        if space and parts and parts[-1][-1] not in CSS_OPEN and token[0] not in CSS_CLOSE:
+            parts.append(' ')
+        space = False
+        if token[0] not in '"\'/':
+            token = token.replace(';}', '}')
+            if token[0] == '}' and parts and parts[-1].endswith(';'):
+                parts[-1] = parts[-1][:-1]
+        parts.append(token)
+    return ''.join(parts)
+
+
+def skip_string(text, index):
+    """Return the index after the string literal starting at text[index]."""
+    quote = text[index]
+    index += 1
+    while index < len(text):
+        char = text[index]
+        if char == '\\':
+            index += 2
+            continue
+        if char == quote or char == '\n':
+            return index + 1
+        index += 1
+    return len(text)
+
+
+def skip_template(text, index):
+    """Return the index after the template literal starting at text[index] (with its ${...} expressions)."""
+    index += 1
+    while index < len(text):
+        char = text[index]
+        if char == '\\':
+            index += 2
+            continue
+        if char == '`':
+            return index + 1
+        if char == '$' and text.startswith('{', index + 1):
+            index = skip_expression(text, index + 2)
+            continue
+        index += 1
+    return len(text)
+
+
+def skip_expression(text, index):
+    """Return the index after the } closing a template expression that starts at text[index]."""
+    depth = 0
+    while index < len(text):
+        char = text[index]
+        if char in '\'"':
+            index = skip_string(text, index)
+            continue
+        if char == '`':
+            index = skip_template(text, index)
+            continue
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            if depth == 0:
+                return index + 1
+            depth -= 1
+        index += 1
+    return len(text)
+
+
+def skip_regex(text, index):
+    """Return the index after the regular expression literal (and its flags) starting at text[index]."""
+    index += 1
+    in_class = False
+    while index < len(text):
+        char = text[index]
+        if char == '\\':
+            index += 2
+            continue
+        if char == '\n':
+            return index
+        if char == '[':
+            in_class = True
+        elif char == ']':
+            in_class = False
+        elif char == '/' and not in_class:
+            index += 1
+            while index < len(text) and (text[index].isalnum() or text[index] in '_$'):
+                index += 1
+            return index
+        index += 1
+    return len(text)
+
+
+def regex_allowed(parts):
+    """Return whether a / after the output so far starts a regular expression."""
+    output = ''.join(parts[-16:]).rstrip()
+    if not output:
+        return True
+    if output[-1] in JS_REGEX_AFTER:
+        return True
+    word = re.search(r'[A-Za-z_$]+$', output)
+    return word is not None and word.group(0) in JS_REGEX_KEYWORDS
+
+
+def js_needs_space(previous, following):
+    """Return whether the whitespace between two JavaScript characters has to be kept."""
+    # a / /re/ and a / *b must not become comments, nor a + +b and a - -b increments
+    if previous == '/':
+        return following in '/*'
+    if following == '/':
+        return previous in '/*'
+    if previous in JS_PUNCTUATION or following in JS_PUNCTUATION:
+        return False
+    if previous in '+-' or following in '+-':
+        return previous in '+-' and following in '+-'
+    return True
+
+
+def minify_js(text):
+    """
+    Remove comments, indentation and the whitespace JavaScript doesn't need.
+
+    Line breaks are kept (so automatic semicolon insertion works the same),
+    and strings, templates and regular expressions are copied as they are.
+    """
+    parts = []
+    index = 0
+    pending = ''
+    while index < len(text):
+        char = text[index]
+        if char.isspace() or text.startswith('//', index) or (text.startswith('/*', index)
+                                                             and not text.startswith('/*!', index)):
+            if text.startswith('//', index):
+                end = text.find('\n', index)
+                end = len(text) if end == -1 else end
+            elif text.startswith('/*', index):
+                end = text.find('*/', index + 2)
+                end = len(text) if end == -1 else end + 2
+                if '\n' in text[index:end]:
+                    pending = '\n'
+            else:
+                end = index + 1
+                if char == '\n':
+                    pending = '\n'
+            pending = pending or ' '
+            index = end
+            continue
+
+        if char in '\'"':
+            end = skip_string(text, index)
+        elif char == '`':
+            end = skip_template(text, index)
+        elif char == '/' and regex_allowed(parts) and not text.startswith('/*', index):
+            end = skip_regex(text, index)
+        elif text.startswith('/*!', index):
+            end = text.find('*/', index)
+            end = len(text) if end == -1 else end + 2
+        else:
+            end = index + 1
+        token = text[index:end]
+
+        if pending and parts:
+            if pending == '\n':
+                parts.append('\n')
+            elif js_needs_space(parts[-1][-1], token[0]):
+                parts.append(' ')
+        pending = ''
+        parts.append(token)
+        index = end
+    return ''.join(parts).strip() + '\n'
+
+
+def minify_html(text):
+    """
+    Remove comments and collapse the whitespace between and around tags.
+
+    Whitespace is collapsed to one space (or one line break), never removed,
+    so inline elements keep their spacing. Tags and <pre>, <code>,
+    <textarea> and <script> blocks are kept as they are; <style> blocks are
+    minified as CSS.
+    """
+    parts = []
+    # Text around a removed comment is collapsed as one
+    pending = []
+    position = 0
+    for block in HTML_RAW_BLOCKS.finditer(text):
+        pending.append(text[position:block.start()])
+        position = block.end()
+        # Conditional comments still mean something
+        if block.group(0).startswith('<!--') and not block.group(0).startswith('<!--['):
+            continue
+        parts.append(collapse_html_text(''.join(pending)))
+        pending = []
+        if block.group(1) and block.group(1).lower() == 'style':
+            parts.append(STYLE_BLOCK.sub(lambda match: match.group(1) + minify_css(match.group(2)) + match.group(3),
+                                         block.group(0)))
+        else:
+            parts.append(block.group(0))
+    pending.append(text[position:])
+    parts.append(collapse_html_text(''.join(pending)))
+    return ''.join(parts).strip() + '\n'
+
+
+def collapse_html_text(text):
+    """Collapse every run of whitespace outside the tags of an HTML fragment."""
+    parts = []
+    position = 0
+    for tag in HTML_TAG.finditer(text):
+        parts.append(collapse_whitespace(text[position:tag.start()]))
+        parts.append(tag.group(0))
+        position = tag.end()
+    parts.append(collapse_whitespace(text[position:]))
+    return ''.join(parts)
+
+
+def collapse_whitespace(text):
+    return re.sub(r'\s+', lambda match: '\n' if '\n' in match.group(0) else ' ', text)
+
+
+MINIFIERS = {
+    '.html': minify_html,
+    '.css': minify_css,
+    '.js': minify_js,
+}
+
+
+def should_minify(path):
+    name = os.path.basename(path)
+    return os.path.splitext(name)[1].lower() in MINIFY_EXTENSIONS and '.min.' not in name
+
+
+def compress_file(task):
+    """
+    Minify one file of the site in place and write its .gz and .br siblings.
+
+    Runs in a worker process when building with --jobs. The results are
+    stored in (or, for content seen before, copied from) the cache entry of
+    the file's content. Returns (extension, original size, minified size,
+    gzip size, brotli size, whether the cache was hit).
+    """
+    path, cache_dir, formats = task
+    with open(path, 'rb') as f:
+        data = f.read()
+    key = hashlib.sha256(data).hexdigest() + f'-v{COMPRESS_VERSION}-{"-".join(formats)}'
+    entry_dir = os.path.join(cache_dir, key[:2], key)
+    info_file = os.path.join(entry_dir, 'info.json')
+    extension = os.path.splitext(path)[1].lower()
+
+    hit = os.path.exists(info_file)
+    if not hit:
+        with span('compress', 'file', file=path):
+            os.makedirs(entry_dir, exist_ok=True)
+            minified = data
+            if should_minify(path):
+                try:
+                    minified = MINIFIERS[extension](data.decode('utf-8')).encode('utf-8')
+                except UnicodeDecodeError:
+                    pass
+                if len(minified) >= len(data):
+                    minified = data
+            info = {'original': len(data), 'size': len(minified), 'files': {}}
+            outputs = {}
+            if minified is not data:
+                outputs['minified'] = minified
+            if len(minified) >= MIN_COMPRESS_SIZE:
+                outputs['gz'] = gzip.compress(minified, compresslevel=9, mtime=0)
+                if 'br' in formats:
+                    brotli = brotli_module()
+                    outputs['br'] = brotli.compress(minified, mode=brotli.MODE_TEXT, quality=11)
+            for name, content in outputs.items():
+                if name != 'minified' and len(content) >= len(minified):
+                    continue
+                # Per process: workers may be storing the same content at once
+                tmp_path = os.path.join(entry_dir, f'{name}.{os.getpid()}.tmp')
+                with open(tmp_path, 'wb') as f:
+                    f.write(content)
+                os.replace(tmp_path, os.path.join(entry_dir, name))
+                info['files'][name] = len(content)
+            # Written last: its presence marks the cache entry as complete
+            tmp_path = f'{info_file}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(info, f)
+            os.replace(tmp_path, info_file)
+    else:
+        with open(info_file, 'r', encoding='utf-8') as f:
+            info = json.load(f)
+        # Mark the entry as recently used for eviction
+        os.utime(info_file)
+
+    files = info['files']
+    if 'minified' in files:
+        shutil.copyfile(os.path.join(entry_dir, 'minified'), path)
+    for name in ('gz', 'br'):
+        if name in files:
+            shutil.copyfile(os.path.join(entry_dir, name), f'{path}.{name}')
+    size = info['size']
+    return extension, info['original'], size, files.get('gz', size), files.get('br', size), hit
+
+
+def prune_compress_cache(cache_dir, max_bytes=COMPRESS_CACHE_MAX_BYTES):
+    """
+    Evict the least recently used cache entries above max_bytes.
+
+    Returns the number of entries removed.
+    """
+    entries = []
+    for root, dirs, files in os.walk(cache_dir):
+        if 'info.json' in files:
+            size = sum(os.path.getsize(os.path.join(root, filename)) for filename in files)
+            entries.append((os.stat(os.path.join(root, 'info.json')).st_mtime, size, root))
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, entry_dir in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(entry_dir)
+        total -= size
+        removed += 1
+    return removed
+
+
+def format_size(size):
+    """Format a byte count for the report (B, KB or MB)."""
+    if size < 1024:
+        return f'{size} B'
+    if size < 1024 * 1024:
+        return f'{size / 1024:.1f} KB'
+    return f'{size / (1024 * 1024):.1f} MB'
+
+
+def compress_site(site_dir, cache_dir='.site_compress_cache', jobs=1):
+    """
+    Minify the HTML, CSS and JavaScript of a built site and write .gz/.br siblings.
+
+    Args:
+        site_dir: The built site (e.g. site/)
+        cache_dir: Content-addressed cache of minified and compressed files, kept between builds
+        jobs: Number of worker processes (0 means one per CPU)
+
+    Returns {extension: [files, original bytes, minified bytes, gzip bytes, brotli bytes]}.
+    """
+    from parallel import parallel_map
+
+    formats = ['gz']
+    if brotli_module() is not None:
+        formats.append('br')
+    else:
+        log.warning("brotli is not installed, writing .gz files only")
+
+    tasks = []
+    for root, dirs, files in os.walk(site_dir):
+        dirs.sort()
+        for filename in sorted(files):
+            if os.path.splitext(filename)[1].lower() in COMPRESS_EXTENSIONS:
+                tasks.append((os.path.join(root, filename), cache_dir, formats))
+    os.makedirs(cache_dir, exist_ok=True)
+    results = parallel_map(compress_file, tasks, jobs)
+
+    totals = {}
+    for extension, *sizes, hit in results:
+        total = totals.setdefault(extension, [0, 0, 0, 0, 0])
+        total[0] += 1
+        for column, size in enumerate(sizes, 1):
+            total[column] += size
+    misses = sum(1 for result in results if not result[-1])
+    removed = prune_compress_cache(cache_dir)
+
+    for extension, (count, original, minified, gz, br) in sorted(totals.items()):
+        line = (f"  {extension:<5} {count:>5} file(s): {format_size(original)} -> {format_size(minified)} minified, "
+                f"{format_size(gz)} gzip")
+        if 'br' in formats:
+            line += f", {format_size(br)} brotli"
+        smallest = br if 'br' in formats else gz
+        log.info(f"{line} ({100 - 100 * smallest // max(original, 1)}% smaller)")
+    log.info(f"Compressed site: {len(results)} file(s), {misses} minified and compressed, "
+             f"{len(results) - misses} reused from {cache_dir}, {removed} cache entries evicted")
+    return totals
+
+
+if __name__ == '__main__':
+    from parallel import pop_jobs_arg
+    from tracing import setup_from_argv
+    jobs = pop_jobs_arg(sys.argv)
+    setup_from_argv(sys.argv)
+
+    if len(sys.argv) not in (2, 3):
+        print("Usage: compress_site.py <site_dir> [cache_dir] [--jobs N] [--trace FILE] [-v|-q]")
+        sys.exit(1)
+
+    with span('compress site'):
+        compress_site(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else '.site_compress_cache', jobs)
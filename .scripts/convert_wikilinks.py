@@ -7,14 +7,25 @@ wikilinks like [[Page Name]] to [Page Name](path/to/page-name.md)
 """
 
 import json
+import logging
 import re
 import os
 import sys
 
-# Import slugify function from reorganize_files module
-# We need to add the script directory to the path
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-from reorganize_files import slugify
+from reorganize_files import load_asset_manifest, slugify
+from output_files import write_if_changed
+from image_derivatives import page_url_file, responsive_image_html
+from tracing import instant, span
+
+log = logging.getLogger(__name__)
+
+# Wikilinks, optionally with ! prefix
+# Captures optional ! before [[...]]
+WIKILINK_PATTERN = re.compile(r'(!?)\[\[([^\]]+)\]\]')
+
+IMAGE_EXTENSIONS = ['.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp']
+
+INFO_BOX_IMAGE_DIV = '<div class="info-box-image" markdown="1">'
 
 
 def calculate_relative_path(from_file, to_file):
@@ -65,13 +76,180 @@ def calculate_relative_path(from_file, to_file):
     return rel_path
 
 
+def parse_wikilink(full_link):
+    """
+    Split the inside of a wikilink into its target, display text and type.
+    
+    Returns (link_target, display_text, is_image). Path components are dropped
+    from the target (only the page name is used for lookups) and page targets
+    have their .md extension removed so they can be looked up in the mapping.
+    """
+    # Handle display text (e.g., [[Link|Display]], or [[Link\|Display]] inside a table)
+    if '|' in full_link:
+        link_target, display_text = full_link.split('|', 1)
+        link_target = link_target.rstrip('\\')
+    else:
+        link_target = full_link
+        display_text = full_link
+    
+    # Remove any path components from the link target (use just the page name)
+    if '/' in link_target:
+        link_target = link_target.split('/')[-1]
+    
+    # Check if this is an image link
+    is_image = link_target.lower().endswith(tuple(IMAGE_EXTENSIONS))
+    
+    if not is_image:
+        # Remove .md extension if present
+        link_target = link_target.replace('.md', '')
+    
+    return link_target, display_text, is_image
+
+
+def page_link_target(full_link):
+    """
+    Return the page a wikilink points to as written, keeping any folder path.
+    
+    E.g. 'Locations/Hollow Root Covenant' for [[Locations/Hollow Root Covenant|HRC]].
+    The folder lets LinkResolver pick between notes that share a name.
+    """
+    return full_link.split('|', 1)[0].rstrip('\\').replace('.md', '')
+
+
+def asset_file_name(link_target):
+    """Return the asset name of an image link target (its slugified file name, see copy_assets)."""
+    name_without_ext, ext = os.path.splitext(link_target)
+    return slugify(name_without_ext) + ext
+
+
+def extract_link_targets(content):
+    """Return the sorted, de-duplicated pages a note links to, as written (images excluded)."""
+    targets = set()
+    for match in WIKILINK_PATTERN.finditer(content):
+        _, _, is_image = parse_wikilink(match.group(2))
+        if not is_image:
+            targets.add(page_link_target(match.group(2)))
+    return sorted(targets)
+
+
+def extract_image_targets(content):
+    """Return the sorted, de-duplicated asset names (slugified file names, see copy_assets) a note embeds."""
+    targets = set()
+    for match in WIKILINK_PATTERN.finditer(content):
+        link_target, _, is_image = parse_wikilink(match.group(2))
+        if is_image:
+            targets.add(asset_file_name(link_target))
+    return sorted(targets)
+
+
+class LinkResolver:
+    """
+    Resolves wikilink targets to output paths; built once per build.
+    
+    A target is looked up by its exact note name, then case-folded, then
+    slugified, each a single dict lookup, and every answer is memoized.
+    Relative paths are cached per (source directory, target) pair since a
+    page usually links to the same notes many times.
+    
+    The mapping is keyed by bare note name, so notes sharing a name collide
+    (the last one wins). Given the planned notes, the resolver remembers every
+    candidate for such names: links qualified with a folder
+    ([[Locations/Hollow Root Covenant]]) pick the matching note, and
+    ambiguous_names() reports the collisions.
+    
+    Image targets are looked up in assets, the asset manifest returned by
+    copy_assets (set it once the assets are synced).
+    """
+    
+    def __init__(self, mapping, notes=None):
+        self.mapping = mapping
+        self.folded = {}
+        self.slugs = {}
+        for name, path in mapping.items():
+            self.folded.setdefault(name.casefold(), set()).add(path)
+            self.slugs.setdefault(slugify(name), set()).add(path)
+        
+        # Note name -> [(case-folded source path without .md, output)] for names shared by several notes
+        self.candidates = {}
+        for note in notes or []:
+            source = os.path.splitext(note['relative_source'])[0].casefold()
+            self.candidates.setdefault(note['name'], []).append((source, note['output']))
+        self.candidates = {name: found for name, found in self.candidates.items() if len(found) > 1}
+        
+        # Asset name -> content-addressed file in assets/
+        self.assets = {}
+        self._resolved = {}
+        self._relative_paths = {}
+        self._asset_names = {}
+    
+    def ambiguous_names(self):
+        """Return note name -> output paths for every name shared by several notes."""
+        return {name: [output for _, output in found] for name, found in self.candidates.items()}
+    
+    def resolve(self, target):
+        """
+        Return the output path a page link target resolves to, or None.
+        
+        Args:
+            target: The page as written in the link, optionally with folders
+                (see page_link_target)
+        """
+        if target not in self._resolved:
+            self._resolved[target] = self._resolve(target)
+        return self._resolved[target]
+    
+    # Dict-style lookup, so a resolver can stand in for the mapping (e.g. in build_manifest)
+    get = resolve
+    
+    def _resolve(self, target):
+        name = target.split('/')[-1]
+        if '/' in target and name in self.candidates:
+            folder_path = target.casefold()
+            # Folder notes can be linked by their folder alone ([[Groups/Hollow Root Covenant]])
+            queries = [folder_path, folder_path + '/' + name.casefold()]
+            for source, output in self.candidates[name]:
+                if any(source == query or source.endswith('/' + query) for query in queries):
+                    return output
+        
+        if name in self.mapping:
+            return self.mapping[name]
+        for index, key in ((self.folded, name.casefold()), (self.slugs, slugify(name))):
+            paths = index.get(key)
+            if paths:
+                # Several notes only differing in case or punctuation: don't guess
+                return next(iter(paths)) if len(paths) == 1 else None
+        return None
+    
+    def relative_path(self, source_file, target):
+        """Cached calculate_relative_path(source_file, target)."""
+        key = (os.path.dirname(source_file) if source_file else None, target)
+        path = self._relative_paths.get(key)
+        if path is None:
+            path = self._relative_paths[key] = calculate_relative_path(source_file, target)
+        return path
+    
+    def asset_name(self, link_target):
+        """Return the file an image link target is stored as in assets/ (its asset name if unknown)."""
+        name = self._asset_names.get(link_target)
+        if name is None:
+            name = self._asset_names[link_target] = asset_file_name(link_target)
+        return self.assets.get(name, name)
+
+
+def warn_ambiguous_names(resolver):
+    """Log a warning for every note name shared by several notes."""
+    for name, outputs in sorted(resolver.ambiguous_names().items()):
+        log.warning(f"'{name}' is the name of several notes ({', '.join(outputs)}); "
+                    f"[[{name}]] links to {resolver.mapping[name]}, add the folder ([[Folder/{name}]]) to pick another")
+
+
 def load_mapping(mapping_file):
     """Load the filename mapping."""
     with open(mapping_file, 'r', encoding='utf-8') as f:
         return json.load(f)
 
 
-def convert_wikilinks(content, mapping, source_file=None):
+def convert_wikilinks(content, mapping, source_file=None, images=None):
     """
     Convert wikilinks to markdown links using the mapping.
     
@@ -79,77 +257,81 @@ def convert_wikilinks(content, mapping, source_file=None):
     - [[Page Name]] -> [Page Name](../../path/to/page-name.md)
     - [[Page Name|Display Text]] -> [Display Text](../../path/to/page-name.md)
     - [[Folder/Page Name]] -> [Page Name](../../folder/page-name.md)
-    - [[Image.png]] -> ![Image](../../assets/image.png) (for images)
-    - ![[Image.png]] -> ![Image](../../assets/image.png) (for images with ! prefix)
+    - [[Image.png]] -> ![Image](../../assets/3f2a...c9.png) (for images, see copy_assets)
+    - ![[Image.png]] -> ![Image](../../assets/3f2a...c9.png) (for images with ! prefix)
     
     Links are relative to the source file location and include .md extension
     so MkDocs can properly process them.
     
     Args:
         content: The markdown content to process
-        mapping: Dictionary mapping page names to their paths
+        mapping: A LinkResolver, or a dictionary mapping page names to their paths
         source_file: Path to the source file (optional, used for relative path calculation)
+        images: Optional image index from image_derivatives; images listed in it
+            become responsive <img srcset=...> tags instead of markdown images
     """
+    resolver = mapping if isinstance(mapping, LinkResolver) else LinkResolver(mapping)
+    # Page links repeat a lot on link-dense pages; convert each distinct one once
+    converted_links = {}
+    
     def replace_wikilink(match):
+        link = match.group(0)
+        if link in converted_links:
+            return converted_links[link]
+        
         # Check if there's an exclamation mark before the wikilink
         has_exclamation = match.group(1) == '!'
-        full_link = match.group(2)
-        
-        # Handle display text (e.g., [[Link|Display]])
-        if '|' in full_link:
-            link_target, display_text = full_link.split('|', 1)
-        else:
-            link_target = full_link
-            display_text = full_link
-        
-        # Remove any path components from the link target (use just the page name)
-        if '/' in link_target:
-            link_target = link_target.split('/')[-1]
-        
-        # Check if this is an image link
-        is_image = False
-        for ext in ['.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp']:
-            if link_target.lower().endswith(ext):
-                is_image = True
-                break
+        link_target, display_text, is_image = parse_wikilink(match.group(2))
         
         if is_image:
             # Handle image links - they go to assets/
-            name_without_ext = os.path.splitext(link_target)[0]
-            ext = os.path.splitext(link_target)[1]
-            slug = slugify(name_without_ext)
+            asset_name = resolver.asset_name(link_target)
+            if images and asset_name in images:
+                return responsive_image(match, display_text, asset_name)
             # Calculate relative path to assets
             if source_file:
-                image_path = calculate_relative_path(source_file, f'assets/{slug}{ext}')
+                image_path = resolver.relative_path(source_file, f'assets/{asset_name}')
             else:
-                image_path = f'/assets/{slug}{ext}'
+                image_path = f'/assets/{asset_name}'
             return f'![{display_text}]({image_path})'
         
-        # Remove .md extension if present
-        link_target = link_target.replace('.md', '')
-        
         # Look up the target in the mapping
-        if link_target in mapping:
-            target_path = mapping[link_target]
+        target_path = resolver.resolve(page_link_target(match.group(2)))
+        if target_path is not None:
             # Calculate relative path from source to target
-            new_path = calculate_relative_path(source_file, target_path)
-            return f'[{display_text}]({new_path})'
+            new_path = resolver.relative_path(source_file, target_path)
+            converted_links[link] = f'[{display_text}]({new_path})'
+            return converted_links[link]
         else:
             # If not found in mapping, create a simple slugified version
             slug = slugify(link_target)
+            instant('unresolved link', 'links', target=link_target, page=source_file)
             if source_file:
-                print(f"Warning: Link target '{link_target}' not found in mapping, using slug '{slug}.md'", file=sys.stderr)
+                log.warning(f"Link target '{link_target}' not found in mapping, using slug '{slug}.md'")
                 # Try to create a reasonable relative path
-                new_path = calculate_relative_path(source_file, f'{slug}.md')
+                new_path = resolver.relative_path(source_file, f'{slug}.md')
             else:
-                print(f"Warning: Link target '{link_target}' not found in mapping, using slug '/{slug}.md'", file=sys.stderr)
+                log.warning(f"Link target '{link_target}' not found in mapping, using slug '/{slug}.md'")
                 new_path = f'/{slug}.md'
             return f'[{display_text}]({new_path})'
     
-    # Replace wikilinks, optionally with ! prefix
-    # Captures optional ! before [[...]]
-    pattern = r'(!?)\[\[([^\]]+)\]\]'
-    return re.sub(pattern, replace_wikilink, content)
+    def responsive_image(match, display_text, asset_name):
+        # Raw HTML isn't rewritten by MkDocs, so link relative to the page's URL
+        url_file = page_url_file(source_file) if source_file else None
+        
+        def relative_path(path):
+            return resolver.relative_path(url_file, path)
+        
+        # Only look at the text right before the link instead of copying everything before it
+        text = match.string
+        end = match.start()
+        while end > 0 and text[end - 1].isspace():
+            end -= 1
+        in_info_box = text.endswith(INFO_BOX_IMAGE_DIV, 0, end)
+        return responsive_image_html(display_text, relative_path(f'assets/{asset_name}'),
+                                     images[asset_name], relative_path, in_info_box)
+    
+    return WIKILINK_PATTERN.sub(replace_wikilink, content)
 
 
 def process_file(filepath, mapping, docs_dir='.site_content'):
@@ -157,49 +339,96 @@ def process_file(filepath, mapping, docs_dir='.site_content'):
     
     Args:
         filepath: Path to the file to process
-        mapping: Dictionary mapping page names to their paths
+        mapping: A LinkResolver, or a dictionary mapping page names to their paths
         docs_dir: The docs directory (used to calculate relative paths)
     """
-    with open(filepath, 'r', encoding='utf-8') as f:
-        content = f.read()
+    with span('wikilinks', 'file', file=filepath):
+        with open(filepath, 'r', encoding='utf-8') as f:
+            content = f.read()
+        
+        # Get the relative path from docs_dir for proper link calculation
+        if filepath.startswith(docs_dir + '/'):
+            relative_path = filepath[len(docs_dir) + 1:]
+        else:
+            relative_path = filepath
+        
+        new_content = convert_wikilinks(content, mapping, relative_path)
+        
+        if new_content != content:
+            return write_if_changed(filepath, new_content)
+        return False
+
+
+# Read-only state shared by _convert_file(), set once per worker process
+_worker_state = {}
+
+
+def _init_worker(mapping, docs_dir):
+    _worker_state['mapping'] = mapping if isinstance(mapping, LinkResolver) else LinkResolver(mapping)
+    _worker_state['docs_dir'] = docs_dir
+
+
+def _convert_file(filepath):
+    return process_file(filepath, _worker_state['mapping'], _worker_state['docs_dir'])
+
+
+def process_directory(directory, mapping, files=None, jobs=1):
+    """Process all markdown files in a directory.
     
-    # Get the relative path from docs_dir for proper link calculation
-    if filepath.startswith(docs_dir + '/'):
-        relative_path = filepath[len(docs_dir) + 1:]
-    else:
-        relative_path = filepath
+    Args:
+        directory: The docs directory to process
+        mapping: A LinkResolver, or a dictionary mapping page names to their paths
+        files: Optional list of files to process instead of walking the whole directory
+        jobs: Number of worker processes (0 means one per CPU)
+    """
+    from parallel import parallel_map
     
-    new_content = convert_wikilinks(content, mapping, relative_path)
+    if files is None:
+        files = []
+        for root, dirs, filenames in os.walk(directory):
+            for filename in filenames:
+                if filename.endswith('.md'):
+                    files.append(os.path.join(root, filename))
     
-    if new_content != content:
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(new_content)
-        return True
-    return False
-
-
-def process_directory(directory, mapping):
-    """Process all markdown files in a directory."""
-    changed_count = 0
+    changed = parallel_map(_convert_file, files, jobs,
+                           initializer=_init_worker, initargs=(mapping, directory))
     
-    for root, dirs, files in os.walk(directory):
-        for filename in files:
-            if filename.endswith('.md'):
-                filepath = os.path.join(root, filename)
-                if process_file(filepath, mapping, directory):
-                    changed_count += 1
-                    print(f"Updated wikilinks in: {filepath}")
+    changed_count = 0
+    for filepath, was_changed in zip(files, changed):
+        if was_changed:
+            changed_count += 1
+            log.debug(f"Updated wikilinks in: {filepath}")
     
-    print(f"\nTotal files updated: {changed_count}")
+    log.info(f"\nTotal files updated: {changed_count}")
 
 
 if __name__ == '__main__':
-    if len(sys.argv) != 3:
-        print("Usage: convert_wikilinks.py <directory> <mapping_file>")
+    from parallel import pop_jobs_arg
+    from tracing import setup_from_argv
+    jobs = pop_jobs_arg(sys.argv)
+    setup_from_argv(sys.argv)
+    
+    if len(sys.argv) not in (3, 4):
+        print("Usage: convert_wikilinks.py <directory> <mapping_file> [manifest_file] [--jobs N] [--trace FILE] [-v|-q]")
         sys.exit(1)
     
     directory = sys.argv[1]
     mapping_file = sys.argv[2]
     
-    mapping = load_mapping(mapping_file)
-    process_directory(directory, mapping)
+    mapping = LinkResolver(load_mapping(mapping_file))
+    # Written by the reorganize stage's copy_assets
+    mapping.assets = load_asset_manifest(directory)
+    
+    if len(sys.argv) == 4:
+        # Incremental build: only convert notes the reorganize stage rewrote,
+        # then record their final output hashes
+        from build_manifest import BuildManifest
+        manifest = BuildManifest(sys.argv[3])
+        with span('wikilinks'):
+            process_directory(directory, mapping, manifest.stale_files(directory), jobs)
+        with span('save manifest'):
+            manifest.finalize(directory)
+            manifest.save()
+    else:
+        with span('wikilinks'):
+            process_directory(directory, mapping, jobs=jobs)
@@ -0,0 +1,495 @@
+#!/usr/bin/env python3
+"""
+Render Dataview queries into Markdown at build time.
+
+Obsidian's Dataview plugin runs ```dataview queries in the editor; the site
+gets them as plain lists and tables instead. The common subset is supported:
+
+    LIST [WITHOUT ID] [expression]
+    TABLE [WITHOUT ID] expression [AS "Header"], ...
+    FROM "Folder" | #tag (combined with AND, OR, - and parentheses)
+    WHERE expression
+    SORT expression [ASC|DESC], ...
+    LIMIT n
+
+Expressions compare info box fields (the `Key: Value` lines of a <block> or
+opening code block), file.name, file.folder, file.path and file.tags with
+=, !=, <, >, <=, >=, AND, OR, ! and the functions contains, startswith,
+endswith, length, lower and upper. Comparisons ignore case and compare
+wikilinks by page name, so `WHERE Faction = [[Wolves]]` matches
+`Faction: [[Groups/Wolves|The Wolves]]`.
+
+The DataviewIndex is built once per build from every note's tags, folder and
+fields (kept in the build manifest, so unchanged notes are never re-read).
+FROM is answered from the tag and folder indexes and each distinct query is
+evaluated once, however many pages embed it. Result pages are rendered as
+wikilinks, which the wikilink stage turns into links.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+
+from preprocess_dataviews import info_box_field
+
+log = logging.getLogger(__name__)
+
+DATAVIEW_BLOCK = re.compile(r'```dataview([\s\S]*?)```')
+BLOCK_TAG = re.compile(r'<block>\s*([\s\S]*?)\s*</block>')
+LEADING_CODE_BLOCK = re.compile(r'^\s*```\s*\n([\s\S]*?)\n```')
+CODE_BLOCK = re.compile(r'```[\s\S]*?```')
+# Obsidian tags: a # after whitespace (or at the start of a line), with at least one non-digit
+TAG = re.compile(r'(?:^|(?<=\s))#([\w/-]*[^\W\d][\w/-]*)')
+WIKILINK_VALUE = re.compile(r'^!?\[\[([^\]|\\]+)(?:\\?\|[^\]]*)?\]\]$')
+
+TOKEN = re.compile(r'''
+    \s*(?:
+        (?P<string>"(?:[^"\\]|\\.)*")
+      | (?P<link>\[\[[^\]]+\]\])
+      | (?P<tag>\#[\w/-]+)
+      | (?P<number>-?\d+(?:\.\d+)?(?![\w.]))
+      | (?P<operator>!=|<=|>=|=|<|>|!|-|\(|\)|,)
+      | (?P<name>[^\W\d][\w.-]*)
+    )''', re.VERBOSE)
+
+KEYWORDS = {'list', 'table', 'without', 'id', 'from', 'where', 'sort', 'limit', 'and', 'or',
+            'as', 'asc', 'ascending', 'desc', 'descending'}
+CLAUSES = {'from', 'where', 'sort', 'limit'}
+
+
+class DataviewError(ValueError):
+    """A query outside the supported subset."""
+
+
+def normalize_key(key):
+    """Normalize a field name the way Dataview does (case-insensitive, spaces as dashes)."""
+    return re.sub(r'[\s_-]+', '-', key.strip().casefold())
+
+
+def extract_queries(content):
+    """Return the text of every ```dataview query in a note."""
+    return [match.group(1) for match in DATAVIEW_BLOCK.finditer(content)]
+
+
+def extract_metadata(content):
+    """
+    Return the tags and info box fields of a note.
+
+    Returns {'tags': [...], 'fields': {key as written: value}}; tags are
+    lowercase and without the #. Fields come from <block> tags and from a
+    code block opening the note, like the info boxes built from them.
+    """
+    blocks = [match.group(1) for match in BLOCK_TAG.finditer(content)]
+    leading = LEADING_CODE_BLOCK.match(content)
+    if leading:
+        blocks.insert(0, leading.group(1))
+    fields = {}
+    for block in blocks:
+        for line in block.split('\n'):
+            field = info_box_field(line)
+            if field and field[0] not in fields:
+                fields[field[0]] = field[1]
+
+    text = CODE_BLOCK.sub('', content)
+    tags = sorted({tag.lower() for tag in TAG.findall(text)})
+    return {'tags': tags, 'fields': fields}
+
+
+def comparable(value):
+    """Return a value as compared by queries: numbers as floats, links by page name, text casefolded."""
+    if isinstance(value, bool) or value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, list):
+        return [comparable(item) for item in value]
+    value = value.strip()
+    link = WIKILINK_VALUE.match(value)
+    if link:
+        value = link.group(1).split('/')[-1].replace('.md', '')
+    try:
+        return float(value)
+    except ValueError:
+        return value.casefold()
+
+
+def sort_key(value):
+    """Sort empty values last, numbers before text."""
+    value = comparable(value)
+    if value is None or value == '' or value == []:
+        return (2, 0)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (0, value)
+    return (1, str(value))
+
+
+def display(value):
+    """Render a value for a list item or table cell."""
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, list):
+        return ', '.join(display(item) for item in value)
+    return str(value)
+
+
+def _compare(operator, left, right):
+    left, right = comparable(left), comparable(right)
+    if operator == '=':
+        return left == right
+    if operator == '!=':
+        return left != right
+    if left is None or right is None:
+        return False
+    if isinstance(left, float) != isinstance(right, float):
+        left, right = str(left), str(right)
+    try:
+        return {'<': left < right, '>': left > right, '<=': left <= right, '>=': left >= right}[operator]
+    except TypeError:
+        return False
+
+
+def _contains(haystack, needle):
+    if isinstance(haystack, list):
+        needle = comparable(needle)
+        return any(comparable(item) == needle for item in haystack)
+    if haystack is None or needle is None:
+        return False
+    return str(comparable(needle)) in str(comparable(haystack))
+
+
+def _text(value):
+    return value.casefold() if isinstance(value, str) else str(comparable(value))
+
+
+FUNCTIONS = {
+    'contains': (2, _contains),
+    'startswith': (2, lambda value, prefix: value is not None and _text(value).startswith(_text(prefix))),
+    'endswith': (2, lambda value, suffix: value is not None and _text(value).endswith(_text(suffix))),
+    'length': (1, lambda value: len(value) if isinstance(value, (list, str)) else 0),
+    'lower': (1, lambda value: value.lower() if isinstance(value, str) else value),
+    'upper': (1, lambda value: value.upper() if isinstance(value, str) else value),
+}
+
+
+class Query:
+    """A parsed query: its type, columns, FROM source and WHERE/SORT/LIMIT clauses."""
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = []
+        position = 0
+        text = text.strip()
+        while position < len(text):
+            match = TOKEN.match(text, position)
+            if not match or match.end() == position:
+                raise DataviewError(f"unexpected {text[position:].strip()[:20]!r}")
+            kind = match.lastgroup
+            value = match.group(kind)
+            start = match.start(kind)
+            if kind == 'name' and value.lower() in KEYWORDS:
+                kind, value = 'keyword', value.lower()
+            self.tokens.append((kind, value, start, match.end()))
+            position = match.end()
+            while position < len(text) and text[position].isspace():
+                position += 1
+        self.source_text = text
+        self.position = 0
+
+        self.kind = self._expect_keyword('list', 'table')
+        self.with_id = True
+        if self._accept_keyword('without'):
+            self._expect_keyword('id')
+            self.with_id = False
+        self.columns = []  # (header, expression)
+        if self.kind == 'table' or not self._at_clause():
+            while not self._at_clause():
+                start = self._peek()[2]
+                expression = self._expression()
+                header = self.source_text[start:self.tokens[self.position - 1][3]].strip()
+                if self._accept_keyword('as'):
+                    header = self._literal('string')
+                self.columns.append((header, expression))
+                if self.kind == 'list' or not self._accept('operator', ','):
+                    break
+        self.source = None
+        self.where = None
+        self.sort = []  # (expression, descending)
+        self.limit = None
+        while self.position < len(self.tokens):
+            clause = self._expect_keyword(*CLAUSES)
+            if clause == 'from':
+                self.source = self._source()
+            elif clause == 'where':
+                self.where = self._expression()
+            elif clause == 'sort':
+                while True:
+                    expression = self._expression()
+                    descending = self._accept_keyword('desc', 'descending') is not None
+                    if not descending:
+                        self._accept_keyword('asc', 'ascending')
+                    self.sort.append((expression, descending))
+                    if not self._accept('operator', ','):
+                        break
+            else:
+                self.limit = int(float(self._literal('number')))
+
+    # Tokens
+
+    def _peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return (None, None, len(self.source_text), len(self.source_text))
+
+    def _accept(self, kind, *values):
+        token = self._peek()
+        if token[0] == kind and (not values or token[1] in values):
+            self.position += 1
+            return token[1]
+        return None
+
+    def _accept_keyword(self, *keywords):
+        return self._accept('keyword', *keywords)
+
+    def _expect_keyword(self, *keywords):
+        keyword = self._accept_keyword(*keywords)
+        if keyword is None:
+            raise DataviewError(f"expected {' or '.join(k.upper() for k in keywords)}, found {self._peek()[1]!r}")
+        return keyword
+
+    def _literal(self, kind):
+        value = self._accept(kind)
+        if value is None:
+            raise DataviewError(f"expected a {kind}, found {self._peek()[1]!r}")
+        return json.loads(value) if kind == 'string' else value
+
+    def _at_clause(self):
+        token = self._peek()
+        return token[0] is None or (token[0] == 'keyword' and token[1] in CLAUSES)
+
+    # FROM sources evaluate to sets of page keys (see DataviewIndex.source_keys)
+
+    def _source(self):
+        left = self._source_and()
+        while self._accept_keyword('or'):
+            left = ('or', left, self._source_and())
+        return left
+
+    def _source_and(self):
+        left = self._source_term()
+        while self._accept_keyword('and'):
+            left = ('and', left, self._source_term())
+        return left
+
+    def _source_term(self):
+        if self._accept('operator', '-', '!'):
+            return ('not', self._source_term())
+        if self._accept('operator', '('):
+            source = self._source()
+            if not self._accept('operator', ')'):
+                raise DataviewError("expected ')'")
+            return source
+        tag = self._accept('tag')
+        if tag is not None:
+            return ('tag', tag[1:].lower())
+        folder = self._accept('string')
+        if folder is not None:
+            return ('folder', json.loads(folder).strip('/'))
+        raise DataviewError(f"unsupported FROM source {self._peek()[1]!r}")
+
+    # Expressions compile to functions of a page
+
+    def _expression(self):
+        left = self._and_expression()
+        while self._accept_keyword('or'):
+            left = (lambda a, b: lambda page: bool(a(page)) or bool(b(page)))(left, self._and_expression())
+        return left
+
+    def _and_expression(self):
+        left = self._not_expression()
+        while self._accept_keyword('and'):
+            left = (lambda a, b: lambda page: bool(a(page)) and bool(b(page)))(left, self._not_expression())
+        return left
+
+    def _not_expression(self):
+        if self._accept('operator', '!'):
+            operand = self._not_expression()
+            return lambda page: not operand(page)
+        left = self._primary()
+        operator = self._accept('operator', '=', '!=', '<', '>', '<=', '>=')
+        if operator is None:
+            return left
+        right = self._primary()
+        return lambda page: _compare(operator, left(page), right(page))
+
+    def _primary(self):
+        kind, value = self._peek()[:2]
+        if self._accept('operator', '('):
+            expression = self._expression()
+            if not self._accept('operator', ')'):
+                raise DataviewError("expected ')'")
+            return expression
+        if kind in ('string', 'number', 'link', 'tag'):
+            self.position += 1
+            literal = {'string': json.loads, 'number': float, 'link': str,
+                       'tag': lambda tag: tag[1:].lower()}[kind](value)
+            return lambda page: literal
+        if kind != 'name':
+            raise DataviewError(f"unexpected {value!r}")
+        self.position += 1
+        if value.lower() in ('true', 'false'):
+            return lambda page: value.lower() == 'true'
+        if value.lower() == 'null':
+            return lambda page: None
+        if self._accept('operator', '('):
+            if value.lower() not in FUNCTIONS:
+                raise DataviewError(f"unsupported function {value}()")
+            arity, function = FUNCTIONS[value.lower()]
+            arguments = []
+            while not self._accept('operator', ')'):
+                if arguments and not self._accept('operator', ','):
+                    raise DataviewError("expected ',' or ')'")
+                arguments.append(self._expression())
+            if len(arguments) != arity:
+                raise DataviewError(f"{value}() takes {arity} argument(s)")
+            return lambda page: function(*(argument(page) for argument in arguments))
+        field = normalize_key(value)
+        return lambda page: page['fields'].get(field)
+
+
+class DataviewIndex:
+    """
+    Tags, folders and info box fields of every published note, shared by all queries of a build.
+
+    Args:
+        pages: (key, output, metadata) for every note, where key is the note's
+            path relative to the source directory and metadata comes from
+            extract_metadata()
+    """
+
+    def __init__(self, pages):
+        self.pages = {}
+        self.by_tag = {}     # tag (and every parent of a nested tag) -> page keys
+        self.by_folder = {}  # folder (and every parent folder, '' for the root) -> page keys
+        name_counts = {}
+        for key, output, metadata in pages:
+            folder = os.path.dirname(key)
+            name = os.path.splitext(os.path.basename(key))[0]
+            tags = metadata.get('tags', [])
+            self.pages[key] = {
+                'key': key,
+                'name': name,
+                'output': output,
+                'fields': {normalize_key(field): value for field, value in metadata.get('fields', {}).items()},
+            }
+            page_fields = self.pages[key]['fields']
+            page_fields.setdefault('file.name', name)
+            page_fields.setdefault('file.folder', folder)
+            page_fields.setdefault('file.path', key)
+            page_fields.setdefault('file.tags', ['#' + tag for tag in tags])
+            name_counts[name.casefold()] = name_counts.get(name.casefold(), 0) + 1
+            for tag in tags:
+                parts = tag.split('/')
+                for i in range(1, len(parts) + 1):
+                    self.by_tag.setdefault('/'.join(parts[:i]), set()).add(key)
+            parts = folder.split('/') if folder else []
+            for i in range(len(parts) + 1):
+                self.by_folder.setdefault('/'.join(parts[:i]), set()).add(key)
+        for page in self.pages.values():
+            # Notes sharing a name are linked by path so the wikilink stage picks the right one
+            unique = name_counts[page['name'].casefold()] == 1
+            page['link'] = f"[[{page['name'] if unique else os.path.splitext(page['key'])[0]}]]"
+            page['fields'].setdefault('file.link', page['link'])
+        self._rendered = {}
+
+    def source_keys(self, source):
+        """Return the keys of the pages matching a parsed FROM source."""
+        if source is None:
+            return set(self.pages)
+        kind = source[0]
+        if kind == 'tag':
+            return set(self.by_tag.get(source[1], ()))
+        if kind == 'folder':
+            return set(self.by_folder.get(source[1], ()))
+        if kind == 'not':
+            return set(self.pages) - self.source_keys(source[1])
+        left, right = self.source_keys(source[1]), self.source_keys(source[2])
+        return left & right if kind == 'and' else left | right
+
+    def evaluate(self, query):
+        """Return the pages a parsed query selects, in order."""
+        pages = [self.pages[key] for key in sorted(self.source_keys(query.source))]
+        if query.where is not None:
+            pages = [page for page in pages if query.where(page)]
+        for expression, descending in reversed(query.sort):
+            present = [page for page in pages if sort_key(expression(page))[0] < 2]
+            present.sort(key=lambda page: sort_key(expression(page)), reverse=descending)
+            # Pages without a value stay last either way
+            pages = present + [page for page in pages if sort_key(expression(page))[0] == 2]
+        if query.limit is not None:
+            pages = pages[:query.limit]
+        return pages
+
+    def _render(self, text):
+        query = Query(text)
+        pages = self.evaluate(query)
+        outputs = [page['output'] for page in pages]
+        if not pages:
+            return f"*No results for this {query.kind}.*", outputs
+
+        if query.kind == 'list':
+            lines = []
+            for page in pages:
+                parts = [page['link']] if query.with_id else []
+                parts += [display(expression(page)) for header, expression in query.columns]
+                lines.append('- ' + ': '.join(parts))
+            return '\n'.join(lines), outputs
+
+        headers = (['File'] if query.with_id else []) + [header for header, expression in query.columns]
+        lines = ['| ' + ' | '.join(headers) + ' |', '|' + ' --- |' * len(headers)]
+        for page in pages:
+            cells = [page['link']] if query.with_id else []
+            cells += [display(expression(page)) for header, expression in query.columns]
+            # Obsidian's escape for pipes in tables, also inside [[Page\|Alias]]
+            lines.append('| ' + ' | '.join(cell.replace('|', '\\|') for cell in cells) + ' |')
+        return '\n'.join(lines), outputs
+
+    def rendered(self, text):
+        """Return (markdown, result outputs) of a query, evaluated once per build."""
+        if text not in self._rendered:
+            try:
+                self._rendered[text] = self._render(text)
+            except DataviewError as e:
+                log.warning(f"Unsupported Dataview query ({e}), left as text: {' '.join(text.split())}")
+                self._rendered[text] = ('Dataview Query: ' + text, [])
+        return self._rendered[text]
+
+    def render(self, text):
+        """Return the Markdown replacing a ```dataview block with the given query text."""
+        markdown = self.rendered(text)[0]
+        return markdown if markdown.startswith('Dataview Query: ') else '\n' + markdown + '\n'
+
+    def fingerprint(self, queries):
+        """Return a hash of the results of a note's queries, or None if it has none."""
+        if not queries:
+            return None
+        results = json.dumps([self.rendered(text) for text in queries])
+        return hashlib.sha256(results.encode('utf-8')).hexdigest()[:16]
+
+
+def index_directory(directory):
+    """Build a DataviewIndex from the notes in a directory (for the standalone preprocess script)."""
+    pages = []
+    for root, dirs, filenames in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        for filename in sorted(filenames):
+            if filename.endswith('.md') and not filename.startswith('.'):
+                filepath = os.path.join(root, filename)
+                with open(filepath, 'r', encoding='utf-8') as f:
+                    metadata = extract_metadata(f.read())
+                key = os.path.relpath(filepath, directory).replace(os.sep, '/')
+                pages.append((key, key, metadata))
+    return DataviewIndex(pages)
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Generate responsive image derivatives for the site assets.
+
+For every raster image in the docs assets directory this stage:
+1. Generates resized WebP (and AVIF, where Pillow supports it) copies at a
+   few widths, stored in a content-addressed cache (.image_cache) so each
+   source image is only ever processed once
+2. Links the derivatives into assets/_img/ next to the originals
+3. Writes an image index that convert_wikilinks uses to turn image
+   wikilinks into <img srcset=... loading="lazy" width=... height=...>
+
+Pillow is optional: without it the stage is skipped with a warning and
+image wikilinks stay plain markdown images.
+"""
+
+import hashlib
+import html
+import json
+import logging
+import os
+import sys
+
+from output_files import write_if_changed
+from reorganize_files import asset_is_current, sync_file
+from tracing import span
+
+log = logging.getLogger(__name__)
+
+# Bump when the widths, formats or encoder settings change so the cache is regenerated
+DERIVATIVE_VERSION = 1
+
+DERIVATIVE_WIDTHS = [320, 640, 1280]
+
+# Encoder settings per output format, in <picture> preference order
+FORMATS = {
+    'avif': {'quality': 50, 'speed': 6},
+    'webp': {'quality': 80, 'method': 6},
+}
+
+RASTER_EXTENSIONS = ['.png', '.jpg', '.jpeg', '.webp']
+
+DERIVATIVES_DIR = '_img'
+
+# The info box is 300px wide on desktop and full width on phones (see extra.css)
+INFO_BOX_SIZES = '(max-width: 768px) 100vw, 300px'
+CONTENT_SIZES = '(max-width: 768px) 100vw, 800px'
+
+
+def available_formats():
+    """Return the derivative formats the installed Pillow can encode (empty without Pillow)."""
+    try:
+        from PIL import features
+    except ImportError:
+        return []
+    return [fmt for fmt in FORMATS if features.check(fmt)]
+
+
+def derivative_widths(width):
+    """Return the widths to generate for an image that is `width` pixels wide."""
+    widths = [w for w in DERIVATIVE_WIDTHS if w < width]
+    widths.append(min(width, DERIVATIVE_WIDTHS[-1]))
+    return sorted(set(widths))
+
+
+class SourceHashCache:
+    """Remembers source image hashes by (size, mtime) so unchanged images are never re-read."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def hash(self, filepath):
+        st = os.stat(filepath)
+        key = os.path.abspath(filepath)
+        entry = self.entries.get(key)
+        if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            return entry[2]
+        digest = hashlib.sha256()
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        self.entries[key] = [st.st_size, st.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def generate_derivatives(task):
+    """
+    Generate every derivative of one source image into its cache directory.
+
+    Runs in a worker process when building with --jobs. Returns the image
+    info dict: {'width', 'height', 'files': {format: [[width, cache file], ...]}}.
+    """
+    source_file, cache_dir, formats = task
+    info_file = os.path.join(cache_dir, 'info.json')
+    if os.path.exists(info_file):
+        with open(info_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    from PIL import Image
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with span('image', 'file', file=source_file), Image.open(source_file) as image:
+        image.load()
+        width, height = image.size
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+        files = {}
+        for fmt in formats:
+            files[fmt] = []
+            for target_width in derivative_widths(width):
+                target_height = max(1, round(height * target_width / width))
+                resized = image if target_width == width else image.resize(
+                    (target_width, target_height), Image.LANCZOS)
+                cache_file = os.path.join(cache_dir, f'{target_width}.{fmt}')
+                resized.save(cache_file + '.tmp', format=fmt.upper(), **FORMATS[fmt])
+                os.replace(cache_file + '.tmp', cache_file)
+                files[fmt].append([target_width, os.path.basename(cache_file)])
+
+    info = {'width': width, 'height': height, 'files': files}
+    # Written last: its presence marks the cache entry as complete
+    with open(info_file + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(info, f, indent=2)
+    os.replace(info_file + '.tmp', info_file)
+    return info
+
+
+def build_image_derivatives(dest_dir, cache_dir='.image_cache', index_file=None, jobs=1):
+    """
+    Generate (or reuse) derivatives for every raster image in dest_dir/assets.
+
+    Args:
+        dest_dir: The docs directory (assets are expected in dest_dir/assets)
+        cache_dir: Content-addressed derivative cache, kept between builds
+        index_file: Optional path to save the image index as JSON
+        jobs: Number of worker processes (0 means one per CPU)
+
+    Returns the image index: asset file name -> {'width', 'height',
+    'variants': {format: [[width, path relative to dest_dir], ...]}}.
+    """
+    from parallel import parallel_map
+
+    formats = available_formats()
+    if not formats:
+        log.warning("Pillow with WebP/AVIF support is not installed, skipping responsive images")
+        return {}
+
+    assets_dir = os.path.join(dest_dir, 'assets')
+    if not os.path.isdir(assets_dir):
+        return {}
+    derivatives_dir = os.path.join(assets_dir, DERIVATIVES_DIR)
+    os.makedirs(cache_dir, exist_ok=True)
+    os.makedirs(derivatives_dir, exist_ok=True)
+
+    hashes = SourceHashCache(os.path.join(cache_dir, 'sources.json'))
+    images = []
+    tasks = []
+    for filename in sorted(os.listdir(assets_dir)):
+        source_file = os.path.join(assets_dir, filename)
+        if os.path.splitext(filename)[1].lower() not in RASTER_EXTENSIONS or not os.path.isfile(source_file):
+            continue
+        key = f'{hashes.hash(source_file)}-v{DERIVATIVE_VERSION}-{"-".join(formats)}'
+        images.append((filename, os.path.join(cache_dir, key)))
+        tasks.append((source_file, os.path.join(cache_dir, key), formats))
+    hashes.save()
+
+    # Every image is expensive to encode, so use the pool for any batch of cache misses
+    missing = [task for task in tasks if not os.path.exists(os.path.join(task[1], 'info.json'))]
+    parallel_map(generate_derivatives, missing, jobs, min_items=2)
+    results = [generate_derivatives(task) for task in tasks]
+
+    index = {}
+    expected = set()
+    linked_count = 0
+    for (filename, entry_dir), info in zip(images, results):
+        stem = os.path.splitext(filename)[0]
+        variants = {}
+        for fmt, files in info['files'].items():
+            variants[fmt] = []
+            for width, cache_name in files:
+                derivative_name = f'{stem}-{width}w.{fmt}'
+                derivative_file = os.path.join(derivatives_dir, derivative_name)
+                cache_file = os.path.join(entry_dir, cache_name)
+                expected.add(derivative_name)
+                if not asset_is_current(cache_file, derivative_file):
+                    sync_file(cache_file, derivative_file)
+                    linked_count += 1
+                variants[fmt].append([width, f'assets/{DERIVATIVES_DIR}/{derivative_name}'])
+        index[filename] = {'width': info['width'], 'height': info['height'], 'variants': variants}
+
+    # Prune derivatives of images that no longer exist
+    for derivative_name in sorted(os.listdir(derivatives_dir)):
+        if derivative_name not in expected:
+            os.remove(os.path.join(derivatives_dir, derivative_name))
+
+    if index_file:
+        write_if_changed(index_file, json.dumps(index, indent=2, sort_keys=True))
+
+    log.info(f"Responsive images: {len(index)} images, {linked_count} derivatives updated")
+    return index
+
+
+def page_url_file(source_file):
+    """
+    Return a file path whose directory is the URL directory of a page.
+
+    Raw HTML is not rewritten by MkDocs, and with use_directory_urls (the
+    default) page.md is served from page/, so relative links in raw HTML
+    need to start one level deeper than links in markdown.
+    """
+    if os.path.basename(source_file) == 'index.md':
+        return source_file
+    return source_file[:-len('.md')] + '/index.md' if source_file.endswith('.md') else source_file
+
+
+def responsive_image_html(alt, src, info, relative_path, in_info_box=False):
+    """
+    Build the <img> (or <picture>, when AVIF derivatives exist) for an image.
+
+    Args:
+        alt: Alternative text
+        src: URL of the original image (fallback for browsers without srcset)
+        info: The image's entry in the image index
+        relative_path: Callable turning a path relative to the docs directory into a URL
+        in_info_box: Whether the image is shown in an info box (affects `sizes`)
+    """
+    sizes = INFO_BOX_SIZES if in_info_box else CONTENT_SIZES
+
+    def srcset(fmt):
+        return ', '.join(f'{relative_path(path)} {width}w' for width, path in info['variants'][fmt])
+
+    attributes = (f'src="{html.escape(src)}" alt="{html.escape(alt)}" '
+                  f'width="{info["width"]}" height="{info["height"]}" '
+                  f'loading="lazy" decoding="async"')
+    img_format = 'webp' if 'webp' in info['variants'] else next(iter(info['variants']))
+    img = f'<img {attributes} srcset="{html.escape(srcset(img_format))}" sizes="{sizes}">'
+
+    sources = [fmt for fmt in info['variants'] if fmt != img_format]
+    if not sources:
+        return img
+    source_tags = ''.join(
+        f'<source type="image/{fmt}" srcset="{html.escape(srcset(fmt))}" sizes="{sizes}">' for fmt in sources)
+    return f'<picture>{source_tags}{img}</picture>'
+
+
+def load_image_index(index_file):
+    """Load an image index saved by build_image_derivatives (empty if missing)."""
+    if not index_file or not os.path.exists(index_file):
+        return {}
+    with open(index_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+if __name__ == '__main__':
+    from parallel import pop_jobs_arg
+    from tracing import setup_from_argv
+    jobs = pop_jobs_arg(sys.argv)
+    setup_from_argv(sys.argv)
+
+    if len(sys.argv) not in (2, 3, 4):
+        print("Usage: image_derivatives.py <dest_dir> [cache_dir] [index_file] [--jobs N] [--trace FILE] [-v|-q]")
+        sys.exit(1)
+
+    dest_dir = sys.argv[1]
+    cache_dir = sys.argv[2] if len(sys.argv) > 2 else '.image_cache'
+    index_file = sys.argv[3] if len(sys.argv) > 3 else None
+
+    with span('responsive images'):
+        build_image_derivatives(dest_dir, cache_dir, index_file, jobs)
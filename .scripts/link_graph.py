@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Persistent link graph of the published site, stored in SQLite.
+
+The build pipeline records every page, its outgoing wikilinks (and what they
+resolved to) and the assets it embeds. Only notes whose source or link
+resolution changed are rewritten, so the graph stays current without
+re-scanning the vault. It answers, each through an index:
+1. What links here (backlinks of a page, injected into pages with --backlinks)
+2. Which pages embed an asset
+3. Which link targets don't resolve
+
+Usage: link_graph.py <graph_file> backlinks <output> | embeds <asset> | unresolved
+"""
+
+import os
+import sqlite3
+import sys
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS pages (
+    key TEXT PRIMARY KEY,           -- Build manifest key (note path relative to the source directory)
+    output TEXT NOT NULL,           -- Output path relative to the docs directory
+    title TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_output ON pages (output);
+
+CREATE TABLE IF NOT EXISTS links (
+    source TEXT NOT NULL,           -- Key of the linking page
+    target TEXT NOT NULL,           -- Link target as written (see convert_wikilinks.page_link_target)
+    resolved TEXT,                  -- Output path it resolved to, NULL if unresolved
+    PRIMARY KEY (source, target)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS links_resolved ON links (resolved);
+
+CREATE TABLE IF NOT EXISTS images (
+    source TEXT NOT NULL,           -- Key of the embedding page
+    asset TEXT NOT NULL,            -- Asset name (see copy_assets)
+    PRIMARY KEY (source, asset)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS images_asset ON images (asset);
+'''
+
+
+class LinkGraph:
+    """The link graph of one docs directory, kept in a SQLite database file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.is_new = not os.path.exists(path)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def pages(self):
+        """Return page key -> (output, title) for every page in the graph."""
+        return {key: (output, title) for key, output, title in self.conn.execute(
+            'SELECT key, output, title FROM pages')}
+
+    def update_page(self, key, output, title, links, images):
+        """
+        Record a page's current output, title, links and embedded images.
+
+        Args:
+            key: The page's build manifest key
+            output: Output path relative to the docs directory
+            title: Page title shown in backlinks
+            links: Dictionary of link target as written -> resolved output path (or None)
+            images: Asset file names the page embeds
+
+        Returns the set of output paths whose backlinks changed.
+        """
+        row = self.conn.execute('SELECT output, title FROM pages WHERE key = ?', (key,)).fetchone()
+        old_links = dict(self.conn.execute('SELECT target, resolved FROM links WHERE source = ?', (key,)))
+        old_images = {asset for asset, in self.conn.execute('SELECT asset FROM images WHERE source = ?', (key,))}
+        if row == (output, title) and old_links == links and old_images == set(images):
+            return set()
+
+        old_targets = set(old_links.values())
+        new_targets = set(links.values())
+        if row == (output, title):
+            affected = old_targets ^ new_targets
+        else:
+            # Every backlink to this page shows its title and path
+            affected = old_targets | new_targets
+
+        self.conn.execute('INSERT OR REPLACE INTO pages (key, output, title) VALUES (?, ?, ?)',
+                          (key, output, title))
+        if old_links != links:
+            self.conn.execute('DELETE FROM links WHERE source = ?', (key,))
+            self.conn.executemany('INSERT INTO links (source, target, resolved) VALUES (?, ?, ?)',
+                                  [(key, target, resolved) for target, resolved in sorted(links.items())])
+        if old_images != set(images):
+            self.conn.execute('DELETE FROM images WHERE source = ?', (key,))
+            self.conn.executemany('INSERT INTO images (source, asset) VALUES (?, ?)',
+                                  [(key, asset) for asset in sorted(set(images))])
+        affected.discard(None)
+        affected.discard(output)
+        return affected
+
+    def remove_page(self, key):
+        """Forget a page that is no longer published; returns the output paths whose backlinks changed."""
+        affected = {resolved for resolved, in self.conn.execute(
+            'SELECT resolved FROM links WHERE source = ? AND resolved IS NOT NULL', (key,))}
+        self.conn.execute('DELETE FROM pages WHERE key = ?', (key,))
+        self.conn.execute('DELETE FROM links WHERE source = ?', (key,))
+        self.conn.execute('DELETE FROM images WHERE source = ?', (key,))
+        return affected
+
+    def backlinks(self, output):
+        """Return [title, output] of every other page linking to output, sorted by title."""
+        return [[title, source_output] for title, source_output in self.conn.execute(
+            'SELECT DISTINCT pages.title, pages.output FROM links JOIN pages ON pages.key = links.source '
+            'WHERE links.resolved = ? AND pages.output != ? ORDER BY pages.title, pages.output',
+            (output, output))]
+
+    def pages_embedding(self, asset):
+        """Return the output paths of the pages embedding an asset."""
+        return [output for output, in self.conn.execute(
+            'SELECT pages.output FROM images JOIN pages ON pages.key = images.source '
+            'WHERE images.asset = ? ORDER BY pages.output', (asset,))]
+
+    def unresolved(self):
+        """Return (page output, link target) for every link that doesn't resolve."""
+        return list(self.conn.execute(
+            'SELECT pages.output, links.target FROM links JOIN pages ON pages.key = links.source '
+            'WHERE links.resolved IS NULL ORDER BY pages.output, links.target'))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[2] not in ('backlinks', 'embeds', 'unresolved'):
+        print("Usage: link_graph.py <graph_file> backlinks <output> | embeds <asset> | unresolved")
+        sys.exit(1)
+
+    graph = LinkGraph(sys.argv[1])
+    if sys.argv[2] == 'backlinks' and len(sys.argv) == 4:
+        for title, output in graph.backlinks(sys.argv[3]):
+            print(f"{output}\t{title}")
+    elif sys.argv[2] == 'embeds' and len(sys.argv) == 4:
+        for output in graph.pages_embedding(sys.argv[3]):
+            print(output)
+    elif sys.argv[2] == 'unresolved':
+        for output, target in graph.unresolved():
+            print(f"{output}\t{target}")
+    else:
+        print("Usage: link_graph.py <graph_file> backlinks <output> | embeds <asset> | unresolved")
+        sys.exit(1)
+    graph.close()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Write build outputs only when they change, and stage whole builds.
+
+Every stage writes through write_if_changed() (or copy_if_changed()), so an
+output whose content didn't change keeps its mtime: mkdocs serve doesn't
+reload for it and rsync or the Pages upload skip it. Changed files are
+written next to their destination and renamed into place, so a reader never
+sees half a file.
+
+A full build runs inside StagedOutput: the docs directory is cloned with
+hard links (no data is copied), the build works on the clone, and only once
+it finished are the files it changed renamed into the docs directory and the
+files it removed deleted. A build that fails half way leaves the docs
+directory as it was. Writes to the clone must replace files, never modify
+them in place, or the hard-linked original would change too.
+"""
+
+import filecmp
+import logging
+import os
+import shutil
+
+log = logging.getLogger(__name__)
+
+STAGING_SUFFIX = '.staging'
+
+
+def write_if_changed(path, text):
+    """
+    Write text to path unless the file already holds exactly that text.
+
+    Returns True if the file was written.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            if f.read() == text:
+                return False
+    except (FileNotFoundError, UnicodeDecodeError):
+        pass
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+    return True
+
+
+def copy_if_changed(source, dest):
+    """
+    Copy source to dest (with its mtime) unless dest already has the same content.
+
+    Has the signature of shutil.copy2, so it can be a copytree copy_function.
+    Returns dest.
+    """
+    if os.path.isfile(dest) and filecmp.cmp(source, dest, shallow=False):
+        return dest
+    tmp_path = dest + '.tmp'
+    shutil.copy2(source, tmp_path)
+    os.replace(tmp_path, dest)
+    return dest
+
+
+def replace_if_changed(tmp_path, path):
+    """
+    Rename a finished tmp_path over path, or discard it if path has the same content.
+
+    Returns True if path was replaced.
+    """
+    if os.path.isfile(path) and filecmp.cmp(tmp_path, path, shallow=False):
+        os.remove(tmp_path)
+        return False
+    os.replace(tmp_path, path)
+    return True
+
+
+def link_tree(source_dir, dest_dir):
+    """Recreate source_dir at dest_dir with every file hard linked (copied where linking fails)."""
+    for root, dirs, files in os.walk(source_dir):
+        target_root = os.path.join(dest_dir, os.path.relpath(root, source_dir))
+        os.makedirs(target_root, exist_ok=True)
+        for filename in files:
+            source_file = os.path.join(root, filename)
+            target_file = os.path.join(target_root, filename)
+            if os.path.islink(source_file):
+                os.symlink(os.readlink(source_file), target_file)
+                continue
+            try:
+                os.link(source_file, target_file)
+            except OSError:
+                shutil.copy2(source_file, target_file)
+
+
+class StagedOutput:
+    """
+    Build into a hard-linked clone of a directory, then move the changes in.
+
+        with StagedOutput('.site_content') as staging_dir:
+            build(..., staging_dir, ...)
+
+    On success, files that are new or were replaced in the clone are renamed
+    into the directory, and files (and empty directories) the build removed
+    are deleted; unchanged files, and the directory itself, are never
+    touched, so file watchers keep working. On an exception the clone is
+    discarded and the directory is left as it was.
+    """
+
+    def __init__(self, dest_dir):
+        self.dest_dir = os.path.normpath(dest_dir)
+        self.staging_dir = self.dest_dir + STAGING_SUFFIX
+        self.updated = 0
+        self.removed = 0
+
+    def __enter__(self):
+        # Left behind by a build that was killed
+        if os.path.exists(self.staging_dir):
+            shutil.rmtree(self.staging_dir)
+        if os.path.isdir(self.dest_dir):
+            link_tree(self.dest_dir, self.staging_dir)
+        else:
+            os.makedirs(self.staging_dir)
+        return self.staging_dir
+
+    def __exit__(self, exc_type, exc, traceback):
+        try:
+            if exc_type is None:
+                self.commit()
+        finally:
+            shutil.rmtree(self.staging_dir, ignore_errors=True)
+        return False
+
+    def commit(self):
+        """Move the changes of the staged build into the directory."""
+        staged = set()
+        for root, dirs, files in os.walk(self.staging_dir):
+            relative_root = os.path.relpath(root, self.staging_dir)
+            staged.add(os.path.normpath(relative_root))
+            target_root = os.path.join(self.dest_dir, relative_root)
+            os.makedirs(target_root, exist_ok=True)
+            for filename in files:
+                staged.add(os.path.normpath(os.path.join(relative_root, filename)))
+                staged_file = os.path.join(root, filename)
+                target_file = os.path.join(target_root, filename)
+                # Still the same inode: the build didn't touch it
+                if os.path.lexists(target_file) and os.path.samestat(os.lstat(staged_file), os.lstat(target_file)):
+                    continue
+                os.replace(staged_file, target_file)
+                self.updated += 1
+
+        for root, dirs, files in os.walk(self.dest_dir, topdown=False):
+            relative_root = os.path.relpath(root, self.dest_dir)
+            for filename in files:
+                if os.path.normpath(os.path.join(relative_root, filename)) not in staged:
+                    os.remove(os.path.join(root, filename))
+                    self.removed += 1
+            if os.path.normpath(relative_root) not in staged:
+                try:
+                    os.rmdir(root)
+                except OSError:
+                    pass
+        log.debug(f"Staged build: {self.updated} file(s) updated, {self.removed} removed")
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Run per-file build work across a process pool.
+
+The build stages are regex-heavy and CPU-bound per note, so with --jobs N
+notes are sharded across N worker processes. Read-only state such as the
+mapping is handed to each worker once through an initializer instead of
+being pickled with every task, and results always come back in input order
+so the build output stays deterministic.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Below this many items starting a pool costs more than it saves
+MIN_PARALLEL_ITEMS = 16
+
+
+def resolve_jobs(jobs):
+    """Turn a --jobs value into a worker count (0 means one per CPU)."""
+    if jobs == 0:
+        return os.cpu_count() or 1
+    return max(1, jobs)
+
+
+def parallel_map(func, items, jobs=1, initializer=None, initargs=(), min_items=MIN_PARALLEL_ITEMS):
+    """
+    Apply func to every item and return the results in input order.
+    
+    Args:
+        func: Module-level function taking one item (must be picklable)
+        items: The work items
+        jobs: Number of worker processes (0 means one per CPU, 1 runs serially)
+        initializer: Optional function run once per worker to set up shared state
+        initargs: Arguments for initializer
+        min_items: Run serially below this many items (lower it for expensive items)
+    """
+    items = list(items)
+    jobs = resolve_jobs(jobs)
+    
+    if jobs == 1 or len(items) < max(2, min_items):
+        if initializer is not None:
+            initializer(*initargs)
+        return [func(item) for item in items]
+    
+    chunksize = max(1, len(items) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs, initializer=initializer, initargs=initargs) as executor:
+        return list(executor.map(func, items, chunksize=chunksize))
+
+
+def pop_jobs_arg(argv):
+    """
+    Remove a '--jobs N' (or '-j N') option from an argument list.
+    
+    Lets the positional-argument scripts accept --jobs. Returns the job count
+    (default 1).
+    """
+    for flag in ('--jobs', '-j'):
+        if flag in argv:
+            index = argv.index(flag)
+            try:
+                jobs = int(argv[index + 1])
+            except (IndexError, ValueError):
+                raise SystemExit(f"{flag} needs a number of worker processes")
+            del argv[index:index + 2]
+            return jobs
+    return 1
@@ -0,0 +1,616 @@
+#!/usr/bin/env python3
+"""
+Build the site content in a single in-memory pass.
+
+This fuses reorganize_files.py, preprocess_dataviews.py and
+convert_wikilinks.py into one pipeline:
+1. The mapping is computed from file names only (no note is read)
+2. Each note is read once and passed through the ordered TRANSFORMS
+3. The final content is written exactly once to its new location
+
+The individual scripts still work on their own; this is what compendium.py
+(and so run_local.sh and the deploy workflow) builds with. render_documents()
+runs the same transforms over notes held in memory.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+from reorganize_files import (
+    build_mapping,
+    copy_assets,
+    copy_pages_files,
+    ensure_title_header,
+    pages_title,
+    plan_paths,
+    plan_reorganization,
+    section_titles,
+    write_nav,
+)
+from preprocess_dataviews import preprocess_content
+from convert_wikilinks import (
+    LinkResolver,
+    convert_wikilinks,
+    extract_image_targets,
+    extract_link_targets,
+    warn_ambiguous_names,
+)
+from autolink import Autolinker, collect_names
+from build_manifest import BuildManifest, hash_text, make_entry
+from dataview import DataviewIndex, extract_metadata, extract_queries
+from image_derivatives import build_image_derivatives
+from link_graph import LinkGraph
+from output_files import StagedOutput, write_if_changed
+from parallel import parallel_map
+from search_index import index_exists, read_record, write_search_index
+import tracing
+from tracing import span
+
+log = logging.getLogger(__name__)
+
+
+class Document:
+    """A note (or extra page such as index.md) on its way through the pipeline."""
+
+    def __init__(self, source, key, output, title, content):
+        self.source = source          # Path on disk the content was read from
+        self.key = key                # Build manifest key
+        self.output = output          # Output path relative to the docs directory
+        self.title = title            # Title header to ensure, or None to leave the page as-is
+        self.content = content
+
+
+class BuildContext:
+    """Read-only state shared by every document in a build (and by every worker process)."""
+
+    def __init__(self, mapping, dest_dir, manifest=None, images=None, resolver=None, backlinks=None,
+                 dataview=None, autolinker=None):
+        self.mapping = mapping        # Note name -> output path
+        self.resolver = resolver or LinkResolver(mapping)  # Link lookups (and their caches) for the mapping
+        self.dest_dir = dest_dir      # The docs directory
+        self.manifest = manifest      # BuildManifest, or None for a full build
+        self.images = images or {}    # Image index from image_derivatives
+        self.backlinks = backlinks    # Output path -> [[title, output], ...] to inject, or None
+        self.dataview = dataview      # DataviewIndex to render queries from, or None for placeholders
+        self.autolinker = autolinker  # Autolinker for unlinked mentions, or None to leave them
+
+
+def add_title_header(doc, context):
+    if doc.title is None:
+        return doc.content
+    return ensure_title_header(doc.content, doc.title)
+
+
+def autolink(doc, context):
+    if context.autolinker is None:
+        return doc.content
+    return context.autolinker.link(doc.content, doc.output, context.resolver)
+
+
+def convert_links(doc, context):
+    return convert_wikilinks(doc.content, context.resolver, doc.output, context.images)
+
+
+def preprocess(doc, context):
+    render_query = context.dataview.render if context.dataview is not None else None
+    return preprocess_content(doc.content, render_query)
+
+
+def add_backlinks(doc, context):
+    if context.backlinks is None or not context.backlinks.get(doc.output):
+        return doc.content
+    lines = [f'- [{title}]({context.resolver.relative_path(doc.output, output)})'
+             for title, output in context.backlinks[doc.output]]
+    return doc.content.rstrip('\n') + '\n\n## What links here\n\n' + '\n'.join(lines) + '\n'
+
+
+# Ordered transform stages; each takes (document, context) and returns the new content
+TRANSFORMS = [
+    ('title_header', add_title_header),
+    # Block tags, info box, dataview, #wiki tags and list spacing in one streaming scan
+    ('preprocess', preprocess),
+    # Turns unlinked mentions into wikilinks, so it runs right before they are converted
+    ('autolink', autolink),
+    ('wikilinks', convert_links),
+    ('backlinks', add_backlinks),
+]
+
+
+def transform_document(doc, context):
+    """Run a document through every transform stage and return its final content."""
+    for name, transform in TRANSFORMS:
+        with span(name, 'transform'):
+            doc.content = transform(doc, context)
+    return doc.content
+
+
+def plan_documents(notes, extra_pages):
+    """
+    Return the (key, source, output, title) build task of every note and extra page.
+
+    When several notes would be written to the same output, only the last one
+    is built (as if they had been written one after another), so parallel
+    workers never race on a file.
+    """
+    tasks = [(note['relative_source'], note['source'], note['output'], note['title']) for note in notes]
+    for page in extra_pages:
+        tasks.append(('page:' + os.path.basename(page), page, os.path.basename(page), None))
+
+    last_claimant = {task[2]: task[0] for task in tasks}
+    kept = []
+    for task in tasks:
+        if last_claimant[task[2]] != task[0]:
+            log.warning(f"{task[1]} is overwritten by another note with the same output path {task[2]}")
+            continue
+        kept.append(task)
+    return kept
+
+
+# The BuildContext used by build_document(), set once per worker process
+_worker_state = {}
+
+
+def _init_worker(context):
+    _worker_state['context'] = context
+
+
+def scan_document(task):
+    """
+    Return the link and image targets and the metadata of a document whose source changed.
+
+    Runs in a worker process when building with --jobs. Returns None if the
+    build manifest has the document's current source (its targets and
+    metadata are recorded there).
+    """
+    key, source, output, title = task
+    context = _worker_state['context']
+
+    with open(source, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    entry = context.manifest.notes.get(key) if context.manifest is not None else None
+    if entry is not None and entry.get('source_hash') == hash_text(content):
+        return None
+    return {
+        'link_targets': extract_link_targets(content),
+        'image_targets': extract_image_targets(content),
+        'metadata': extract_metadata(content),
+    }
+
+
+def page_metadata(tasks, scans, manifest=None):
+    """
+    Return (key, output, metadata) of this build's notes from their scans.
+
+    Unchanged notes (scan None) are read from their build manifest entry;
+    extra pages such as index.md are left out.
+    """
+    pages = []
+    for (key, source, output, title), scan in zip(tasks, scans):
+        if key.startswith('page:'):
+            continue
+        metadata = scan['metadata'] if scan is not None else manifest.notes[key]['metadata']
+        pages.append((key, output, metadata))
+    return pages
+
+
+def build_dataview_index(tasks, scans, manifest=None):
+    """Build the DataviewIndex of this build's notes from their scans (see page_metadata)."""
+    return DataviewIndex(page_metadata(tasks, scans, manifest))
+
+
+def build_autolinker(resolver, tasks, scans, manifest=None):
+    """Compile every note name and alias of this build into an Autolinker."""
+    return Autolinker(collect_names(resolver, page_metadata(tasks, scans, manifest)))
+
+
+def update_link_graph(graph, tasks, scans, context, removed=None):
+    """
+    Bring the link graph up to date with this build's documents.
+
+    Args:
+        graph: The LinkGraph to update
+        tasks: The build tasks to record (every planned task unless removed is given)
+        scans: scan_document() result of each task
+        context: The BuildContext of this build
+        removed: Keys of pages that are no longer published; by default every
+            page in the graph without a task is removed
+
+    Returns the set of output paths whose backlinks changed.
+    """
+    manifest = context.manifest
+    known = graph.pages() if removed is None else {}
+    if removed is None:
+        removed = set(known) - {task[0] for task in tasks}
+    affected = set()
+    for key in sorted(removed):
+        affected |= graph.remove_page(key)
+
+    for (key, source, output, title), scan in zip(tasks, scans):
+        entry = manifest.notes.get(key) if manifest is not None else None
+        targets = scan if scan is not None else entry
+        links = {target: context.resolver.resolve(target) for target in targets['link_targets']}
+        title = title or os.path.splitext(os.path.basename(source))[0]
+        # Unchanged source and link resolution: the graph already has this page
+        if (scan is None and not graph.is_new and known.get(key) == (output, title)
+                and entry.get('links') == links):
+            continue
+        affected |= graph.update_page(key, output, title, links, targets.get('image_targets', []))
+    graph.conn.commit()
+    return affected
+
+
+def build_document(task):
+    """
+    Read, transform and write a single document.
+
+    Runs in a worker process when building with --jobs. Returns None if the
+    build manifest says the document is unchanged, otherwise its new
+    manifest entry (an empty dict when building without a manifest).
+    """
+    key, source, output, title = task
+    context = _worker_state['context']
+    manifest = context.manifest
+
+    with span('document', 'file', file=output):
+        with open(source, 'r', encoding='utf-8') as f:
+            source_content = f.read()
+
+        backlinks = context.backlinks.get(output, []) if context.backlinks is not None else None
+        dataview = context.dataview.fingerprint(extract_queries(source_content)) if context.dataview is not None else None
+        autolinks = context.autolinker.fingerprint(source_content) if context.autolinker is not None else None
+        if manifest is not None and not manifest.needs_rebuild(
+                key, source_content, output, context.resolver, context.dest_dir, context.images, backlinks,
+                dataview, autolinks):
+            return None
+
+        content = transform_document(Document(source, key, output, title, source_content), context)
+
+        output_path = os.path.join(context.dest_dir, output)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        write_if_changed(output_path, content)
+
+        if manifest is None:
+            return {}
+        return make_entry(source_content, output, context.resolver, context.images, backlinks, dataview, autolinks)
+
+
+def build(source_dir, dest_dir, mapping_file, manifest=None, extra_pages=(), jobs=1, asset_mode='link',
+          responsive_images=False, image_cache='.image_cache', graph=None, backlinks=False, search_index=False,
+          autolink=False):
+    """
+    Build dest_dir from source_dir in a single pass.
+
+    The build runs on a staged clone of dest_dir (see output_files.py), so
+    dest_dir is only updated once every stage succeeded, and outputs whose
+    content didn't change are never rewritten.
+
+    Args:
+        source_dir: Directory holding the published notes (e.g. .site_content_temp)
+        dest_dir: The docs directory to write to (e.g. .site_content)
+        mapping_file: Where to save the mapping of note names to new paths
+        manifest: Optional BuildManifest; unchanged notes are skipped
+        extra_pages: Pages copied to the root of dest_dir as-is apart from
+            preprocessing and wikilink conversion (e.g. index.md)
+        jobs: Number of worker processes (0 means one per CPU)
+        asset_mode: 'link' to clone assets copy-on-write where possible, 'copy' to always copy them
+        responsive_images: Generate resized WebP/AVIF derivatives and emit
+            <img srcset=...> for image wikilinks (needs Pillow)
+        image_cache: Content-addressed cache directory for image derivatives
+        graph: Optional LinkGraph to keep up to date with every page's links and images
+        backlinks: Add a "What links here" section to every linked page (needs graph)
+        search_index: Write the prebuilt, sharded search index (see search_index.py)
+        autolink: Link the first unlinked mention of every note and alias on each page (see autolink.py)
+    """
+    # Everything is built into a hard-linked clone of dest_dir; the changes are moved in at the end
+    staged = StagedOutput(dest_dir)
+    with staged as dest_dir:
+        with span('plan'):
+            notes, pages_files = plan_reorganization(source_dir, dest_dir)
+            mapping = build_mapping(notes)
+            resolver = LinkResolver(mapping, notes)
+            warn_ambiguous_names(resolver)
+            tasks = plan_documents(notes, extra_pages)
+
+        removed_outputs = []
+        if manifest is not None:
+            planned = {task[0]: task[2] for task in tasks}
+            removed_outputs = manifest.prune(planned, dest_dir)
+            for removed in removed_outputs:
+                log.info(f"Removed stale output: {removed}")
+
+        # Assets first: image wikilinks are rendered from the image index
+        with span('assets'):
+            copy_pages_files(pages_files, dest_dir)
+            write_nav(dest_dir, [task[2] for task in tasks], section_titles(pages_files, dest_dir))
+            resolver.assets = copy_assets(source_dir, dest_dir, mode=asset_mode)
+        with span('responsive images'):
+            images = build_image_derivatives(dest_dir, image_cache, jobs=jobs) if responsive_images else {}
+
+        context = BuildContext(mapping, dest_dir, manifest, images, resolver)
+        # Queries and backlinks need every page's tags, fields and links before any page is rendered
+        with span('scan'):
+            scans = parallel_map(scan_document, tasks, jobs, initializer=_init_worker, initargs=(context,))
+            context.dataview = build_dataview_index(tasks, scans, manifest)
+        if autolink:
+            with span('autolink names'):
+                context.autolinker = build_autolinker(resolver, tasks, scans, manifest)
+        if graph is not None:
+            with span('link graph'):
+                update_link_graph(graph, tasks, scans, context)
+                if backlinks:
+                    context.backlinks = {task[2]: graph.backlinks(task[2]) for task in tasks}
+        with span('documents'):
+            results = parallel_map(build_document, tasks, jobs, initializer=_init_worker, initargs=(context,))
+
+        written_count = 0
+        unchanged_count = 0
+        for (key, source, output, title), entry in zip(tasks, results):
+            if entry is None:
+                unchanged_count += 1
+                continue
+            written_count += 1
+            if manifest is not None:
+                manifest.set_entry(key, entry)
+            log.debug(f"Built: {os.path.relpath(source, '.')} -> {output}")
+
+        # The index only changes with the pages; unchanged pages are indexed from their output
+        if search_index and (written_count or removed_outputs or manifest is None or not index_exists(dest_dir)):
+            with span('search index'):
+                records = parallel_map(read_record, [
+                    (os.path.join(dest_dir, output), output,
+                     scan['metadata'] if scan is not None else manifest.notes[key].get('metadata'))
+                    for (key, source, output, title), scan in zip(tasks, scans)], jobs)
+                write_search_index(dest_dir, records)
+
+        if manifest is not None:
+            manifest.finalize(dest_dir)
+
+    with span('save'):
+        # Save mapping to file
+        write_if_changed(mapping_file, json.dumps(mapping, indent=2))
+
+        if manifest is not None:
+            manifest.save()
+
+    log.info(f"\nMapping saved to {mapping_file}")
+    log.info(f"Total files built: {written_count}")
+    log.info(f"Output files updated: {staged.updated}, removed: {staged.removed}")
+    if unchanged_count > 0:
+        log.info(f"Unchanged files skipped: {unchanged_count}")
+    if pages_files:
+        log.info(f"Total .pages files copied: {len(pages_files)}")
+
+
+def collect_backlinks(tasks, contents, resolver):
+    """
+    Return output path -> [[title, output], ...] of the pages linking to it,
+    worked out from the documents themselves (like LinkGraph.backlinks()).
+    """
+    linkers = {}
+    for key, source, output, title in tasks:
+        title = title or os.path.splitext(os.path.basename(source))[0]
+        for target in extract_link_targets(contents[key]):
+            resolved = resolver.resolve(target)
+            if resolved is not None and resolved != output:
+                linkers.setdefault(resolved, set()).add((title, output))
+    return {output: [list(linker) for linker in sorted(pages)] for output, pages in linkers.items()}
+
+
+def render_documents(documents, extra_pages=None, images=None, backlinks=False):
+    """
+    Build notes held in memory, without reading or writing any file.
+
+    The library form of build(): the same plan and TRANSFORMS, without the
+    manifest, assets or worker processes, so a single process can render (or
+    check) the whole site.
+
+    Args:
+        documents: Path of each published file ('/'-separated, relative to the
+            vault) -> its content; .pages files give section titles and are passed through
+        extra_pages: Page name -> content of pages rendered into the root as-is
+            apart from preprocessing and wikilink conversion (e.g. index.md)
+        images: Optional image index from image_derivatives
+        backlinks: Add a "What links here" section to every linked page
+
+    Returns (pages, mapping): output path -> final content, and note name -> output path.
+    """
+    extra_pages = extra_pages or {}
+    titles = {os.path.dirname(path): pages_title(content) for path, content in documents.items()
+              if os.path.basename(path) == '.pages'}
+    notes, pages_files = plan_paths(list(documents), {directory: title for directory, title in titles.items() if title})
+    for note in notes:
+        note['source'] = note['relative_source']
+    mapping = build_mapping(notes)
+    resolver = LinkResolver(mapping, notes)
+    warn_ambiguous_names(resolver)
+    tasks = plan_documents(notes, list(extra_pages))
+
+    contents = dict(documents)
+    contents.update(('page:' + os.path.basename(page), content) for page, content in extra_pages.items())
+    context = BuildContext(mapping, None, images=images, resolver=resolver)
+    context.dataview = DataviewIndex([(key, output, extract_metadata(contents[key]))
+                                      for key, source, output, title in tasks if not key.startswith('page:')])
+    if backlinks:
+        context.backlinks = collect_backlinks(tasks, contents, resolver)
+
+    pages = {output: documents[path] for path, output in pages_files}
+    for key, source, output, title in tasks:
+        pages[output] = transform_document(Document(source, key, output, title, contents[key]), context)
+    return pages, mapping
+
+
+def under_paths(path, only):
+    """Check if a note (relative to the vault) is one of the only paths or inside one of them."""
+    for selected in only:
+        selected = os.path.normpath(selected).replace(os.sep, '/')
+        if path in (selected, selected + '.md') or path.startswith(selected + '/'):
+            return True
+    return False
+
+
+def select_documents(tasks, only, resolver):
+    """
+    Pick the documents of a partial build: the notes under the only paths,
+    the pages they link to (one level) and the extra pages.
+
+    Returns (tasks in plan order, key -> content of each selected document).
+    """
+    contents = {}
+
+    def read(task):
+        with open(task[1], 'r', encoding='utf-8') as f:
+            contents[task[0]] = f.read()
+
+    selected = [task for task in tasks if not task[0].startswith('page:') and under_paths(task[0], only)]
+    for task in selected:
+        read(task)
+    by_output = {task[2]: task for task in tasks}
+    for task in selected:
+        for target in extract_link_targets(contents[task[0]]):
+            linked = by_output.get(resolver.resolve(target))
+            if linked is not None and linked[0] not in contents:
+                read(linked)
+    for task in tasks:
+        if task[0].startswith('page:'):
+            read(task)
+    return [task for task in tasks if task[0] in contents], contents
+
+
+def build_partial(source_dir, dest_dir, only, extra_pages=(), jobs=1, asset_mode='link', paths=None,
+                  responsive_images=False, image_cache='.image_cache', manifest=None, graph=None, backlinks=False,
+                  autolink=False):
+    """
+    Build part of the site into dest_dir, for previewing one area of a large vault.
+
+    The whole vault is planned (from file names only), so every page gets the
+    output path and links it has in a full build, but only the notes under
+    the only paths, the pages they link to (one level), the extra pages and
+    the assets all of these embed are read and written. Pages of earlier
+    partial builds that are no longer selected are removed from dest_dir.
+
+    Args:
+        source_dir: Directory holding the published notes
+        dest_dir: The docs directory to write the preview to (not the one of full builds)
+        only: Paths of notes or folders to build, relative to source_dir
+        paths: Published files to plan, relative to source_dir (default: every file in it)
+        manifest: Optional BuildManifest of the last full build; only read, for
+            the tags and fields of the notes that aren't built, so queries still list them
+        graph: Optional LinkGraph of the last full build; only read, for backlinks
+        backlinks: Add a "What links here" section, listing every page linking
+            to each page in graph, or only the pages of this build without one
+        autolink: Link unlinked mentions of every note of the vault, as in a full build
+
+    Returns the output paths of the pages built.
+    """
+    with StagedOutput(dest_dir) as dest_dir:
+        with span('plan'):
+            notes, pages_files = plan_reorganization(source_dir, dest_dir, paths)
+            mapping = build_mapping(notes)
+            resolver = LinkResolver(mapping, notes)
+            tasks = plan_documents(notes, extra_pages)
+        with span('select'):
+            selected, contents = select_documents(tasks, only, resolver)
+        if not any(not task[0].startswith('page:') for task in selected):
+            log.warning(f"No published notes under {', '.join(only)}")
+
+        # The .pages files of the folders holding a selected page
+        folders = {'.'}
+        for task in selected:
+            folder = os.path.dirname(task[2])
+            while folder:
+                folders.add(folder)
+                folder = os.path.dirname(folder)
+        with span('assets'):
+            copy_pages_files([(source, dest, content) for source, dest, content in pages_files
+                              if os.path.relpath(os.path.dirname(dest), dest_dir).replace(os.sep, '/') in folders],
+                             dest_dir)
+            write_nav(dest_dir, [task[2] for task in selected], section_titles(pages_files, dest_dir))
+            embedded = set()
+            for content in contents.values():
+                embedded.update(extract_image_targets(content))
+            resolver.assets = copy_assets(source_dir, dest_dir, mode=asset_mode, names=embedded)
+        with span('responsive images'):
+            images = build_image_derivatives(dest_dir, image_cache, jobs=jobs) if responsive_images else {}
+
+        context = BuildContext(mapping, dest_dir, images=images, resolver=resolver)
+        index = [(key, output, extract_metadata(contents[key]))
+                 for key, source, output, title in selected if not key.startswith('page:')]
+        if manifest is not None:
+            index += [(key, output, manifest.notes[key]['metadata'])
+                      for key, source, output, title in tasks
+                      if key not in contents and 'metadata' in manifest.notes.get(key, {})]
+        context.dataview = DataviewIndex(index)
+        if autolink:
+            context.autolinker = Autolinker(collect_names(resolver, index))
+        if backlinks and graph is not None:
+            context.backlinks = {task[2]: graph.backlinks(task[2]) for task in selected}
+        elif backlinks:
+            context.backlinks = collect_backlinks(selected, contents, resolver)
+        with span('documents'):
+            parallel_map(build_document, selected, jobs, initializer=_init_worker, initargs=(context,))
+
+        built = {task[2] for task in selected}
+        for root, dirs, files in os.walk(dest_dir):
+            for filename in files:
+                output = os.path.relpath(os.path.join(root, filename), dest_dir).replace(os.sep, '/')
+                if filename.endswith('.md') and output not in built:
+                    os.remove(os.path.join(root, filename))
+                    log.debug(f"Removed: {output}")
+    log.info(f"Preview: {len(built)} page(s) built from {', '.join(only)} and the pages they link to")
+    return sorted(built)
+
+
+def add_build_arguments(parser):
+    """Add the build options shared by pipeline.py and watch.py to an ArgumentParser."""
+    parser.add_argument('source_dir', help='Directory holding the published notes')
+    parser.add_argument('dest_dir', help='The docs directory to write to')
+    parser.add_argument('mapping_file', help='Where to save the name -> path mapping')
+    parser.add_argument('--manifest', help='Build manifest for incremental builds')
+    parser.add_argument('--page', action='append', default=[], dest='pages',
+                        help='Extra page to preprocess into the root of dest_dir (repeatable)')
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help='Number of worker processes (0 means one per CPU)')
+    parser.add_argument('--asset-mode', choices=['link', 'copy'], default='link',
+                        help='Clone new assets copy-on-write where the file system supports it (default) or always copy them')
+    parser.add_argument('--responsive-images', action='store_true',
+                        help='Generate WebP/AVIF derivatives and responsive <img> tags (needs Pillow)')
+    parser.add_argument('--image-cache', default='.image_cache',
+                        help='Cache directory for image derivatives (default: .image_cache)')
+    parser.add_argument('--link-graph', help='SQLite link graph to keep up to date (e.g. .site_graph.sqlite)')
+    parser.add_argument('--backlinks', action='store_true',
+                        help='Add a "What links here" section to linked pages (needs --link-graph)')
+    parser.add_argument('--search-index', action='store_true',
+                        help='Write a prebuilt, sharded search index to search/ in dest_dir')
+    parser.add_argument('--autolink', action='store_true',
+                        help='Link the first unlinked mention of every note (and info box alias) on each page')
+    tracing.add_arguments(parser)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the site content in a single pass.')
+    add_build_arguments(parser)
+    parser.add_argument('--only', action='append', metavar='PATH',
+                        help='Only build the notes under PATH (relative to source_dir), the pages they link to '
+                             'and the assets they embed, for a preview (repeatable; no mapping file is written)')
+    args = parser.parse_args()
+    if args.backlinks and not args.link_graph:
+        parser.error('--backlinks needs --link-graph')
+    tracing.setup(args)
+
+    manifest = BuildManifest(args.manifest) if args.manifest else None
+    if args.only:
+        build_partial(args.source_dir, args.dest_dir, args.only, args.pages, args.jobs, args.asset_mode,
+                      responsive_images=args.responsive_images, image_cache=args.image_cache, manifest=manifest,
+                      backlinks=args.backlinks, autolink=args.autolink)
+        sys.exit(0)
+    graph = LinkGraph(args.link_graph) if args.link_graph else None
+
+    build(args.source_dir, args.dest_dir, args.mapping_file, manifest, args.pages, args.jobs,
+          args.asset_mode, args.responsive_images, args.image_cache, graph, args.backlinks, args.search_index,
+          args.autolink)
+    if graph is not None:
+        graph.close()
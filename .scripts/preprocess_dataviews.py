@@ -2,9 +2,18 @@
 # your vault to make it a bit more presentable / user friendly
 # This one in particular cleans up dataviews to look better
 
+import os
 import re
 import glob
 
+from output_files import replace_if_changed
+import tracing
+from tracing import span
+
+INFO_BOX_IMAGE = re.compile(r'!\[\[.*?\]\]')
+INFO_BOX_KEY_VALUE = re.compile(r'^[^:\n]+:.+$', re.MULTILINE)
+ORDERED_LIST_ITEM = re.compile(r'^\s*\d+[\.\)]\s+')
+
 
 def format_info_box_line(line):
     """
@@ -20,20 +29,55 @@ def format_info_box_line(line):
         return f'<div class="info-box-image" markdown="1">\n\n{line}\n\n</div>\n\n'
     
     # Handle key-value pairs - keep markdown links intact
-    elif ':' in line:
-        key, value = line.split(':', 1)
-        key = key.strip()
-        value = value.strip()
-        # Only process if we have both key and value
-        if key and value:
-            # Use div with markdown block to allow proper processing
-            # Structure: outer div -> paragraph (auto-generated by markdown processor) -> strong and span (for value)
-            # The span wrapper ensures proper flexbox behavior for multi-line content
-            return f'<div class="info-box-row" markdown="block"><strong>{key}:</strong><span class="info-box-value" markdown="span">{value}</span></div>\n\n'
+    field = info_box_field(line)
+    if field:
+        key, value = field
+        # Use div with markdown block to allow proper processing
+        # Structure: outer div -> paragraph (auto-generated by markdown processor) -> strong and span (for value)
+        # The span wrapper ensures proper flexbox behavior for multi-line content
+        return f'<div class="info-box-row" markdown="block"><strong>{key}:</strong><span class="info-box-value" markdown="span">{value}</span></div>\n\n'
     
     return None
 
 
+def info_box_field(line):
+    """
+    Return the (key, value) of an info box line, or None if it isn't a key-value pair.
+    
+    Also used by the Dataview index, so queries see exactly the fields the info box shows.
+    """
+    line = line.strip()
+    if ':' not in line or (line.startswith('![[') and line.endswith(']]')):
+        return None
+    key, value = line.split(':', 1)
+    key = key.strip()
+    value = value.strip()
+    # Only a pair if we have both key and value
+    if key and value:
+        return key, value
+    return None
+
+
+def build_info_box(block_content):
+    """Return the HTML info box for the lines of a <block> or info box code block."""
+    lines = block_content.strip().split('\n')
+    html_parts = ['<div class="info-box" markdown="1">\n\n']
+    
+    for line in lines:
+        formatted_line = format_info_box_line(line)
+        if formatted_line:
+            html_parts.append(formatted_line)
+    
+    html_parts.append('</div>\n\n')
+    
+    return ''.join(html_parts)
+
+
+def looks_like_info_box(block_content):
+    """Check if a code block at the start of a file is an info box (has an image or key-value pairs)."""
+    return bool(INFO_BOX_IMAGE.search(block_content) or INFO_BOX_KEY_VALUE.search(block_content))
+
+
 def process_block_tags(content):
     """
     Process <block> tags into info boxes.
@@ -51,19 +95,7 @@ def process_block_tags(content):
     pattern = r'<block>\s*([\s\S]*?)\s*</block>'
     
     def replace_block(match):
-        block_content = match.group(1)
-        
-        lines = block_content.strip().split('\n')
-        html_parts = ['<div class="info-box" markdown="1">\n\n']
-        
-        for line in lines:
-            formatted_line = format_info_box_line(line)
-            if formatted_line:
-                html_parts.append(formatted_line)
-        
-        html_parts.append('</div>\n\n')
-        
-        return ''.join(html_parts)
+        return build_info_box(match.group(1))
     
     return re.sub(pattern, replace_block, content)
 
@@ -91,24 +123,11 @@ def process_info_box(content):
         block_content = match.group(2)
         
         # Check if this looks like an info box (has image or key-value pairs)
-        has_image = re.search(r'!\[\[.*?\]\]', block_content)
-        has_key_value = re.search(r'^[^:\n]+:.+$', block_content, re.MULTILINE)
-        
-        if not (has_image or has_key_value):
+        if not looks_like_info_box(block_content):
             # Not an info box, leave it as-is
             return match.group(0)
         
-        lines = block_content.strip().split('\n')
-        html_parts = ['<div class="info-box" markdown="1">\n\n']
-        
-        for line in lines:
-            formatted_line = format_info_box_line(line)
-            if formatted_line:
-                html_parts.append(formatted_line)
-        
-        html_parts.append('</div>\n\n')
-        
-        return leading_space + ''.join(html_parts)
+        return leading_space + build_info_box(block_content)
     
     # Only match at the start of the content
     return re.sub(pattern, replace_info_box, content, count=1)
@@ -125,7 +144,7 @@ def is_unordered_list_item(line):
 
 def is_ordered_list_item(line):
     """Check if a line is an ordered list item (number followed by . or ) and space)."""
-    return bool(re.match(r'^\s*\d+[\.\)]\s+', line))
+    return bool(ORDERED_LIST_ITEM.match(line))
 
 
 def fix_list_spacing(content):
@@ -166,31 +185,326 @@ def fix_list_spacing(content):
     return '\n'.join(result)
 
 
-# Process Dataview queries into Markdown tables
-def process_dataview(file_path):
-    with open(file_path, "r", encoding="utf-8") as file:
-        content = file.read()
+def replace_dataview_queries(content):
+    """Replace `dataview` blocks with a placeholder (customize as needed)."""
+    return re.sub(r"```dataview([\s\S]*?)```", "Dataview Query: \\1", content)
 
-    # Process <block> tags first (Obsidian-friendly info boxes)
-    content = process_block_tags(content)
+
+def remove_wiki_tags(content):
+    """
+    Remove #wiki tags (they're used for filtering but shouldn't be displayed).
     
-    # Process info boxes (triple-backtick format)
-    content = process_info_box(content)
+    Matches #wiki on its own line or at the end of a line.
+    """
+    return re.sub(r"^\s*#wiki\s*$|\s+#wiki\s*$", "", content, flags=re.MULTILINE)
+
+
+# Streaming preprocessor
+#
+# The functions above each make a whole-document pass. The stages below do
+# the same rewrites as a generator pipeline over lines: every stage consumes
+# the lines produced by the previous one and yields its own, so a note is
+# scanned once, line by line, and only constructs that are still open (an
+# unclosed <block> or dataview fence, a run of blank lines that a following
+# #wiki tag would swallow) are buffered. The output is byte-identical to
+# running the regex functions in order, including their edge cases: tags in
+# the middle of a line, blocks spanning lines, and #wiki removal eating the
+# whitespace (and line breaks) around the tag.
 
-    # Replace `dataview` blocks with a placeholder (customize as needed)
-    content = re.sub(r"```dataview([\s\S]*?)```", "Dataview Query: \\1", content)
+class _LineBuffer:
+    """Collects text written by a stage and hands it back as complete lines."""
+
+    def __init__(self):
+        self.partial = ''
+
+    def write(self, text):
+        if '\n' not in text:
+            self.partial += text
+            return []
+        lines = (self.partial + text).split('\n')
+        self.partial = lines.pop()
+        return lines
+
+    def close(self):
+        return self.partial
+
+
+def iter_lines(text):
+    """Yield the lines of text, like text.split('\\n') but without building a list."""
+    start = 0
+    while True:
+        end = text.find('\n', start)
+        if end == -1:
+            yield text[start:]
+            return
+        yield text[start:end]
+        start = end + 1
+
+
+def iter_file_lines(file):
+    """Yield the lines of an open text file without their line breaks, like file.read().split('\\n')."""
+    line = '\n'
+    for line in file:
+        yield line[:-1] if line.endswith('\n') else line
+    if line.endswith('\n'):
+        yield ''
+
+
+def _chunks(lines):
+    """Yield each line with the line break that precedes it (tags never span a line break)."""
+    for i, line in enumerate(lines):
+        yield line if i == 0 else '\n' + line
+
+
+def stream_block_tags(lines):
+    """Streaming process_block_tags: replace <block>...</block> regions with info boxes."""
+    out = _LineBuffer()
+    block = None  # Pieces of the open <block>'s content, or None outside a block
+    for text in _chunks(lines):
+        while text:
+            if block is None:
+                start = text.find('<block>')
+                if start == -1:
+                    yield from out.write(text)
+                    break
+                yield from out.write(text[:start])
+                block = []
+                text = text[start + len('<block>'):]
+            else:
+                end = text.find('</block>')
+                if end == -1:
+                    block.append(text)
+                    break
+                block.append(text[:end])
+                yield from out.write(build_info_box(''.join(block)))
+                block = None
+                text = text[end + len('</block>'):]
+    if block is not None:
+        # A <block> that is never closed is left as written
+        yield from out.write('<block>' + ''.join(block))
+    yield out.close()
+
+
+def stream_info_box(lines):
+    """Streaming process_info_box: turn a code block opening the file into an info box."""
+    lines = iter(lines)
+    leading = []
+    for line in lines:
+        if line.strip():
+            break
+        leading.append(line)
+    else:
+        yield from leading
+        return
+
+    fence = line.lstrip()
+    if not fence.startswith('```') or fence[3:].strip():
+        yield from leading
+        yield line
+        yield from lines
+        return
+
+    body = []
+    closing = None
+    has_content = False
+    for body_line in lines:
+        # The first non-blank line is always content, even if it starts with ```
+        if has_content and body_line.startswith('```'):
+            closing = body_line
+            break
+        body.append(body_line)
+        has_content = has_content or bool(body_line.strip())
+
+    block_content = '\n'.join(body)
+    if closing is None or not looks_like_info_box(block_content):
+        yield from leading
+        yield line
+        yield from body
+        if closing is not None:
+            yield closing
+        yield from lines
+        return
+
+    out = _LineBuffer()
+    leading_space = ''.join(blank + '\n' for blank in leading) + line[:len(line) - len(fence)]
+    # Anything after the closing fence stays on the info box's last line
+    yield from out.write(leading_space + build_info_box(block_content) + closing[3:])
+    yield out.close()
+    yield from lines
+
+
+def stream_dataview(lines, render_query=None):
+    """
+    Streaming replace_dataview_queries: replace dataview fences with their results.
     
-    # Remove #wiki tags (they're used for filtering but shouldn't be displayed)
-    # Match #wiki on its own line or at the end of a line
-    content = re.sub(r"^\s*#wiki\s*$|\s+#wiki\s*$", "", content, flags=re.MULTILINE)
+    render_query turns a query's text into the Markdown shown instead (see
+    dataview.DataviewIndex.render); without it the fence becomes a placeholder.
+    """
+    out = _LineBuffer()
+    query = None  # Pieces of the open dataview query, or None outside a query
+    for text in _chunks(lines):
+        while text:
+            if query is None:
+                start = text.find('```dataview')
+                if start == -1:
+                    yield from out.write(text)
+                    break
+                yield from out.write(text[:start])
+                query = []
+                text = text[start + len('```dataview'):]
+            else:
+                end = text.find('```')
+                if end == -1:
+                    query.append(text)
+                    break
+                query.append(text[:end])
+                query = ''.join(query)
+                yield from out.write(render_query(query) if render_query else 'Dataview Query: ' + query)
+                query = None
+                text = text[end + len('```'):]
+    if query is not None:
+        # A dataview fence that is never closed is left as written
+        yield from out.write('```dataview' + ''.join(query))
+    yield out.close()
+
+
+def stream_wiki_tags(lines):
+    """
+    Streaming remove_wiki_tags: remove #wiki tags at the end of a line.
     
-    # Fix list spacing to ensure proper markdown rendering
-    content = fix_list_spacing(content)
+    Like the regex, removing a tag also removes the whitespace before it (back
+    to the last non-whitespace character, across blank lines) and the blank
+    lines after it.
+    """
+    out = _LineBuffer()
+    pending = ''     # Whitespace since the last character written; removed if a #wiki tag follows
+    trailing = None  # Whitespace after a removed tag, or None
+    for i, line in enumerate(lines):
+        separator = '\n' if i > 0 else ''
+        text = line
+        if trailing is not None:
+            if not line.strip():
+                trailing += separator + line
+                continue
+            # The removal ends at the last line break before the next non-whitespace character
+            indent = len(line) - len(line.lstrip())
+            trailing += separator + line[:indent]
+            pending = trailing[trailing.rfind('\n'):]
+            trailing = None
+            separator = ''
+            text = line[indent:]
+
+        tag = len(line.rstrip()) - len('#wiki')
+        if line.rstrip().endswith('#wiki') and (tag == 0 or line[tag - 1].isspace()):
+            tag -= len(line) - len(text)
+            before = separator + text[:tag]
+            if before.strip():
+                yield from out.write(pending + before.rstrip())
+            pending = ''
+            trailing = text[tag + len('#wiki'):]
+            continue
+
+        chunk = separator + text
+        kept = chunk.rstrip()
+        if kept:
+            yield from out.write(pending + kept)
+            pending = chunk[len(kept):]
+        else:
+            pending += chunk
+    if trailing is None:
+        yield from out.write(pending)
+    yield out.close()
 
-    with open(file_path, "w", encoding="utf-8") as file:
-        file.write(content)
+
+def stream_list_spacing(lines):
+    """Streaming fix_list_spacing: add a blank line before a list that follows a paragraph."""
+    previous = None  # (is blank, is list item) for the previous line
+    for line in lines:
+        is_list_item = is_unordered_list_item(line) or is_ordered_list_item(line)
+        if is_list_item and previous is not None and not previous[0] and not previous[1]:
+            yield ''
+        yield line
+        previous = (not line.strip(), is_list_item)
 
 
-# Find and process all Markdown files
-for md_file in glob.glob(".site_content/**/*.md", recursive=True):
-    process_dataview(md_file)
+def preprocess_lines(lines, render_query=None):
+    """Run every preprocessing step over an iterable of lines, yielding the resulting lines."""
+    steps = [
+        ('block tags', stream_block_tags),
+        ('info box', stream_info_box),
+        ('dataview', lambda lines: stream_dataview(lines, render_query)),
+        ('wiki tags', stream_wiki_tags),
+        ('list spacing', stream_list_spacing),
+    ]
+    for name, step in steps:
+        if tracing.enabled():
+            # The steps are interleaved generators; run each one to completion so it can be timed
+            with span(name, 'transform'):
+                lines = list(step(lines))
+        else:
+            lines = step(lines)
+    return lines
+
+
+def preprocess_content(content, render_query=None):
+    """Run every preprocessing step over a note's content and return the result."""
+    return '\n'.join(preprocess_lines(iter_lines(content), render_query))
+
+
+# The DataviewIndex used by process_dataview(), set once per worker process
+_worker_state = {}
+
+
+def _init_worker(index):
+    _worker_state['index'] = index
+
+
+# Process Dataview queries into Markdown tables
+def process_dataview(file_path):
+    index = _worker_state.get('index')
+    render_query = index.render if index is not None else None
+    tmp_path = file_path + '.tmp'
+    with span('preprocess', 'file', file=file_path):
+        with open(file_path, "r", encoding="utf-8") as source, open(tmp_path, "w", encoding="utf-8") as file:
+            for i, line in enumerate(preprocess_lines(iter_file_lines(source), render_query)):
+                if i > 0:
+                    file.write('\n')
+                file.write(line)
+        # Unchanged notes keep their mtime
+        replace_if_changed(tmp_path, file_path)
+
+
+def process_files(md_files, jobs=1, index=None):
+    """
+    Preprocess a list of markdown files, across `jobs` worker processes (0 means one per CPU).
+    
+    Dataview queries are rendered from index (a dataview.DataviewIndex), or
+    replaced with a placeholder without one.
+    """
+    from parallel import parallel_map
+    parallel_map(process_dataview, md_files, jobs, initializer=_init_worker, initargs=(index,))
+
+
+if __name__ == '__main__':
+    import sys
+    from parallel import pop_jobs_arg
+    
+    # Usage: preprocess_dataviews.py [directory] [manifest_file] [--jobs N] [--trace FILE] [-v|-q]
+    jobs = pop_jobs_arg(sys.argv)
+    tracing.setup_from_argv(sys.argv)
+    directory = sys.argv[1] if len(sys.argv) > 1 else '.site_content'
+    
+    if len(sys.argv) > 2:
+        # Incremental build: only the notes the reorganize stage rewrote
+        from build_manifest import BuildManifest
+        md_files = BuildManifest(sys.argv[2]).stale_files(directory)
+    else:
+        # Find and process all Markdown files
+        md_files = glob.glob(os.path.join(directory, '**', '*.md'), recursive=True)
+    
+    # Queries see every note in the directory, not just the ones being processed
+    from dataview import index_directory
+    with span('dataview index'):
+        index = index_directory(directory)
+    with span('preprocess'):
+        process_files(md_files, jobs, index)
@@ -12,6 +12,20 @@ This script:
 import os
 import re
 import json
+import logging
+import posixpath
+
+from output_files import write_if_changed
+from tracing import span
+
+log = logging.getLogger(__name__)
+
+# Assets are stored as assets/<first hex digits of their SHA-256><ext>
+ASSET_HASH_LENGTH = 16
+# Asset name -> stored file, written next to the assets (relative to the docs directory)
+ASSET_MANIFEST = 'assets/manifest.json'
+# Navigation of the docs directory, set as the MkDocs nav by the load_nav hook (docs/hooks.py)
+NAV_FILE = '.nav.json'
 
 
 def slugify(text):
@@ -29,23 +43,23 @@ def slugify(text):
     return text
 
 
-def get_title_from_pages_file(directory):
+def pages_title(content):
+    """Return the title set in the content of a .pages file ("title: Some Title"), or None."""
+    match = re.search(r'^title:\s*(.+)$', content, re.MULTILINE)
+    return match.group(1).strip() if match else None
+
+
+def read_pages_file(pages_file):
     """
-    Read the title from a .pages file in the given directory.
+    Read a .pages file.
     
-    Returns the title if found, otherwise None.
+    Returns its content, or None if it can't be read.
     """
-    pages_file = os.path.join(directory, '.pages')
-    if os.path.exists(pages_file):
-        try:
-            with open(pages_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-                # Look for "title: Some Title" pattern
-                match = re.search(r'^title:\s*(.+)$', content, re.MULTILINE)
-                if match:
-                    return match.group(1).strip()
-        except Exception as e:
-            print(f"Warning: Could not read .pages file {pages_file}: {e}")
+    try:
+        with open(pages_file, 'r', encoding='utf-8') as f:
+            return f.read()
+    except Exception as e:
+        log.warning(f"Could not read .pages file {pages_file}: {e}")
     return None
 
 
@@ -119,125 +133,472 @@ def get_new_path(original_path, base_dir='.site_content_temp'):
     return '/'.join(new_parts)
 
 
-def copy_and_reorganize(source_dir, dest_dir, mapping_file):
+def walk_order(path):
     """
-    Copy files from source to destination with reorganization.
+    Sort key putting '/'-separated relative paths in the order os.walk visits
+    them with sorted listings: a directory's files, then its subdirectories.
+    """
+    parts = path.split('/')
+    return [(1, part) for part in parts[:-1]] + [(0, parts[-1])]
+
+
+def plan_paths(paths, pages_titles=None):
+    """
+    Decide where every note and .pages file in a list of paths will be written.
     
-    Also creates a mapping file for wikilink conversion.
+    This is the pure core of plan_reorganization(): nothing is read from disk,
+    so it works the same for the files of a directory and for notes held in
+    memory. Section index conversions are decided from the plan itself, so a
+    previous build's output never changes the result.
+    
+    Args:
+        paths: Paths of the published files, '/'-separated and relative to their root
+        pages_titles: Directory (relative to the root, '' for the root) -> title from its .pages file
+    
+    Returns (notes, pages_files). Each note is a dict with 'relative_source'
+    (its path), 'output', 'name' (mapping key) and 'title'. Each .pages entry
+    is a tuple of (path, output path).
     """
-    mapping = {}
-    pages_count = 0
-    
-    # Walk through source directory
-    for root, dirs, files in os.walk(source_dir):
-        for filename in files:
-            # Get original path relative to working directory
-            original_path = os.path.join(root, filename)
-            relative_original = os.path.relpath(original_path, '.')
-            
-            # Handle .pages files separately - copy them to corresponding dirs
-            if filename == '.pages':
-                # Get new path for the directory
-                dir_path = os.path.dirname(relative_original)
-                new_dir_path = get_new_path(dir_path + '/dummy.md')  # Get directory path
-                new_dir = os.path.dirname(os.path.join(dest_dir, new_dir_path))
-                os.makedirs(new_dir, exist_ok=True)
-                
-                # Copy .pages file as-is
-                new_pages_path = os.path.join(new_dir, '.pages')
-                with open(original_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                with open(new_pages_path, 'w', encoding='utf-8') as f:
-                    f.write(content)
-                
-                pages_count += 1
-                print(f"Copied .pages: {relative_original} -> {os.path.relpath(new_pages_path, dest_dir)}")
-                continue
-            
-            # Only process markdown files for mapping
-            if not filename.endswith('.md'):
-                continue
-            
-            # Get new path
-            new_relative_path = get_new_path(relative_original)
-            new_path = os.path.join(dest_dir, new_relative_path)
-            
-            # Check if the file name (without extension) matches its parent directory name
-            # If so, rename it to index.md to make it the section page
-            filename_without_ext = os.path.splitext(filename)[0]
-            parent_dir_name = os.path.basename(os.path.dirname(original_path))
-            is_section_index = False
-            
-            if filename_without_ext == parent_dir_name and filename != 'index.md':
-                # This file should become the index for this section
-                new_dir = os.path.dirname(new_path)
-                new_index_path = os.path.join(new_dir, 'index.md')
-                
-                # Only convert if there isn't already an index.md in the source or destination
-                source_index = os.path.join(os.path.dirname(original_path), 'index.md')
-                dest_index = new_index_path
-                
-                if not os.path.exists(source_index) and not os.path.exists(dest_index):
-                    new_path = new_index_path
-                    # Update the relative path too
-                    new_relative_path = os.path.relpath(new_path, dest_dir)
-                    is_section_index = True
-                    print(f"  -> Converting to section index: {filename}")
-                else:
-                    if os.path.exists(source_index):
-                        print(f"  -> Skipping conversion (index.md exists in source): {filename}")
-                    else:
-                        print(f"  -> Skipping conversion (index.md exists in destination): {filename}")
-            
-            # Create directory if needed
-            new_dir = os.path.dirname(new_path)
-            os.makedirs(new_dir, exist_ok=True)
+    pages_titles = pages_titles or {}
+    present = set(paths)
+    notes = []
+    pages_files = []
+    claimed_outputs = set()
+    
+    # Plan in sorted walk order so the plan (section index claims, mapping
+    # collisions) never depends on file system listing order
+    for path in sorted(present, key=walk_order):
+        directory, filename = os.path.split(path)
+        
+        # Handle .pages files separately - copy them to corresponding dirs
+        if filename == '.pages':
+            new_dir = os.path.dirname(get_new_path(os.path.join(directory, 'dummy.md')))
+            pages_files.append((path, os.path.join(new_dir, '.pages')))
+            continue
+        
+        # Only process markdown files for mapping
+        if not filename.endswith('.md'):
+            continue
+        
+        # Get new path
+        new_relative_path = get_new_path(path)
+        
+        # Check if the file name (without extension) matches its parent directory name
+        # If so, rename it to index.md to make it the section page
+        filename_without_ext = os.path.splitext(filename)[0]
+        title = filename_without_ext
+        
+        if filename_without_ext == os.path.basename(directory) and filename != 'index.md':
+            # This file should become the index for this section
+            new_index_path = os.path.join(os.path.dirname(new_relative_path), 'index.md')
             
-            # Copy file
-            with open(original_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            # Only convert if there isn't already an index.md in the source or planned output
+            source_index = os.path.join(directory, 'index.md')
             
-            # Determine the title to use
-            title = None
-            if is_section_index:
+            if source_index not in present and new_index_path not in claimed_outputs:
+                new_relative_path = new_index_path
+                log.debug(f"  -> Converting to section index: {filename}")
                 # If this file is being converted to a section index, try to get title from .pages file first
-                title = get_title_from_pages_file(os.path.dirname(original_path))
-                if not title:
-                    title = filename_without_ext
-                print(f"     Added title header: # {title}")
+                title = pages_titles.get(directory) or filename_without_ext
+                log.debug(f"     Added title header: # {title}")
             else:
-                # For regular files, use the original filename (without extension) as the title
-                # This preserves capitalization from the source
-                title = filename_without_ext
-            
-            # Ensure all files have a title header to preserve capitalization
-            content = ensure_title_header(content, title)
-            
-            with open(new_path, 'w', encoding='utf-8') as f:
-                f.write(content)
-            
-            # Store mapping (original filename -> new path)
-            original_name = os.path.splitext(filename)[0]
-            new_name = os.path.splitext(os.path.basename(new_path))[0]
-            mapping[original_name] = new_relative_path
-            
-            print(f"Copied: {relative_original} -> {new_relative_path}")
+                if source_index in present:
+                    log.debug(f"  -> Skipping conversion (index.md exists in source): {filename}")
+                else:
+                    log.debug(f"  -> Skipping conversion (index.md exists in destination): {filename}")
+        
+        claimed_outputs.add(new_relative_path)
+        notes.append({
+            'relative_source': path,
+            'output': new_relative_path,
+            'name': filename_without_ext,
+            'title': title,
+        })
+    
+    return notes, pages_files
+
+
+def plan_reorganization(source_dir, dest_dir, paths=None):
+    """
+    Decide where every note and .pages file from source_dir will be written.
+    
+    Only file names (and .pages titles) are looked at, so this is cheap and
+    gives the complete mapping before any note is read; see plan_paths().
+    Pass paths ('/'-separated, relative to source_dir) to plan just those
+    files instead of every file in source_dir (e.g. the published notes of
+    the vault itself).
+    
+    Returns (notes, pages_files). Each note is a dict with 'source' (path on
+    disk), 'relative_source' (relative to source_dir), 'relative_original'
+    (relative to the working directory), 'output' (relative to dest_dir),
+    'name' (mapping key) and 'title'. Each .pages entry is a tuple of
+    (source path, destination path, content); every .pages file is read
+    once, here.
+    """
+    if paths is None:
+        paths = []
+        for root, dirs, files in os.walk(source_dir):
+            for filename in files:
+                paths.append(os.path.relpath(os.path.join(root, filename), source_dir).replace(os.sep, '/'))
+    pages_contents = {}
+    for path in paths:
+        if os.path.basename(path) == '.pages':
+            content = read_pages_file(os.path.join(source_dir, path))
+            if content is not None:
+                pages_contents[path] = content
+    pages_titles = {}
+    for path, content in pages_contents.items():
+        title = pages_title(content)
+        if title:
+            pages_titles[os.path.dirname(path)] = title
+    
+    notes, pages_files = plan_paths(paths, pages_titles)
+    for note in notes:
+        note['source'] = os.path.join(source_dir, note['relative_source'])
+        note['relative_original'] = os.path.relpath(note['source'], '.')
+    pages_files = [(os.path.join(source_dir, path), os.path.join(dest_dir, output), pages_contents[path])
+                   for path, output in pages_files if path in pages_contents]
+    return notes, pages_files
+
+
+def build_mapping(notes):
+    """Build the mapping of original note name -> new relative path from a plan."""
+    mapping = {}
+    for note in notes:
+        mapping[note['name']] = note['output']
+    return mapping
+
+
+def copy_pages_files(pages_files, dest_dir):
+    """Write the .pages files of a plan as-is to their new directories (unchanged ones are left alone)."""
+    for original_path, new_pages_path, content in pages_files:
+        os.makedirs(os.path.dirname(new_pages_path), exist_ok=True)
+        if write_if_changed(new_pages_path, content):
+            log.debug(f"Copied .pages: {os.path.relpath(original_path, '.')} -> {os.path.relpath(new_pages_path, dest_dir)}")
+
+
+def section_titles(pages_files, dest_dir):
+    """Return output directory ('/'-separated, relative to dest_dir) -> title of every .pages file of a plan."""
+    titles = {}
+    for original_path, new_pages_path, content in pages_files:
+        title = pages_title(content)
+        if title:
+            directory = os.path.relpath(os.path.dirname(new_pages_path), dest_dir).replace(os.sep, '/')
+            titles['' if directory == '.' else directory] = title
+    return titles
+
+
+def dirname_to_title(dirname):
+    """Return the title MkDocs gives a section named after its directory."""
+    title = dirname.replace('-', ' ').replace('_', ' ')
+    if title.lower() == title:
+        title = title.capitalize()
+    return title
+
+
+def nav_order(path):
+    """Sort key putting pages in MkDocs order: index.md, the other files, then subdirectories."""
+    key = walk_order(path)
+    if posixpath.basename(path) in ('index.md', 'README.md'):
+        key[-1] = (0, '')
+    return key
+
+
+def collapse_sections(items):
+    """Drop empty sections and replace sections holding a single item by that item."""
+    collapsed = []
+    for item in items:
+        if isinstance(item, dict):
+            (title, children), = item.items()
+            children = collapse_sections(children)
+            if not children:
+                continue
+            item = children[0] if len(children) == 1 else {title: children}
+        collapsed.append(item)
+    return collapsed
+
+
+def build_nav(outputs, titles=None):
+    """
+    Return the MkDocs nav of a docs directory holding the given pages.
+    
+    This is the navigation awesome-pages (with collapse_single_pages) used to
+    derive by walking the docs directory and parsing every .pages file on
+    each build: pages in MkDocs order, sections titled from their .pages
+    file (or their directory name) and sections with a single page collapsed
+    into it. Pages keep no title here, so MkDocs takes it from their header.
+    
+    Args:
+        outputs: Markdown pages, '/'-separated and relative to the docs directory
+        titles: Output directory -> title from its .pages file
+    """
+    titles = titles or {}
+    nav = []
+    sections = {'': nav}
+    for output in sorted(set(outputs), key=nav_order):
+        directory = posixpath.dirname(output)
+        parts = directory.split('/') if directory else []
+        for depth in range(1, len(parts) + 1):
+            section = '/'.join(parts[:depth])
+            if section not in sections:
+                sections[section] = []
+                title = titles.get(section) or dirname_to_title(parts[depth - 1])
+                sections['/'.join(parts[:depth - 1])].append({title: sections[section]})
+        sections[directory].append(output)
+    return collapse_sections(nav)
+
+
+def write_nav(dest_dir, outputs, titles=None):
+    """Write the nav of the given pages (see build_nav()) to dest_dir's NAV_FILE; returns True if it changed."""
+    # Written before the notes, so dest_dir may not exist yet
+    os.makedirs(dest_dir, exist_ok=True)
+    return write_if_changed(os.path.join(dest_dir, NAV_FILE), json.dumps(build_nav(outputs, titles), indent=2))
+
+
+# Read-only state shared by reorganize_note(), set once per worker process
+_worker_state = {}
+
+
+def _init_worker(mapping, dest_dir, manifest):
+    _worker_state['mapping'] = mapping
+    _worker_state['dest_dir'] = dest_dir
+    _worker_state['manifest'] = manifest
+
+
+def reorganize_note(note):
+    """
+    Copy a single planned note to its new location with a title header.
+    
+    Runs in a worker process when reorganizing with --jobs. Returns None if
+    the build manifest says the note is unchanged, otherwise its new manifest
+    entry (an empty dict when running without a manifest).
+    """
+    with span('reorganize', 'file', file=note['output']):
+        mapping = _worker_state['mapping']
+        dest_dir = _worker_state['dest_dir']
+        manifest = _worker_state['manifest']
+        
+        with open(note['source'], 'r', encoding='utf-8') as f:
+            content = f.read()
+        
+        if manifest is not None and not manifest.needs_rebuild(
+                note['relative_source'], content, note['output'], mapping, dest_dir):
+            return None
+        
+        # Create directory if needed
+        new_path = os.path.join(dest_dir, note['output'])
+        os.makedirs(os.path.dirname(new_path), exist_ok=True)
+        
+        # Ensure all files have a title header to preserve capitalization
+        write_if_changed(new_path, ensure_title_header(content, note['title']))
+        
+        if manifest is None:
+            return {}
+        from build_manifest import make_entry
+        return make_entry(content, note['output'], mapping)
+
+
+def copy_and_reorganize(source_dir, dest_dir, mapping_file, manifest=None, jobs=1):
+    """
+    Copy files from source to destination with reorganization.
+    
+    Also creates a mapping file for wikilink conversion.
+    
+    If a BuildManifest is given, only notes whose source, stage versions or
+    link targets changed since the last build are rewritten (and marked
+    pending for the later stages); outputs of deleted or moved notes are
+    removed from dest_dir. With jobs > 1 (or 0 for one per CPU) notes are
+    copied by a pool of worker processes.
+    """
+    from parallel import parallel_map
+    from convert_wikilinks import LinkResolver, warn_ambiguous_names
+    
+    notes, pages_files = plan_reorganization(source_dir, dest_dir)
+    mapping = build_mapping(notes)
+    resolver = LinkResolver(mapping, notes)
+    warn_ambiguous_names(resolver)
+    
+    # When several notes share an output path only the last one is written
+    last_claimant = {note['output']: note['relative_source'] for note in notes}
+    for note in notes:
+        if last_claimant[note['output']] != note['relative_source']:
+            log.warning(f"{note['relative_original']} is overwritten by another note with the same output path {note['output']}")
+    notes = [note for note in notes if last_claimant[note['output']] == note['relative_source']]
+    
+    if manifest is not None:
+        planned = {note['relative_source']: note['output'] for note in notes}
+        for removed in manifest.prune(planned, dest_dir):
+            log.info(f"Removed stale output: {removed}")
+    
+    copy_pages_files(pages_files, dest_dir)
+    write_nav(dest_dir, [note['output'] for note in notes], section_titles(pages_files, dest_dir))
+    
+    results = parallel_map(reorganize_note, notes, jobs,
+                           initializer=_init_worker, initargs=(resolver, dest_dir, manifest))
+    
+    unchanged_count = 0
+    for note, entry in zip(notes, results):
+        if entry is None:
+            unchanged_count += 1
+            continue
+        if manifest is not None:
+            manifest.set_entry(note['relative_source'], entry)
+        log.debug(f"Copied: {note['relative_original']} -> {note['output']}")
     
     # Save mapping to file
-    with open(mapping_file, 'w', encoding='utf-8') as f:
-        json.dump(mapping, f, indent=2)
+    write_if_changed(mapping_file, json.dumps(mapping, indent=2))
+    
+    if manifest is not None:
+        manifest.save()
+    
+    log.info(f"\nMapping saved to {mapping_file}")
+    log.info(f"Total files reorganized: {len(mapping)}")
+    if unchanged_count > 0:
+        log.info(f"Unchanged files skipped: {unchanged_count}")
+    if pages_files:
+        log.info(f"Total .pages files copied: {len(pages_files)}")
+
+
+# Linux FICLONE ioctl: share the source's extents (copy-on-write) on btrfs/XFS
+FICLONE = 0x40049409
+
+
+def _reflink(source_file, dest_file):
+    """Clone source_file into dest_file without copying data; raise OSError if unsupported."""
+    import fcntl
+    with open(source_file, 'rb') as src, open(dest_file, 'wb') as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+def _kernel_copy(source_file, dest_file):
+    """Copy a file inside the kernel with copy_file_range/sendfile, never buffering it in Python."""
+    with open(source_file, 'rb') as src, open(dest_file, 'wb') as dst:
+        remaining = os.fstat(src.fileno()).st_size
+        copy_file_range = getattr(os, 'copy_file_range', None)
+        while remaining > 0:
+            try:
+                if copy_file_range is not None:
+                    sent = copy_file_range(src.fileno(), dst.fileno(), remaining)
+                else:
+                    sent = os.sendfile(dst.fileno(), src.fileno(), None, remaining)
+            except OSError:
+                if copy_file_range is None:
+                    raise
+                # e.g. EXDEV on older kernels: fall back to sendfile
+                copy_file_range = None
+                continue
+            if sent == 0:
+                break
+            remaining -= sent
+
+
+def sync_file(source_file, dest_file, mode='link'):
+    """
+    Make dest_file a copy of source_file as cheaply as the platform allows.
+    
+    With mode 'link' a hard link is tried first; otherwise (or if linking
+    fails, e.g. across file systems) a reflink, then an in-kernel copy, then
+    a plain shutil copy. Mode 'reflink' never hard links, and mode 'copy'
+    always copies the data. The result is written next to dest_file and
+    renamed into place, and always carries the source's mtime.
+    """
+    import shutil
+    
+    tmp_file = dest_file + '.tmp'
+    if os.path.lexists(tmp_file):
+        os.remove(tmp_file)
+    
+    if mode == 'link':
+        try:
+            os.link(source_file, tmp_file)
+            os.replace(tmp_file, dest_file)
+            return
+        except OSError:
+            pass
+    
+    copies = (_kernel_copy, shutil.copyfile) if mode == 'copy' else (_reflink, _kernel_copy, shutil.copyfile)
+    for copy in copies:
+        try:
+            copy(source_file, tmp_file)
+            break
+        except (OSError, AttributeError):
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+    else:
+        raise OSError(f"Could not copy {source_file} to {dest_file}")
+    
+    shutil.copystat(source_file, tmp_file)
+    os.replace(tmp_file, dest_file)
+
+
+def _file_hash(path):
+    import hashlib
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def asset_is_current(source_file, dest_file):
+    """
+    Check whether dest_file already holds source_file's content.
     
-    print(f"\nMapping saved to {mapping_file}")
-    print(f"Total files reorganized: {len(mapping)}")
-    if pages_count > 0:
-        print(f"Total .pages files copied: {pages_count}")
+    Matching size and mtime (or the same inode, for hard links) is enough;
+    files with matching sizes but different mtimes are compared by hash, and
+    the destination's mtime is brought in line when the content matches.
+    """
+    try:
+        dest_stat = os.stat(dest_file)
+    except FileNotFoundError:
+        return False
+    source_stat = os.stat(source_file)
+    if (source_stat.st_ino, source_stat.st_dev) == (dest_stat.st_ino, dest_stat.st_dev):
+        return True
+    if source_stat.st_size != dest_stat.st_size:
+        return False
+    if source_stat.st_mtime_ns == dest_stat.st_mtime_ns:
+        return True
+    if _file_hash(source_file) != _file_hash(dest_file):
+        return False
+    os.utime(dest_file, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+    return True
+
+
+def stored_asset_name(digest, filename):
+    """Return the content-addressed name an asset is stored under in assets/."""
+    return digest[:ASSET_HASH_LENGTH] + os.path.splitext(filename)[1].lower()
+
+
+def load_asset_manifest(dest_dir):
+    """Load the asset manifest of the last build in dest_dir (empty if missing)."""
+    try:
+        with open(os.path.join(dest_dir, ASSET_MANIFEST), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
 
-def copy_assets(source_dir, dest_dir, base_dir='.site_content_temp'):
+def copy_assets(source_dir, dest_dir, mode='link', names=None):
     """
-    Copy asset files (images, etc.) to the destination with reorganization.
+    Sync asset files (images, etc.) to the destination, stored by content hash.
+    
+    Every asset is stored once in an 'assets' directory at the root, named
+    after the hash of its content (see stored_asset_name), so identical
+    files under different names share one file and every URL changes with
+    its content (and can be cached forever). assets/manifest.json maps each
+    asset name (the slugified file name image wikilinks are resolved by) to
+    its stored file. Assets whose name, size and mtime are unchanged since
+    the last build aren't hashed again; new content is cloned copy-on-write
+    where the file system supports it (mode 'link') or copied without
+    buffering it in Python (mode 'copy'), and stored files no asset uses any
+    more are removed. With names (a set of asset names), only those assets
+    are synced.
+    
+    Stored files are never hard linked to the vault: a note's image edited
+    in place would change the content under its old hash name.
     
-    Assets are copied to an 'assets' directory at the root.
+    Returns the asset manifest: asset name -> stored file name in assets/.
     """
     # Try to find Assets directory
     # First try in source_dir
@@ -250,42 +611,98 @@ def copy_assets(source_dir, dest_dir, base_dir='.site_content_temp'):
         assets_source = os.path.join(parent_dir, 'Assets')
     
     if not os.path.exists(assets_source):
-        print(f"No Assets directory found (tried: {assets_source})")
-        return
+        log.info(f"No Assets directory found (tried: {assets_source})")
+        return {}
     
     assets_dest = os.path.join(dest_dir, 'assets')
     os.makedirs(assets_dest, exist_ok=True)
+    previous = load_asset_manifest(dest_dir)
     
     count = 0
+    unchanged_count = 0
+    manifest = {}
+    sources = {}
     for root, dirs, files in os.walk(assets_source):
-        for filename in files:
+        dirs.sort()
+        for filename in sorted(files):
             source_file = os.path.join(root, filename)
-            # Slugify the filename
-            new_filename = slugify(os.path.splitext(filename)[0]) + os.path.splitext(filename)[1]
-            dest_file = os.path.join(assets_dest, new_filename)
+            # Image wikilinks name assets by their (slugified) file name
+            name = slugify(os.path.splitext(filename)[0]) + os.path.splitext(filename)[1]
+            if names is not None and name not in names:
+                continue
+            if name in manifest:
+                log.warning(f"{os.path.relpath(source_file, assets_source)} and {sources[name]} are both "
+                            f"stored as asset '{name}', keeping {sources[name]}")
+                continue
+            sources[name] = os.path.relpath(source_file, assets_source)
+            
+            # The stored copy of the last build still holds this content: no need to hash it.
+            # A stored file sharing the source's inode (hard linked by older builds) proves nothing.
+            stored = previous.get(name)
+            source_stat = os.stat(source_file)
+            try:
+                stored_stat = os.stat(os.path.join(assets_dest, stored)) if stored else None
+            except FileNotFoundError:
+                stored_stat = None
+            if (stored_stat is None or os.path.samestat(source_stat, stored_stat)
+                    or (source_stat.st_size, source_stat.st_mtime_ns) != (stored_stat.st_size, stored_stat.st_mtime_ns)):
+                stored = stored_asset_name(_file_hash(source_file), filename)
+            manifest[name] = stored
+            
+            dest_file = os.path.join(assets_dest, stored)
+            # Content-addressed: an existing file of our own already has this content
+            if os.path.exists(dest_file) and not os.path.samestat(source_stat, os.stat(dest_file)):
+                unchanged_count += 1
+                continue
             
-            # Copy file
-            with open(source_file, 'rb') as f:
-                content = f.read()
-            with open(dest_file, 'wb') as f:
-                f.write(content)
+            sync_file(source_file, dest_file, 'reflink' if mode == 'link' else 'copy')
             
             count += 1
-            print(f"Copied asset: {filename} -> assets/{new_filename}")
+            log.debug(f"Copied asset: {filename} -> assets/{stored}")
+    
+    # Prune stored files no asset uses any more
+    expected = set(manifest.values()) | {os.path.basename(ASSET_MANIFEST)}
+    removed_count = 0
+    for filename in sorted(os.listdir(assets_dest)):
+        dest_file = os.path.join(assets_dest, filename)
+        if filename not in expected and os.path.isfile(dest_file):
+            os.remove(dest_file)
+            removed_count += 1
+            log.debug(f"Removed asset: assets/{filename}")
+    write_if_changed(os.path.join(dest_dir, ASSET_MANIFEST), json.dumps(manifest, indent=2, sort_keys=True))
     
-    print(f"Total assets copied: {count}")
+    log.info(f"Total assets copied: {count}")
+    if unchanged_count > 0:
+        log.info(f"Unchanged assets skipped: {unchanged_count}")
+    if len(set(manifest.values())) < len(manifest):
+        log.info(f"Duplicate assets stored once: {len(manifest) - len(set(manifest.values()))}")
+    if removed_count > 0:
+        log.info(f"Stale assets removed: {removed_count}")
+    return manifest
 
 
 if __name__ == '__main__':
     import sys
     
-    if len(sys.argv) != 4:
-        print("Usage: reorganize_files.py <source_dir> <dest_dir> <mapping_file>")
+    from parallel import pop_jobs_arg
+    from tracing import setup_from_argv
+    jobs = pop_jobs_arg(sys.argv)
+    setup_from_argv(sys.argv)
+    
+    if len(sys.argv) not in (4, 5):
+        print("Usage: reorganize_files.py <source_dir> <dest_dir> <mapping_file> [manifest_file] [--jobs N] [--trace FILE] [-v|-q]")
         sys.exit(1)
     
     source_dir = sys.argv[1]
     dest_dir = sys.argv[2]
     mapping_file = sys.argv[3]
     
-    copy_and_reorganize(source_dir, dest_dir, mapping_file)
-    copy_assets(source_dir, dest_dir)
+    manifest = None
+    if len(sys.argv) == 5:
+        from build_manifest import BuildManifest
+        manifest = BuildManifest(sys.argv[4])
+    
+    with span('reorganize'):
+        copy_and_reorganize(source_dir, dest_dir, mapping_file, manifest, jobs)
+    with span('assets'):
+        copy_assets(source_dir, dest_dir)
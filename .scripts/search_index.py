@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Build a prebuilt, sharded search index into the docs directory.
+
+Material's search plugin ships the text of every page in one
+search_index.json, and the browser builds a lunr index from it on the first
+search, so the first search gets slower as the vault grows. This stage does
+the indexing at build time instead:
+1. Every page becomes a record: its title, section, entity type (section
+   and info box Type), info box fields and tags, and plain text
+2. Records are grouped into shards by section (NPCs, Locations, Groups...),
+   with large sections split into chunks of at most SHARD_SIZE pages
+3. Each shard holds its pages and an inverted index of precomputed BM25
+   weights, with title, type and field matches boosted (FIELD_BOOSTS).
+   Document frequencies and field lengths are those of the shard's own
+   pages, so editing a note only changes the shard it is in
+4. search/index.json lists the shards and, for every PREFIX_LENGTH-letter
+   term prefix, the shards holding terms that start with it
+
+docs/javascripts/search.js fetches index.json when the search box is first
+used, then only the shards a query can match. Shard files are named after
+their content hash, so browsers can cache them for good.
+"""
+
+import hashlib
+import html
+import json
+import logging
+import math
+import os
+import re
+import sys
+import unicodedata
+
+from output_files import write_if_changed
+from tracing import span
+
+log = logging.getLogger(__name__)
+
+SEARCH_DIR = 'search'
+INDEX_FILE = 'index.json'
+INDEX_VERSION = 2
+
+SHARD_SIZE = 250
+PREFIX_LENGTH = 3
+SNIPPET_LENGTH = 160
+
+# Score multipliers of a match in each field of a record
+FIELD_BOOSTS = {
+    'title': 10.0,
+    'type': 5.0,
+    'fields': 3.0,
+    'text': 1.0,
+}
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# "What links here" section added by pipeline.add_backlinks(); it names other pages, not this one
+BACKLINKS_SECTION = re.compile(r'\n## What links here\n.*', re.DOTALL)
+HTML_COMMENT = re.compile(r'<!--.*?-->', re.DOTALL)
+IMAGE = re.compile(r'!\[[^\]]*\]\([^)]*\)')
+LINK = re.compile(r'\[([^\]]*)\]\([^)]*\)')
+WIKILINK = re.compile(r'\[\[(?:[^\]|]*\|)?([^\]]*)\]\]')
+HTML_TAG = re.compile(r'<[^>]+>')
+MARKUP = re.compile(r'[#*_`>|~=]+|^\s*[-+]\s+|^\s*\d+\.\s+', re.MULTILINE)
+WHITESPACE = re.compile(r'\s+')
+TOKEN_SEPARATOR = re.compile(r'[\W_]+')
+
+
+def tokenize(text):
+    """
+    Split text into lowercase search terms without accents.
+
+    Must match tokenize() in docs/javascripts/search.js.
+    """
+    text = ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+    return [term for term in TOKEN_SEPARATOR.split(text.lower()) if term]
+
+
+def plain_text(content):
+    """Return the readable text of a page's final markdown (no markup, links, images or HTML tags)."""
+    text = BACKLINKS_SECTION.sub('', content)
+    text = HTML_COMMENT.sub(' ', text)
+    text = IMAGE.sub(' ', text)
+    text = LINK.sub(r'\1', text)
+    text = HTML_TAG.sub(' ', text)
+    text = MARKUP.sub(' ', text)
+    return WHITESPACE.sub(' ', html.unescape(text)).strip()
+
+
+def page_location(output):
+    """Return the URL of a page relative to the site root (MkDocs' use_directory_urls layout)."""
+    if output == 'index.md':
+        return ''
+    if os.path.basename(output) == 'index.md':
+        return os.path.dirname(output) + '/'
+    return output[:-len('.md')] + '/'
+
+
+def field_text(value):
+    """Return an info box field value (or list of values) as text, with wikilinks as their names."""
+    if isinstance(value, list):
+        return ' '.join(field_text(item) for item in value)
+    if value is None or isinstance(value, bool):
+        return ''
+    return WIKILINK.sub(lambda match: match.group(1).split('/')[-1].replace('.md', ''), str(value))
+
+
+def search_record(output, content, metadata=None):
+    """
+    Return the search record of a page.
+
+    Args:
+        output: Output path of the page relative to the docs directory
+        content: The page's final markdown
+        metadata: The note's tags and info box fields (dataview.extract_metadata() of its source)
+    """
+    metadata = metadata or {}
+    fields = metadata.get('fields', {})
+    section = output.split('/')[0] if '/' in output else ''
+    heading = re.match(r'\s*# (.+)', content)
+    text = plain_text(content)
+    title = heading.group(1).strip() if heading else os.path.splitext(os.path.basename(output))[0]
+    if heading and text.startswith(title):
+        text = text[len(title):].lstrip()
+    entity_type = ' '.join(value for value in (section.replace('-', ' '), field_text(fields.get('Type')))
+                           if value)
+    return {
+        'location': page_location(output),
+        'title': title,
+        'section': section,
+        'type': entity_type,
+        'fields': ' '.join([field_text(value) for value in fields.values()]
+                           + [tag for tag in metadata.get('tags', []) if tag != 'wiki']),
+        'text': text,
+    }
+
+
+def shard_records(records):
+    """Return (shard name, records) of every shard, grouping records by section in chunks of SHARD_SIZE."""
+    sections = {}
+    for record in sorted(records, key=lambda record: record['location']):
+        sections.setdefault(record['section'], []).append(record)
+    shards = []
+    for section in sorted(sections):
+        chunks = [sections[section][i:i + SHARD_SIZE] for i in range(0, len(sections[section]), SHARD_SIZE)]
+        for number, chunk in enumerate(chunks, 1):
+            name = section or 'pages'
+            shards.append((name if number == 1 else f'{name}-{number}', chunk))
+    return shards
+
+
+def bm25_weights(records):
+    """
+    Return the BM25 weight of every term of every record, as a list of {term: weight}.
+
+    Document frequencies and average field lengths are taken over the given
+    records only.
+    """
+    tokens = [{field: tokenize(record[field]) for field in FIELD_BOOSTS} for record in records]
+    average_length = {field: max(1.0, sum(len(page[field]) for page in tokens) / max(1, len(tokens)))
+                      for field in FIELD_BOOSTS}
+    document_frequency = {}
+    for page in tokens:
+        for term in set().union(*page.values()):
+            document_frequency[term] = document_frequency.get(term, 0) + 1
+
+    page_weights = []
+    for page in tokens:
+        scores = {}
+        for field, boost in FIELD_BOOSTS.items():
+            counts = {}
+            for term in page[field]:
+                counts[term] = counts.get(term, 0) + 1
+            norm = K1 * (1 - B + B * len(page[field]) / average_length[field])
+            for term, count in counts.items():
+                scores[term] = scores.get(term, 0.0) + boost * count * (K1 + 1) / (count + norm)
+        for term in scores:
+            frequency = document_frequency[term]
+            scores[term] *= math.log(1 + (len(records) - frequency + 0.5) / (frequency + 0.5))
+        page_weights.append(scores)
+    return page_weights
+
+
+def build_search_index(records):
+    """
+    Build the search index files of a set of page records.
+
+    Each shard's term weights are computed from the shard's own pages, so a
+    shard's content (and its hashed file name) only changes when one of its
+    pages does, and browsers keep every other shard cached after an edit.
+
+    Returns {file name (relative to the search directory): JSON text}.
+    """
+    records = sorted(records, key=lambda record: record['location'])
+    files = {}
+    shards = []
+    prefixes = {}
+    for name, chunk in shard_records(records):
+        postings = {}
+        for number, weights in enumerate(bm25_weights(chunk)):
+            for term, weight in weights.items():
+                postings.setdefault(term, []).extend([number, round(weight, 3)])
+        shard = {
+            'docs': [{'location': record['location'], 'title': record['title'], 'section': record['section'],
+                      'text': record['text'][:SNIPPET_LENGTH]} for record in chunk],
+            'terms': dict(sorted(postings.items())),
+        }
+        text = json.dumps(shard, ensure_ascii=False, separators=(',', ':'))
+        filename = f"{name}.{hashlib.sha256(text.encode('utf-8')).hexdigest()[:12]}.json"
+        files[filename] = text
+        for prefix in {term[:PREFIX_LENGTH] for term in postings}:
+            prefixes.setdefault(prefix, []).append(len(shards))
+        shards.append({'name': name, 'section': chunk[0]['section'], 'file': filename, 'docs': len(chunk)})
+
+    files[INDEX_FILE] = json.dumps({
+        'version': INDEX_VERSION,
+        'prefix_length': PREFIX_LENGTH,
+        'shards': shards,
+        'prefixes': dict(sorted(prefixes.items())),
+    }, ensure_ascii=False, separators=(',', ':'))
+    return files
+
+
+def write_search_index(dest_dir, records):
+    """
+    Write the search index of records into the search directory of dest_dir.
+
+    Unchanged files are left alone and shard files of earlier builds are removed.
+    Returns the number of files written.
+    """
+    search_dir = os.path.join(dest_dir, SEARCH_DIR)
+    os.makedirs(search_dir, exist_ok=True)
+    files = build_search_index(records)
+    for filename in os.listdir(search_dir):
+        if filename.endswith('.json') and filename not in files:
+            os.remove(os.path.join(search_dir, filename))
+
+    written = 0
+    for filename, text in files.items():
+        path = os.path.join(search_dir, filename)
+        # Shard names change with their content; only the index has to be compared
+        if filename != INDEX_FILE and os.path.exists(path):
+            continue
+        if write_if_changed(path, text):
+            written += 1
+    log.info(f"Search index: {len(records)} pages in {len(files) - 1} shards, {written} file(s) updated")
+    return written
+
+
+def read_record(task):
+    """Return the search record of a page written to disk; task is (path, output, metadata)."""
+    path, output, metadata = task
+    with open(path, 'r', encoding='utf-8') as f:
+        return search_record(output, f.read(), metadata)
+
+
+def index_exists(dest_dir):
+    """Check if dest_dir has a search index."""
+    return os.path.exists(os.path.join(dest_dir, SEARCH_DIR, INDEX_FILE))
+
+
+def build_search_index_from_docs(dest_dir, manifest=None, jobs=1):
+    """
+    Index every page of a docs directory.
+
+    Info box fields and tags come from the build manifest when one is given;
+    the final pages no longer have them in their source form.
+    """
+    from parallel import parallel_map
+
+    metadata = {}
+    if manifest is not None:
+        metadata = {entry['output']: entry.get('metadata') for entry in manifest.notes.values()}
+    tasks = []
+    for root, dirs, files in os.walk(dest_dir):
+        # Like MkDocs, skip hidden directories such as .overrides
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        for filename in sorted(files):
+            if filename.endswith('.md'):
+                path = os.path.join(root, filename)
+                output = os.path.relpath(path, dest_dir).replace(os.sep, '/')
+                tasks.append((path, output, metadata.get(output)))
+    records = parallel_map(read_record, tasks, jobs)
+    return write_search_index(dest_dir, records)
+
+
+if __name__ == '__main__':
+    from parallel import pop_jobs_arg
+    from tracing import setup_from_argv
+    jobs = pop_jobs_arg(sys.argv)
+    setup_from_argv(sys.argv)
+
+    if len(sys.argv) not in (2, 3):
+        print("Usage: search_index.py <docs_dir> [manifest_file] [--jobs N] [--trace FILE] [-v|-q]")
+        sys.exit(1)
+
+    manifest = None
+    if len(sys.argv) == 3:
+        from build_manifest import BuildManifest
+        manifest = BuildManifest(sys.argv[2])
+
+    with span('search index'):
+        build_search_index_from_docs(sys.argv[1], manifest, jobs)
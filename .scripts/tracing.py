@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Build tracing (--trace out.json) and logging setup shared by the build scripts.
+
+With --trace, every stage, file and transform of a build is recorded as a
+Chrome trace event, so the file opens in Perfetto (ui.perfetto.dev) or
+chrome://tracing. Worker processes append their events to a scratch
+directory as they go, and the events are merged into the trace file when the
+build exits. A summary of the slowest files and the most common unresolved
+link targets is printed then too.
+
+Output goes through the logging module: per-file messages are DEBUG (shown
+with --verbose), progress and totals are INFO, problems are WARNING (the
+only thing left with --quiet).
+"""
+
+import argparse
+import atexit
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+# Inherited by worker processes, so they trace and log like the parent even when spawned
+TRACE_DIR_ENV = 'SITE_TRACE_DIR'
+LOG_LEVEL_ENV = 'SITE_LOG_LEVEL'
+
+SUMMARY_SIZE = 10
+
+
+class Tracer:
+    """Collects the trace events of one process and appends them to its file in the scratch directory."""
+
+    def __init__(self, events_dir):
+        self.events_dir = events_dir
+        self.pid = os.getpid()
+        self.events = []
+        self.depth = 0
+
+    def claim(self):
+        # A forked worker starts with a copy of its parent's unflushed events
+        if os.getpid() != self.pid:
+            self.pid = os.getpid()
+            self.events = []
+            self.depth = 0
+
+    def add(self, event):
+        event['pid'] = self.pid
+        event['tid'] = threading.get_native_id()
+        self.events.append(event)
+        if self.depth == 0:
+            self.flush()
+
+    def flush(self):
+        if not self.events:
+            return
+        with open(os.path.join(self.events_dir, f'{self.pid}.jsonl'), 'a', encoding='utf-8') as f:
+            for event in self.events:
+                f.write(json.dumps(event) + '\n')
+        self.events = []
+
+
+_tracer = Tracer(os.environ[TRACE_DIR_ENV]) if os.environ.get(TRACE_DIR_ENV) else None
+_trace_file = None
+
+
+def _now():
+    return time.perf_counter_ns() / 1000
+
+
+def enabled():
+    """Check if this build is being traced."""
+    return _tracer is not None
+
+
+@contextmanager
+def span(name, category='stage', **args):
+    """Record the time spent in a with block as a complete ('X') trace event."""
+    if _tracer is None:
+        yield
+        return
+    _tracer.claim()
+    start = _now()
+    _tracer.depth += 1
+    try:
+        yield
+    finally:
+        _tracer.depth -= 1
+        _tracer.add({'name': name, 'cat': category, 'ph': 'X', 'ts': start, 'dur': _now() - start, 'args': args})
+
+
+def instant(name, category='event', **args):
+    """Record a point in time, e.g. an unresolved link, as an instant ('i') trace event."""
+    if _tracer is None:
+        return
+    _tracer.claim()
+    _tracer.add({'name': name, 'cat': category, 'ph': 'i', 's': 't', 'ts': _now(), 'args': args})
+
+
+def start_tracing(trace_file):
+    """Start recording trace events for this process and its workers; they are written to trace_file on exit."""
+    global _tracer, _trace_file
+    events_dir = tempfile.mkdtemp(prefix='site-trace-')
+    os.environ[TRACE_DIR_ENV] = events_dir
+    _tracer = Tracer(events_dir)
+    _trace_file = trace_file
+    atexit.register(finish_tracing)
+
+
+def finish_tracing():
+    """Merge every process's events into the trace file and print the summary."""
+    global _tracer
+    if _tracer is None or _trace_file is None or os.getpid() != _tracer.pid:
+        return
+    _tracer.flush()
+    events_dir = _tracer.events_dir
+    _tracer = None
+    os.environ.pop(TRACE_DIR_ENV, None)
+
+    events = []
+    for filename in sorted(os.listdir(events_dir)):
+        with open(os.path.join(events_dir, filename), 'r', encoding='utf-8') as f:
+            events.extend(json.loads(line) for line in f)
+    shutil.rmtree(events_dir, ignore_errors=True)
+
+    main_pid = os.getpid()
+    pids = sorted({event['pid'] for event in events} | {main_pid})
+    names = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0,
+              'args': {'name': os.path.basename(sys.argv[0]) if pid == main_pid else f'worker {pid}'}}
+             for pid in pids]
+    with open(_trace_file, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': names + sorted(events, key=lambda event: event['ts']),
+                   'displayTimeUnit': 'ms'}, f)
+    print_summary(events)
+    print(f"Trace written to {_trace_file} ({len(events)} events; open it in https://ui.perfetto.dev)")
+
+
+def print_summary(events):
+    """Print the slowest files and the unresolved link targets of a trace."""
+    files = sorted((event for event in events if event['ph'] == 'X' and event['cat'] == 'file'),
+                   key=lambda event: event['dur'], reverse=True)
+    if files:
+        print(f"Slowest files ({len(files)} processed):")
+        for event in files[:SUMMARY_SIZE]:
+            print(f"  {event['dur'] / 1000:8.2f} ms  {event['args'].get('file', event['name'])}")
+
+    unresolved = {}
+    for event in events:
+        if event['ph'] == 'i' and event['name'] == 'unresolved link':
+            target = event['args']['target']
+            unresolved[target] = unresolved.get(target, 0) + 1
+    if unresolved:
+        print(f"Unresolved links: {sum(unresolved.values())} to {len(unresolved)} targets")
+        for target, count in sorted(unresolved.items(), key=lambda item: (-item[1], item[0]))[:SUMMARY_SIZE]:
+            print(f"  {count:6d}  {target}")
+
+
+class MessageFormatter(logging.Formatter):
+    """Formats records as plain messages, with the level in front of warnings and errors ("Warning: ...")."""
+
+    def format(self, record):
+        message = super().format(record)
+        if record.levelno >= logging.WARNING:
+            return f"{record.levelname.capitalize()}: {message}"
+        return message
+
+
+def setup_logging(level=logging.INFO):
+    """Send log records to stdout as plain messages (like the print output they replace)."""
+    os.environ[LOG_LEVEL_ENV] = logging.getLevelName(level)
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(MessageFormatter('%(message)s'))
+    logging.basicConfig(handlers=[handler], level=level, force=True)
+
+
+def add_arguments(parser):
+    """Add --trace, --verbose and --quiet to an ArgumentParser."""
+    parser.add_argument('--trace', metavar='FILE', help='Write a Chrome trace of the build to FILE (JSON)')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Log every file as it is processed')
+    parser.add_argument('--quiet', '-q', action='store_true', help='Only log warnings')
+
+
+def setup(args):
+    """Apply the options added by add_arguments()."""
+    setup_logging(logging.DEBUG if args.verbose else logging.WARNING if args.quiet else logging.INFO)
+    if args.trace:
+        start_tracing(args.trace)
+
+
+def setup_from_argv(argv):
+    """
+    Remove --trace FILE, --verbose/-v and --quiet/-q from an argument list and apply them.
+
+    Lets the positional-argument scripts accept the same options as pipeline.py.
+    """
+    options = argparse.Namespace(trace=None, verbose=False, quiet=False)
+    for i in range(len(argv) - 1, 0, -1):
+        if argv[i] in ('--verbose', '-v'):
+            options.verbose = True
+            del argv[i]
+        elif argv[i] in ('--quiet', '-q'):
+            options.quiet = True
+            del argv[i]
+        elif argv[i] == '--trace' and i + 1 < len(argv):
+            options.trace = argv[i + 1]
+            del argv[i:i + 2]
+    setup(options)
+
+
+# A spawned worker configures logging the way its parent did
+if os.environ.get(LOG_LEVEL_ENV) and not logging.getLogger().handlers:
+    setup_logging(logging.getLevelName(os.environ[LOG_LEVEL_ENV]))
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Find the published (#wiki-tagged) notes of the vault and copy them to the source directory.
+
+This is the collection step shared by run_local.sh, the deploy workflow and
+watch.py:
+1. Excluded folders (Journal, Private, .git, site, ...) are pruned during
+   the walk, so they are never listed, let alone read
+2. Each candidate note is read only until the first #wiki, on a thread pool
+3. Verdicts are cached by (size, mtime) in .site_scan_cache.json, so an
+   unchanged note is not opened at all on the next run
+
+Usage: vault_scanner.py <vault_dir> <dest_dir> [--cache FILE] [--threads N] [--trace FILE] [-v|-q]
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import tracing
+from tracing import span
+
+log = logging.getLogger(__name__)
+
+# Folders that are never published
+EXCLUDED_FOLDERS = {"Journal", "TODO", "Feelings", "Private", "Templates", ".git", ".github", ".scripts",
+                    "site", ".site_content"}
+
+WIKI_TAG = b'#wiki'
+
+READ_SIZE = 64 * 1024
+
+
+def is_watched_dir(relative_dir):
+    """Check if a directory (relative to the vault) can hold published notes or assets."""
+    name = os.path.basename(relative_dir)
+    return not (name.startswith('.') or name in EXCLUDED_FOLDERS or name == '__pycache__')
+
+
+def is_note_path(relative_path):
+    """Check if a file (relative to the vault) would be published if it had a #wiki tag."""
+    parts = relative_path.split('/')
+    if not relative_path.endswith('.md') or any(part in EXCLUDED_FOLDERS for part in parts):
+        return False
+    return not (relative_path.startswith(('.site_content', 'site/')) or relative_path == 'README.md')
+
+
+def walk_vault(vault_dir):
+    """Yield the path (relative to the vault) of every file in a watched directory."""
+    for root, dirs, files in os.walk(vault_dir):
+        relative_root = os.path.relpath(root, vault_dir).replace(os.sep, '/')
+        relative_root = '' if relative_root == '.' else relative_root + '/'
+        dirs[:] = sorted(d for d in dirs if is_watched_dir(relative_root + d))
+        for filename in sorted(files):
+            yield relative_root + filename
+
+
+def has_wiki_tag(path):
+    """Check if a file contains #wiki, reading it only up to the first occurrence."""
+    tail = b''
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(READ_SIZE), b''):
+            if WIKI_TAG in tail + chunk:
+                return True
+            # Keep enough of the end to catch a tag split across two reads
+            tail = chunk[-(len(WIKI_TAG) - 1):]
+    return False
+
+
+class VerdictCache:
+    """Remembers whether each note has a #wiki tag by (size, mtime), so unchanged notes are never re-read."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def get(self, relative_path, st):
+        """Return the cached verdict for a note with stat result st, or None if it may have changed."""
+        entry = self.entries.get(relative_path)
+        if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            return entry[2]
+        return None
+
+    def set(self, relative_path, st, verdict):
+        self.entries[relative_path] = [st.st_size, st.st_mtime_ns, verdict]
+
+    def save(self, seen):
+        """Write the cache to disk, dropping notes that no longer exist."""
+        if not self.path:
+            return
+        self.entries = {path: entry for path, entry in self.entries.items() if path in seen}
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def scan_vault(vault_dir='.', cache_file=None, threads=None):
+    """
+    Return the paths (relative to the vault, sorted) of every note with a #wiki tag.
+
+    Args:
+        vault_dir: The Obsidian vault
+        cache_file: Optional verdict cache to read and update
+        threads: Number of reader threads (None for the ThreadPoolExecutor default)
+    """
+    cache = VerdictCache(cache_file)
+    published = []
+    unknown = []
+    seen = set()
+    for relative_path in walk_vault(vault_dir):
+        if not is_note_path(relative_path):
+            continue
+        try:
+            st = os.stat(os.path.join(vault_dir, relative_path))
+        except FileNotFoundError:
+            continue
+        seen.add(relative_path)
+        verdict = cache.get(relative_path, st)
+        if verdict is None:
+            unknown.append((relative_path, st))
+        elif verdict:
+            published.append(relative_path)
+
+    # Reading is I/O bound, so threads overlap the opens and reads
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        verdicts = executor.map(lambda item: has_wiki_tag(os.path.join(vault_dir, item[0])), unknown)
+        for (relative_path, st), verdict in zip(unknown, verdicts):
+            cache.set(relative_path, st, verdict)
+            if verdict:
+                published.append(relative_path)
+
+    cache.save(seen)
+    return sorted(published)
+
+
+def copy_notes(vault_dir, dest_dir, relative_paths):
+    """Copy notes (paths relative to the vault) into dest_dir, keeping their folders."""
+    for relative_path in relative_paths:
+        dest_file = os.path.join(dest_dir, relative_path)
+        os.makedirs(os.path.dirname(dest_file), exist_ok=True)
+        shutil.copy2(os.path.join(vault_dir, relative_path), dest_file)
+        log.debug(f"Copied {relative_path}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Copy the #wiki-tagged notes of the vault to a directory.')
+    parser.add_argument('vault_dir', help='The Obsidian vault')
+    parser.add_argument('dest_dir', help='Where to copy the published notes (e.g. .site_content_temp)')
+    parser.add_argument('--cache', help='Verdict cache for unchanged notes (e.g. .site_scan_cache.json)')
+    parser.add_argument('--threads', type=int, help='Number of reader threads')
+    tracing.add_arguments(parser)
+    args = parser.parse_args()
+    tracing.setup(args)
+
+    with span('scan vault'):
+        notes = scan_vault(args.vault_dir, args.cache, args.threads)
+    with span('copy notes'):
+        copy_notes(args.vault_dir, args.dest_dir, notes)
+    log.info(f"Published notes: {len(notes)}")
@@ -0,0 +1,495 @@
+#!/usr/bin/env python3
+"""
+Watch the vault and keep the site content up to date while `mkdocs serve` runs.
+
+compendium.py serve (and so run_local.sh serve) runs this on a thread next
+to mkdocs serve. The plan, mapping, link resolver and build manifest stay in
+memory between changes, and on every change to a note (or asset) in the vault:
+1. The note is mirrored into the source directory (.site_content_temp), or
+   removed from it when it was deleted or lost its #wiki tag
+2. The plan is recomputed from file names only
+3. Only the changed notes and the notes whose links now resolve differently
+   (links to a renamed, created or deleted page) go through the pipeline again
+4. Only their outputs are rewritten, so mkdocs serve reloads just those pages
+
+Changes are picked up with inotify (Linux, through ctypes) or, where that is
+not available, by polling modification times.
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import json
+import logging
+import os
+import select
+import shutil
+import struct
+import sys
+import time
+
+from reorganize_files import build_mapping, copy_assets, plan_reorganization, section_titles, slugify, write_nav
+from convert_wikilinks import LinkResolver, warn_ambiguous_names
+from build_manifest import BuildManifest, remove_empty_dirs
+from image_derivatives import build_image_derivatives
+from link_graph import LinkGraph
+from output_files import write_if_changed
+from pipeline import (
+    BuildContext,
+    _init_worker,
+    add_build_arguments,
+    build_autolinker,
+    build_dataview_index,
+    build_document,
+    plan_documents,
+    scan_document,
+    update_link_graph,
+)
+from search_index import read_record, write_search_index
+from vault_scanner import is_note_path, is_watched_dir, walk_vault
+import tracing
+from tracing import span
+
+log = logging.getLogger(__name__)
+
+ASSETS_DIR = 'Assets'
+
+# Wait this long after a change for the rest of an editor's writes before rebuilding
+DEBOUNCE_SECONDS = 0.05
+
+# inotify(7) event masks
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+
+
+def link_key(target):
+    """Return the key under which a link target is indexed (covers exact, case-folded and slug lookups)."""
+    return slugify(target.split('/')[-1]).casefold()
+
+
+class PollingWatcher:
+    """Finds changed files by comparing (mtime, size) snapshots of the vault."""
+
+    def __init__(self, vault_dir, interval=0.5):
+        self.vault_dir = vault_dir
+        self.interval = interval
+        self.snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        for relative_path in walk_vault(self.vault_dir):
+            try:
+                st = os.stat(os.path.join(self.vault_dir, relative_path))
+            except FileNotFoundError:
+                continue
+            snapshot[relative_path] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def wait(self, timeout=None):
+        """Block until something changed; return the changed paths (relative to the vault)."""
+        while True:
+            time.sleep(self.interval if timeout is None else min(self.interval, timeout))
+            snapshot = self._scan()
+            changed = {path for path in snapshot.keys() | self.snapshot.keys()
+                       if snapshot.get(path) != self.snapshot.get(path)}
+            self.snapshot = snapshot
+            if changed or timeout is not None:
+                return changed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Finds changed files with Linux inotify, called through ctypes (no extra dependency)."""
+
+    def __init__(self, vault_dir):
+        self.vault_dir = vault_dir
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.watches = {}  # Watch descriptor -> directory relative to the vault ('' for the root)
+        self._add_tree('')
+
+    def _add_watch(self, relative_dir):
+        path = os.path.join(self.vault_dir, relative_dir) if relative_dir else self.vault_dir
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error == 28:  # ENOSPC: out of watches (fs.inotify.max_user_watches)
+                raise OSError(error, 'inotify watch limit reached')
+            return
+        self.watches[wd] = relative_dir
+
+    def _add_tree(self, relative_dir):
+        """Watch a directory and every watched directory below it; return the files found in it."""
+        self._add_watch(relative_dir)
+        found = set()
+        top = os.path.join(self.vault_dir, relative_dir) if relative_dir else self.vault_dir
+        for root, dirs, files in os.walk(top):
+            relative_root = os.path.relpath(root, self.vault_dir).replace(os.sep, '/')
+            relative_root = '' if relative_root == '.' else relative_root + '/'
+            dirs[:] = [d for d in dirs if is_watched_dir(relative_root + d)]
+            for d in dirs:
+                self._add_watch(relative_root + d)
+            found.update(relative_root + filename for filename in files)
+        return found
+
+    def wait(self, timeout=None):
+        """
+        Block until something changed; return the changed paths (relative to the vault).
+
+        A directory that was moved or deleted is reported by its own path (the
+        caller knows which notes were in it). None means events were lost and
+        everything must be rescanned.
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        data = os.read(self.fd, 64 * 1024)
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = struct.unpack_from('iIII', data, offset)
+            name = os.fsdecode(data[offset + 16:offset + 16 + length].rstrip(b'\0'))
+            offset += 16 + length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            directory = self.watches.get(wd)
+            if directory is None or not name:
+                continue
+            relative_path = f'{directory}/{name}' if directory else name
+            if mask & IN_ISDIR:
+                if not is_watched_dir(relative_path):
+                    continue
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # Files may land in a new directory before its watch exists
+                    changed |= self._add_tree(relative_path)
+            changed.add(relative_path)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+def create_watcher(vault_dir, polling=False, interval=0.5):
+    """Return an InotifyWatcher, or a PollingWatcher if polling is requested or inotify is unavailable."""
+    if not polling and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(vault_dir)
+        except (OSError, AttributeError) as e:
+            log.warning(f"inotify unavailable ({e}), polling for changes instead")
+    return PollingWatcher(vault_dir, interval)
+
+
+class WatchedSite:
+    """
+    In-memory build state for one docs directory, updated change by change.
+
+    Holds the published notes of the vault, the current plan and link
+    resolver, the build manifest and, for every link target, the notes that
+    link to it, so a change only costs a plan (file names) plus the notes it
+    actually affects.
+    """
+
+    def __init__(self, vault_dir, source_dir, dest_dir, mapping_file, manifest, extra_pages=(),
+                 asset_mode='link', responsive_images=False, image_cache='.image_cache', jobs=1,
+                 graph=None, backlinks=False, search_index=False, autolink=False):
+        self.vault_dir = vault_dir
+        self.source_dir = source_dir
+        self.dest_dir = dest_dir
+        self.mapping_file = mapping_file
+        self.manifest = manifest
+        self.extra_pages = list(extra_pages)
+        self.asset_mode = asset_mode
+        self.responsive_images = responsive_images
+        self.image_cache = image_cache
+        self.jobs = jobs
+        self.graph = graph
+        self.backlinks = backlinks
+        self.search_index = search_index
+        self.autolink = autolink
+
+        self.published = {}  # Vault path of every published note -> its content
+        self.mapping = {}
+        self.resolver = LinkResolver({})
+        self.assets = {}     # Asset manifest from copy_assets
+        self.images = {}
+        self.autolink_names = {}  # Names and aliases of the last Autolinker (see autolink.collect_names)
+        self.linkers = {}    # link_key(target) -> manifest keys of the notes linking to it
+        self.search_records = {}  # Output path -> search record, once the search index was written
+        for key, entry in self.manifest.notes.items():
+            self._index_links(key, entry)
+
+    def _index_links(self, key, entry):
+        for target in entry.get('link_targets', []):
+            self.linkers.setdefault(link_key(target), set()).add(key)
+
+    def _unindex_links(self, key):
+        entry = self.manifest.notes.get(key)
+        for target in (entry or {}).get('link_targets', []):
+            keys = self.linkers.get(link_key(target))
+            if keys:
+                keys.discard(key)
+
+    def sync_note(self, relative_path):
+        """
+        Mirror one vault note into the source directory.
+
+        Returns True if the published content changed (created, edited,
+        deleted or (un)tagged with #wiki).
+        """
+        vault_file = os.path.join(self.vault_dir, relative_path)
+        source_file = os.path.join(self.source_dir, relative_path)
+        try:
+            with open(vault_file, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except (FileNotFoundError, IsADirectoryError, UnicodeDecodeError):
+            content = None
+
+        if content is not None and '#wiki' in content:
+            if relative_path not in self.published and os.path.exists(source_file):
+                # First look at this note (on startup): keep an identical mirror
+                with open(source_file, 'r', encoding='utf-8') as f:
+                    self.published[relative_path] = f.read()
+            if self.published.get(relative_path) == content and os.path.exists(source_file):
+                return False
+            self.published[relative_path] = content
+            os.makedirs(os.path.dirname(source_file), exist_ok=True)
+            shutil.copy2(vault_file, source_file)
+            return True
+
+        if relative_path not in self.published and not os.path.exists(source_file):
+            return False
+        self.published.pop(relative_path, None)
+        if os.path.exists(source_file):
+            os.remove(source_file)
+            remove_empty_dirs(os.path.dirname(source_file), self.source_dir)
+        return True
+
+    def sync_all(self):
+        """Mirror every note of the vault (and drop mirrored notes that are gone); return the changed paths."""
+        changed = set()
+        seen = set()
+        for relative_path in walk_vault(self.vault_dir):
+            if is_note_path(relative_path):
+                seen.add(relative_path)
+                if self.sync_note(relative_path):
+                    changed.add(relative_path)
+        for root, dirs, files in os.walk(self.source_dir):
+            for filename in files:
+                relative_path = os.path.relpath(os.path.join(root, filename), self.source_dir).replace(os.sep, '/')
+                if relative_path not in seen and self.sync_note(relative_path):
+                    changed.add(relative_path)
+        return changed
+
+    def rebuild(self, changed_notes=(), assets_changed=False, changed_pages=(), everything=False):
+        """
+        Re-plan and rebuild what a set of changes affects.
+
+        Args:
+            changed_notes: Vault paths of notes whose published content changed
+            assets_changed: Whether anything in the Assets directory changed
+            changed_pages: Extra pages (e.g. index.md) that changed
+            everything: Check every note against the manifest (on startup)
+
+        Returns the number of documents written.
+        """
+        old_mapping = self.mapping
+        old_ambiguous = self.resolver.ambiguous_names()
+
+        notes, pages_files = plan_reorganization(self.source_dir, self.dest_dir)
+        tasks = plan_documents(notes, self.extra_pages)
+        self.mapping = build_mapping(notes)
+        self.resolver = LinkResolver(self.mapping, notes)
+        self.resolver.assets = self.assets
+        if everything or self.resolver.ambiguous_names() != old_ambiguous:
+            warn_ambiguous_names(self.resolver)
+
+        planned = {task[0]: task[2] for task in tasks}
+        removed = set(self.manifest.notes) - set(planned)
+        for key in removed:
+            self._unindex_links(key)
+        for removed in self.manifest.prune(planned, self.dest_dir):
+            log.info(f"Removed stale output: {removed}")
+        # A note was added, moved or removed, or a .pages title changed
+        if write_nav(self.dest_dir, list(planned.values()), section_titles(pages_files, self.dest_dir)):
+            log.info("Navigation updated")
+
+        if assets_changed:
+            self.assets = self.resolver.assets = copy_assets(self.source_dir, self.dest_dir, mode=self.asset_mode)
+            if self.responsive_images:
+                self.images = build_image_derivatives(self.dest_dir, self.image_cache, jobs=self.jobs)
+
+        # Notes to check against the manifest (which has the final say)
+        keys = set(changed_notes) | {'page:' + os.path.basename(page) for page in changed_pages}
+        renamed = {name for name in old_mapping.keys() | self.mapping.keys()
+                   if old_mapping.get(name) != self.mapping.get(name)}
+        ambiguous = self.resolver.ambiguous_names()
+        renamed |= {name for name in old_ambiguous.keys() | ambiguous.keys()
+                    if old_ambiguous.get(name) != ambiguous.get(name)}
+        for name in renamed:
+            keys |= self.linkers.get(link_key(name), set())
+        for key, output in planned.items():
+            entry = self.manifest.notes.get(key)
+            if entry is None or entry['output'] != output:
+                keys.add(key)
+            elif assets_changed and entry.get('image_targets'):
+                keys.add(key)
+        keys = set(planned) if everything else keys & set(planned)
+
+        context = BuildContext(self.mapping, self.dest_dir, self.manifest, self.images, self.resolver)
+        _init_worker(context)
+        changed_tasks = [task for task in tasks if task[0] in keys]
+        scans = [scan_document(task) for task in changed_tasks]
+        # Any change to tags or fields can change query results; the manifest checks each page with queries
+        scanned = dict(zip((task[0] for task in changed_tasks), scans))
+        context.dataview = build_dataview_index(tasks, [scanned.get(task[0]) for task in tasks], self.manifest)
+        keys |= {key for key in planned if (self.manifest.notes.get(key) or {}).get('dataview')}
+        if self.autolink:
+            context.autolinker = build_autolinker(self.resolver, tasks, [scanned.get(task[0]) for task in tasks],
+                                                  self.manifest)
+            # A name was added, removed or moved: any page may mention it (the manifest checks each one)
+            if context.autolinker.names != self.autolink_names:
+                keys |= set(planned)
+            self.autolink_names = context.autolinker.names
+        if self.graph is not None:
+            # Record the new links first; pages whose backlinks changed are rebuilt too
+            affected = update_link_graph(self.graph, changed_tasks, scans, context,
+                                         None if everything else removed)
+            keys |= {key for key, output in planned.items() if output in affected}
+            if self.backlinks:
+                context.backlinks = {planned[key]: self.graph.backlinks(planned[key]) for key in keys}
+        written = []
+        for task in tasks:
+            if task[0] not in keys:
+                continue
+            entry = build_document(task)
+            if entry is None:
+                continue
+            self._unindex_links(task[0])
+            self.manifest.set_entry(task[0], entry)
+            self._index_links(task[0], entry)
+            written.append(task[2])
+
+        if self.search_index:
+            self.update_search_index(tasks, written)
+
+        if renamed or everything:
+            write_if_changed(self.mapping_file, json.dumps(self.mapping, indent=2))
+        self.manifest.finalize(self.dest_dir)
+        self.manifest.save()
+        return written
+
+    def update_search_index(self, tasks, written):
+        """Re-index the written pages (every page the first time) and rewrite the search index if anything changed."""
+        outputs = {task[2]: task[0] for task in tasks}
+        changed = set(written) | (outputs.keys() - self.search_records.keys())
+        removed = self.search_records.keys() - outputs.keys()
+        if not (changed or removed):
+            return
+        for output in removed:
+            del self.search_records[output]
+        for output in sorted(changed):
+            entry = self.manifest.notes.get(outputs[output]) or {}
+            self.search_records[output] = read_record(
+                (os.path.join(self.dest_dir, output), output, entry.get('metadata')))
+        write_search_index(self.dest_dir, list(self.search_records.values()))
+
+    def handle(self, changed_paths):
+        """Apply a batch of changed vault paths (None means rescan everything); return the written outputs."""
+        if changed_paths is None:
+            return self.rebuild(self.sync_all(), assets_changed=True, changed_pages=self.extra_pages)
+
+        changed_notes = set()
+        for relative_path in sorted(changed_paths):
+            if is_note_path(relative_path) and self.sync_note(relative_path):
+                changed_notes.add(relative_path)
+            elif not os.path.isfile(os.path.join(self.vault_dir, relative_path)):
+                # A moved or deleted directory: re-check every note that was in it
+                prefix = relative_path + '/'
+                for note in [note for note in self.published if note.startswith(prefix)]:
+                    if self.sync_note(note):
+                        changed_notes.add(note)
+        assets_changed = any(path == ASSETS_DIR or path.startswith(ASSETS_DIR + '/') for path in changed_paths)
+        changed_pages = [page for page in self.extra_pages
+                         if os.path.relpath(page, self.vault_dir).replace(os.sep, '/') in changed_paths]
+
+        if not (changed_notes or assets_changed or changed_pages):
+            return []
+        return self.rebuild(changed_notes, assets_changed, changed_pages)
+
+
+def start(site, polling=False, interval=0.5):
+    """Start watching the vault of site, bring site up to date and return the watcher."""
+    # Start the watcher first so nothing that changes during the initial sync is missed
+    watcher = create_watcher(site.vault_dir, polling, interval)
+    site.sync_all()
+    start_time = time.perf_counter()
+    with span('rebuild'):
+        written = site.rebuild(assets_changed=True, everything=True)
+    log.info(f"Up to date ({len(written)} page(s) rebuilt in {(time.perf_counter() - start_time) * 1000:.0f} ms)")
+    return watcher
+
+
+def watch(site, watcher):
+    """Rebuild site on every change reported by watcher until interrupted."""
+    log.info("Watching for changes (Ctrl+C to stop)")
+    try:
+        while True:
+            changed = watcher.wait()
+            # Editors often write a file in several steps; collect them into one rebuild
+            while changed is not None:
+                more = watcher.wait(DEBOUNCE_SECONDS)
+                if not more:
+                    break
+                changed = None if more is None else changed | more
+            start = time.perf_counter()
+            with span('rebuild'):
+                written = site.handle(changed)
+            if written:
+                elapsed = (time.perf_counter() - start) * 1000
+                log.info(f"Rebuilt {len(written)} page(s) in {elapsed:.0f} ms: {', '.join(written)}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+        if site.graph is not None:
+            site.graph.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rebuild the site content whenever the vault changes.')
+    add_build_arguments(parser)
+    parser.add_argument('--vault', default='.', help='The Obsidian vault to watch (default: .)')
+    parser.add_argument('--poll', action='store_true', help='Poll for changes instead of using inotify')
+    parser.add_argument('--poll-interval', type=float, default=0.5,
+                        help='Seconds between polls (default: 0.5)')
+    args = parser.parse_args()
+
+    if not args.manifest:
+        parser.error('watch mode needs --manifest')
+    if args.backlinks and not args.link_graph:
+        parser.error('--backlinks needs --link-graph')
+    tracing.setup(args)
+
+    graph = LinkGraph(args.link_graph) if args.link_graph else None
+    site = WatchedSite(args.vault, args.source_dir, args.dest_dir, args.mapping_file,
+                       BuildManifest(args.manifest), args.pages, args.asset_mode,
+                       args.responsive_images, args.image_cache, args.jobs, graph, args.backlinks,
+                       args.search_index, args.autolink)
+    watch(site, start(site, args.poll, args.poll_interval))
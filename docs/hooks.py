@@ -0,0 +1,260 @@
+"""
+MkDocs hooks, run through mkdocs-simple-hooks (see plugins in mkdocs.yml).
+"""
+
+import functools
+import hashlib
+import json
+import logging
+import os
+import posixpath
+import re
+import urllib.parse
+
+log = logging.getLogger('mkdocs.hooks')
+
+# On-disk cache of rendered pages, next to mkdocs.yml
+RENDER_CACHE_DIR = '.site_render_cache'
+RENDER_CACHE_MAX_BYTES = 128 * 1024 * 1024
+# Bump when the cached fields or their format change
+RENDER_CACHE_VERSION = 1
+
+# Nav written into the docs directory by the reorganize stage (.scripts/reorganize_files.py)
+NAV_FILE = '.nav.json'
+
+# Link targets of a page's markdown: [text](target), [ref]: target, href="target" and src="target"
+LINK_TARGETS = re.compile(r'\]\(\s*<?([^)\s>]+)|^\s*\[[^\]]+\]:\s*<?(\S+?)>?\s*$|(?:href|src)=["\']([^"\']+)["\']',
+                          re.MULTILINE)
+
+render_stats = {'hits': 0, 'misses': 0}
+
+
+def load_nav(config, **kwargs):
+    """
+    on_config hook: use the nav the build precomputed.
+
+    The reorganize stage already walks every note and reads every .pages
+    file, so it writes the finished navigation (section titles, order,
+    collapsed single-page sections) to .nav.json in the docs directory and
+    MkDocs doesn't rescan the tree for it on every build or serve reload.
+    A nav set in mkdocs.yml wins; without .nav.json MkDocs builds its own.
+    """
+    path = os.path.join(config['docs_dir'], NAV_FILE)
+    if config['nav'] is None and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            config['nav'] = json.load(f)
+    return config
+
+
+def slim_search_index(config, **kwargs):
+    """
+    Empty Material's search_index.json when the site has a prebuilt search index.
+
+    javascripts/search.js answers searches from search/index.json (written by
+    .scripts/search_index.py), so the full text Material's search would
+    download on every page load is never used. Its config is kept so the
+    search box still starts up.
+    """
+    if not os.path.exists(os.path.join(config['docs_dir'], 'search', 'index.json')):
+        return
+    path = os.path.join(config['site_dir'], 'search', 'search_index.json')
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    data['docs'] = []
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+
+def render_cache_dir(config):
+    return os.path.join(os.path.dirname(os.path.abspath(config['config_file_path'])), RENDER_CACHE_DIR)
+
+
+def describe(value):
+    """Name a value JSON can't encode (extension objects, emoji index functions) the same way every build."""
+    if hasattr(value, '__qualname__'):
+        return f"{getattr(value, '__module__', '')}.{value.__qualname__}"
+    return f"{type(value).__module__}.{type(value).__qualname__}"
+
+
+@functools.lru_cache(maxsize=None)
+def extensions_hash(extensions, configs):
+    """Hash the Markdown extensions, their config and the renderer versions (args are JSON text)."""
+    import markdown
+    import mkdocs
+
+    text = json.dumps([RENDER_CACHE_VERSION, mkdocs.__version__, markdown.__version__, extensions, configs])
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def link_targets(markdown, page, files):
+    """
+    Return {target: URL of the page it resolves to, or None} of every relative link in a page.
+
+    Links are rewritten to the URL of the file they point to, so a page
+    renders differently when one of its targets is added, removed or moved.
+    """
+    targets = {}
+    base = posixpath.dirname(page.file.src_uri)
+    for match in LINK_TARGETS.finditer(markdown):
+        target = next(group for group in match.groups() if group)
+        path = urllib.parse.unquote(target.split('#', 1)[0].split('?', 1)[0])
+        if not path or path.startswith('/') or re.match(r'[a-zA-Z][a-zA-Z0-9+.-]*:', path):
+            continue
+        resolved = posixpath.normpath(posixpath.join(base, path))
+        linked = files.get_file_from_path(resolved)
+        targets[path] = linked.url if linked is not None else None
+    return dict(sorted(targets.items()))
+
+
+def render_key(page, config, files):
+    """Hash everything a page's rendered HTML depends on: its final markdown, location, links and extensions."""
+    extensions = json.dumps([describe(extension) if not isinstance(extension, str) else extension
+                             for extension in config['markdown_extensions']])
+    configs = json.dumps(config['mdx_configs'] or {}, sort_keys=True, default=describe)
+    text = json.dumps([
+        extensions_hash(extensions, configs),
+        page.file.src_uri,
+        page.url,
+        link_targets(page.markdown, page, files),
+        page.markdown,
+    ])
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def toc_tokens(items):
+    return [{'title': item.title, 'id': item.id, 'level': item.level, 'children': toc_tokens(item.children)}
+            for item in items]
+
+
+def toc_items(tokens):
+    from mkdocs.structure.toc import AnchorLink
+
+    items = []
+    for token in tokens:
+        item = AnchorLink(token['title'], token['id'], token['level'])
+        item.children = toc_items(token['children'])
+        items.append(item)
+    return items
+
+
+class WarningCounter(logging.Handler):
+    """Counts the warnings MkDocs logs while a page renders."""
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+
+def render_cached(page, config, files, render):
+    """
+    Render a page, or restore its HTML from the render cache.
+
+    Stands in for page.render(): on a hit, Markdown conversion is skipped
+    and the fields it sets are restored (content, table of contents, title
+    and the anchors used to validate links). Pages whose rendering logged a
+    warning (a broken link, say) are not cached, so the warning shows on
+    every build.
+    """
+    from mkdocs.structure.toc import TableOfContents
+
+    key = render_key(page, config, files)
+    path = os.path.join(render_cache_dir(config), key[:2], f'{key}.json')
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        entry = None
+
+    if entry is not None:
+        render_stats['hits'] += 1
+        # Mark the entry as recently used for eviction
+        os.utime(path)
+        page.content = entry['content']
+        page.toc = TableOfContents(toc_items(entry['toc']))
+        if 'title' in entry:
+            page._title_from_render = entry['title']
+        if 'anchors' in entry:
+            page.present_anchor_ids = set(entry['anchors'])
+        if 'links_to_anchors' in entry:
+            page.links_to_anchors = {files.get_file_from_path(src_uri): anchors
+                                     for src_uri, anchors in entry['links_to_anchors'].items()
+                                     if files.get_file_from_path(src_uri) is not None}
+        return
+
+    render_stats['misses'] += 1
+    warnings = WarningCounter()
+    logging.getLogger('mkdocs').addHandler(warnings)
+    try:
+        render(config, files)
+    finally:
+        logging.getLogger('mkdocs').removeHandler(warnings)
+    if warnings.count:
+        return
+
+    entry = {'content': page.content, 'toc': toc_tokens(page.toc)}
+    if hasattr(page, '_title_from_render'):
+        entry['title'] = page._title_from_render
+    if hasattr(page, 'present_anchor_ids'):
+        entry['anchors'] = sorted(page.present_anchor_ids)
+    if hasattr(page, 'links_to_anchors'):
+        entry['links_to_anchors'] = {linked.src_uri: anchors for linked, anchors in page.links_to_anchors.items()}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(entry, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+def cache_page_render(page, config, files, **kwargs):
+    """
+    on_pre_page hook: render the page through the render cache.
+
+    Rendered HTML is kept in .site_render_cache, keyed by the page's final
+    markdown, its location, where its links point and the Markdown
+    extensions and their config, so unchanged pages skip the Markdown
+    renderer on the next build.
+    """
+    # The class's render, so a page set up twice isn't wrapped twice
+    page.render = functools.partial(render_cached, page, render=functools.partial(type(page).render, page))
+    return page
+
+
+def prune_render_cache(config):
+    """
+    Evict the least recently used render cache entries above RENDER_CACHE_MAX_BYTES.
+
+    Returns the number of entries removed.
+    """
+    cache_dir = render_cache_dir(config)
+    if not os.path.isdir(cache_dir):
+        return 0
+    entries = []
+    for root, dirs, filenames in os.walk(cache_dir):
+        for filename in filenames:
+            path = os.path.join(root, filename)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= RENDER_CACHE_MAX_BYTES:
+            break
+        os.remove(path)
+        total -= size
+        removed += 1
+    return removed
+
+
+def post_build(config, **kwargs):
+    """on_post_build hook: slim the search index and prune the render cache."""
+    slim_search_index(config)
+    removed = prune_render_cache(config)
+    if render_stats['hits'] or render_stats['misses']:
+        log.info(f"Render cache: {render_stats['hits']} page(s) reused, {render_stats['misses']} rendered, "
+                 f"{removed} evicted")
+    render_stats.update(hits=0, misses=0)
@@ -62,6 +62,16 @@ document.addEventListener("DOMContentLoaded", () => {
   };
 
   button.addEventListener("click", async () => {
+    // The prebuilt search index (search.js) only needs one shard for this
+    try {
+      const page = await window.compendiumSearch?.randomPage();
+      if (page) {
+        window.location.href = page.toString();
+        return;
+      }
+    } catch (e) {
+      /* no prebuilt index; use Material's */
+    }
     const list = await getDocs();
     if (!list.length) return;
     const choice = list[Math.floor(Math.random() * list.length)];
@@ -24,7 +24,11 @@
     
     // Rate limiting (client-side basic check)
     rateLimitMinutes: 5,
-    rateLimitKey: 'edit_last_submit'
+    rateLimitKey: 'edit_last_submit',
+
+    // Polling for the pull request of a queued suggestion
+    statusPollSeconds: 15,
+    statusPollAttempts: 20
   };
 
   /**
@@ -262,6 +266,35 @@
     }, 100);
   }
 
+  /**
+   * Poll the status of a queued submission while its result is shown,
+   * linking the pull request once it has been opened
+   */
+  function pollSubmissionStatus(statusUrl, resultDiv) {
+    let attempts = 0;
+    const poll = async () => {
+      if (!resultDiv.isConnected || attempts++ >= CONFIG.statusPollAttempts) {
+        return;
+      }
+      try {
+        const response = await fetch(statusUrl);
+        const status = await response.json();
+        if (status.status === 'submitted') {
+          resultDiv.querySelector('p').innerHTML = `Your edit has been submitted as <a href="${status.pullRequestUrl}" target="_blank" rel="noopener noreferrer">pull request #${status.pullRequestNumber}</a>.`;
+          return;
+        }
+        if (status.status === 'failed') {
+          resultDiv.querySelector('p').textContent = 'Your edit could not be opened as a pull request. Please use the "Edit on GitHub" button instead.';
+          return;
+        }
+      } catch (e) {
+        // Status unavailable, keep the acknowledgement
+      }
+      setTimeout(poll, CONFIG.statusPollSeconds * 1000);
+    };
+    setTimeout(poll, CONFIG.statusPollSeconds * 1000);
+  }
+
   /**
    * Handle edit form submission
    */
@@ -302,7 +335,23 @@
 
       const result = await response.json();
 
-      if (response.ok && result.success) {
+      if (response.ok && result.success && result.queued) {
+        // Queued: the worker opens a pull request for a batch of suggestions
+        resultDiv.className = 'edit-result edit-result-success';
+        resultDiv.innerHTML = `
+          <h3>✓ Suggestion received!</h3>
+          <p>Your edit is queued and will be opened as a pull request within a few minutes.</p>
+          <p>The maintainers will review your suggestion and merge it if appropriate.</p>
+        `;
+        resultDiv.style.display = 'block';
+        form.style.display = 'none';
+
+        // Set rate limit
+        setRateLimit();
+
+        // Show the pull request once it has been opened
+        pollSubmissionStatus(result.statusUrl, resultDiv);
+      } else if (response.ok && result.success) {
         // Success
         resultDiv.className = 'edit-result edit-result-success';
         resultDiv.innerHTML = `
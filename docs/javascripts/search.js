@@ -0,0 +1,241 @@
+/**
+ * Prebuilt search index loader
+ *
+ * .scripts/search_index.py indexes every page at build time into
+ * search/index.json plus one shard per section (NPCs, Locations, ...), with
+ * BM25 weights already computed. This script answers the Material search box
+ * from those files: index.json is fetched the first time the search box is
+ * focused, then only the shards holding terms that start like the query's.
+ * Nothing is indexed in the browser, so the first search doesn't slow down as
+ * the vault grows.
+ *
+ * If search/index.json can't be loaded, Material's own search takes over.
+ */
+
+(() => {
+  const scriptUrl = document.currentScript?.src || window.location.href;
+  const siteRoot = new URL("../", scriptUrl);
+  const searchRoot = new URL("search/", siteRoot);
+
+  const MAX_RESULTS = 20;
+  // A term that only starts with a query term (as you type) counts for less
+  const PREFIX_MATCH = 0.5;
+
+  let indexPromise = null;
+  const shards = new Map();
+
+  const fetchJson = async (url) => {
+    const resp = await fetch(url);
+    if (!resp.ok) throw new Error(`${url}: HTTP ${resp.status}`);
+    return resp.json();
+  };
+
+  const loadIndex = () => {
+    if (!indexPromise) {
+      indexPromise = fetchJson(new URL("index.json", searchRoot)).then((index) => {
+        index.prefixKeys = Object.keys(index.prefixes).sort();
+        return index;
+      });
+    }
+    return indexPromise;
+  };
+
+  const loadShard = (shard) => {
+    if (!shards.has(shard.file)) {
+      const promise = fetchJson(new URL(shard.file, searchRoot)).then((data) => {
+        data.termKeys = Object.keys(data.terms).sort();
+        return data;
+      });
+      // Let a failed shard be fetched again by the next query
+      promise.catch(() => shards.delete(shard.file));
+      shards.set(shard.file, promise);
+    }
+    return shards.get(shard.file);
+  };
+
+  // Must match tokenize() in .scripts/search_index.py
+  const tokenize = (text) =>
+    text
+      .normalize("NFKD")
+      .replace(/\p{Mn}/gu, "")
+      .toLowerCase()
+      .split(/[^\p{L}\p{N}]+/u)
+      .filter((term) => term);
+
+  // Keys of a sorted array starting with prefix
+  const startingWith = (keys, prefix) => {
+    let low = 0;
+    let high = keys.length;
+    while (low < high) {
+      const mid = (low + high) >> 1;
+      if (keys[mid] < prefix) low = mid + 1;
+      else high = mid;
+    }
+    const found = [];
+    for (let i = low; i < keys.length && keys[i].startsWith(prefix); i++) found.push(keys[i]);
+    return found;
+  };
+
+  // Indexes of the shards holding a term starting with term
+  const shardsFor = (index, term) => {
+    const prefixes =
+      term.length >= index.prefix_length
+        ? [term.slice(0, index.prefix_length)]
+        : startingWith(index.prefixKeys, term);
+    return new Set(prefixes.flatMap((prefix) => index.prefixes[prefix] || []));
+  };
+
+  // Score every page of a shard matching all terms: the best weight of each term, summed
+  const scoreShard = (shard, terms) => {
+    let scores = null;
+    for (const term of terms) {
+      const best = new Map();
+      for (const key of startingWith(shard.termKeys, term)) {
+        const factor = key === term ? 1 : PREFIX_MATCH;
+        const postings = shard.terms[key];
+        for (let i = 0; i < postings.length; i += 2) {
+          const weight = postings[i + 1] * factor;
+          if (weight > (best.get(postings[i]) || 0)) best.set(postings[i], weight);
+        }
+      }
+      if (scores === null) {
+        scores = best;
+      } else {
+        for (const [doc, score] of scores) {
+          if (best.has(doc)) scores.set(doc, score + best.get(doc));
+          else scores.delete(doc);
+        }
+      }
+      if (!scores.size) break;
+    }
+    return [...(scores || [])].map(([doc, score]) => ({ ...shard.docs[doc], score }));
+  };
+
+  const search = async (query) => {
+    const terms = tokenize(query);
+    if (!terms.length) return [];
+    const index = await loadIndex();
+    let candidates = null;
+    for (const term of terms) {
+      const matching = shardsFor(index, term);
+      candidates = candidates ? new Set([...candidates].filter((shard) => matching.has(shard))) : matching;
+    }
+    const loaded = await Promise.all([...candidates].map((shard) => loadShard(index.shards[shard])));
+    return loaded
+      .flatMap((shard) => scoreShard(shard, terms))
+      .sort((a, b) => b.score - a.score)
+      .slice(0, MAX_RESULTS);
+  };
+
+  // A random page, fetching just the one shard it is in
+  const randomPage = async () => {
+    const index = await loadIndex();
+    const total = index.shards.reduce((sum, shard) => sum + shard.docs, 0);
+    for (let attempt = 0; attempt < 5; attempt++) {
+      let pick = Math.floor(Math.random() * total);
+      const shard = index.shards.find((candidate) => (pick -= candidate.docs) < 0);
+      const data = await loadShard(shard);
+      const doc = data.docs[pick + shard.docs];
+      // Skip the home page
+      if (doc.location) return new URL(doc.location, siteRoot);
+    }
+    return null;
+  };
+
+  window.compendiumSearch = { search, randomPage };
+
+  document.addEventListener("DOMContentLoaded", () => {
+    const input = document.querySelector("[data-md-component='search-query']");
+    const container = document.querySelector("[data-md-component='search-result']");
+    const meta = container?.querySelector(".md-search-result__meta");
+    const list = container?.querySelector(".md-search-result__list");
+    if (!input || !meta || !list) return;
+
+    let enabled = true;
+    let shown = null; // { query, summary, results } currently rendered
+    let latest = 0;
+
+    const resultItem = (result, query) => {
+      const item = document.createElement("li");
+      item.className = "md-search-result__item";
+      const link = document.createElement("a");
+      const url = new URL(result.location, siteRoot);
+      url.searchParams.set("h", query);
+      link.href = url.toString();
+      link.className = "md-search-result__link";
+      link.tabIndex = -1;
+      const article = document.createElement("article");
+      article.className = "md-search-result__article md-typeset";
+      article.dataset.mdScore = result.score.toFixed(2);
+      const icon = document.createElement("div");
+      icon.className = "md-search-result__icon md-icon";
+      const title = document.createElement("h1");
+      title.textContent = result.title;
+      article.append(icon, title);
+      if (result.section) {
+        const tags = document.createElement("nav");
+        tags.className = "md-tags";
+        const tag = document.createElement("span");
+        tag.className = "md-tag";
+        tag.textContent = result.section.replace(/-/g, " ");
+        tags.append(tag);
+        article.append(tags);
+      }
+      if (result.text) {
+        const text = document.createElement("p");
+        text.textContent = result.text;
+        article.append(text);
+      }
+      link.append(article);
+      item.append(link);
+      return item;
+    };
+
+    const render = () => {
+      meta.textContent = shown.summary;
+      list.replaceChildren(...shown.results.map((result) => resultItem(result, shown.query)));
+    };
+
+    const update = async () => {
+      const query = input.value;
+      const ticket = ++latest;
+      try {
+        const results = await search(query);
+        if (ticket !== latest) return;
+        const summary = !query.trim()
+          ? "Type to start searching"
+          : results.length === 0
+            ? "No matching documents"
+            : results.length === 1
+              ? "1 matching document"
+              : `${results.length} matching documents`;
+        shown = { query, summary, results };
+        render();
+      } catch (e) {
+        console.warn("Search: prebuilt index unavailable, falling back to Material search", e);
+        enabled = false;
+      }
+    };
+
+    // Keep the typed query away from Material's (emptied) search worker
+    ["keyup", "input"].forEach((type) => {
+      document.addEventListener(
+        type,
+        (event) => {
+          if (!enabled || event.target !== input) return;
+          event.stopPropagation();
+          update();
+        },
+        true
+      );
+    });
+
+    // Start loading the index as soon as search is opened
+    input.addEventListener("focus", () => loadIndex().catch(() => {}), { once: true });
+
+    // Material renders its own (empty) results when the search box is focused again
+    new MutationObserver(() => {
+      if (enabled && shown && shown.query === input.value && meta.textContent !== shown.summary) render();
+    }).observe(container, { childList: true, subtree: true, characterData: true });
+  });
+})();
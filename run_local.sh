@@ -1,94 +1,82 @@
 #!/usr/bin/env bash
 set -euo pipefail
 
-# Usage: ./run_local.sh [build|serve]
+# Usage: ./run_local.sh [build|serve|check]
 # Default action is "serve". The script rebuilds .site_content the same way the
 # GitHub Action does (copy #wiki notes, reorganize, preprocess), then runs the
-# chosen MkDocs command.
+# chosen MkDocs command. All of it runs in one process: this is a thin wrapper
+# around .scripts/compendium.py.
+#
+# Builds are incremental: .site_manifest.json records what every note was
+# built from, so only changed notes (and notes whose links moved) are
+# reprocessed. Set FULL_REBUILD=1 to start from scratch.
+#
+# "serve" also watches the vault: edited, created, renamed or deleted notes
+# (and the notes linking to them) are rebuilt as soon as they are saved, and
+# mkdocs serve reloads the page. Set WATCH=0 to turn this off.
+#
+# "check" builds every note in memory, writes nothing, and lists broken links,
+# ambiguous note names and unsupported queries (exit status 1 if there are any).
+#
+# "build" also minifies the site and writes .gz/.br siblings of its text files
+# (needs the brotli package for .br). Set COMPRESS=0 to skip this.
+#
+# Set AUTOLINK=1 to link the first unlinked mention of every note (or of an
+# alias listed in its info box) on each page.
+#
+# Set ONLY to a note or folder of the vault (several separated by ":") to
+# preview just that part of it with "build" or "serve": only those notes, the
+# pages they link to and the assets they embed are built, into .site_preview,
+# with the same URLs as on the full site. E.g. ONLY="NPCs:Groups/The Party.md".
+#
+# Set TRACE=trace.json to record a Chrome trace of the build (open it in
+# https://ui.perfetto.dev) and print the slowest files.
 
 ACTION="${1:-serve}"
 ROOT="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 cd "$ROOT"
 
-for cmd in python3 mkdocs; do
+DEPENDENCIES=(python3)
+case "$ACTION" in
+  build|serve) DEPENDENCIES+=(mkdocs) ;;
+  check) ;;
+  *)
+    echo "Unknown action: $ACTION" >&2
+    echo "Usage: $0 [build|serve|check]" >&2
+    exit 1
+    ;;
+esac
+for cmd in "${DEPENDENCIES[@]}"; do
   if ! command -v "$cmd" >/dev/null 2>&1; then
     echo "Missing dependency: $cmd" >&2
-    echo "Install with: pip install mkdocs mkdocs-material mkdocs-awesome-pages-plugin pymdown-extensions mkdocs-simple-hooks" >&2
+    echo "Install with: pip install mkdocs mkdocs-material pymdown-extensions mkdocs-simple-hooks pillow brotli" >&2
     exit 1
   fi
 done
 
-echo "==> Cleaning build artifacts"
-rm -rf .site_content .site_content_temp site .site_mapping.json
-mkdir -p .site_content_temp
-
-echo "==> Copying #wiki-tagged notes, .pages, and Assets to .site_content_temp"
-python3 - <<'PY'
-import shutil
-from pathlib import Path
-
-root = Path('.')
-exclusion = {"Journal", "TODO", "Feelings", "Private", "Templates", ".git", ".github", ".scripts", "site", ".site_content"}
-tmp = root / '.site_content_temp'
-tmp.mkdir(parents=True, exist_ok=True)
-
-def should_skip(rel_parts):
-    return any(seg in exclusion for seg in rel_parts)
-
-for path in root.rglob('*.md'):
-    rel = path.relative_to(root)
-    if should_skip(rel.parts):
-        continue
-    rel_str = rel.as_posix()
-    if rel_str.startswith(('.site_content', 'site/')) or rel_str == 'README.md':
-        continue
-    text = path.read_text(encoding='utf-8')
-    if '#wiki' not in text:
-        continue
-    dest = tmp / rel
-    dest.parent.mkdir(parents=True, exist_ok=True)
-    shutil.copy2(path, dest)
-    print(f"Copied {rel}")
-
-assets = root / 'Assets'
-if assets.exists():
-    shutil.copytree(assets, tmp / 'Assets')
-    print("Copied Assets")
-PY
-
-echo "==> Reorganizing content and assets"
-python3 .scripts/reorganize_files.py .site_content_temp .site_content .site_mapping.json
-
-echo "==> Copying index and overrides"
-if [ -f docs/index.md ]; then
-  cp docs/index.md .site_content/
-elif [ -f index.md ]; then
-  cp index.md .site_content/
+ARGS=()
+if [ "$ACTION" != "check" ]; then
+  ARGS+=(--jobs "${JOBS:-0}")
+  if [ "${FULL_REBUILD:-0}" = "1" ]; then
+    ARGS+=(--full)
+  fi
 fi
-if [ -d docs/.overrides ]; then
-  cp -R docs/.overrides .site_content/
-elif [ -d .overrides ]; then
-  cp -R .overrides .site_content/
+if [ "$ACTION" != "check" ] && [ "${AUTOLINK:-0}" = "1" ]; then
+  ARGS+=(--autolink)
 fi
-if [ -d docs/stylesheets ]; then
-  cp -R docs/stylesheets .site_content/
+if [ "$ACTION" != "check" ] && [ -n "${ONLY:-}" ]; then
+  IFS=':' read -r -a ONLY_PATHS <<< "$ONLY"
+  for path in "${ONLY_PATHS[@]}"; do
+    ARGS+=(--only "$path")
+  done
 fi
-if [ -d docs/javascripts ]; then
-  cp -R docs/javascripts .site_content/
+if [ "$ACTION" = "build" ] && [ "${COMPRESS:-1}" != "1" ]; then
+  ARGS+=(--no-compress)
 fi
-
-echo "==> Preprocessing and converting wikilinks"
-python3 .scripts/preprocess_dataviews.py
-python3 .scripts/convert_wikilinks.py .site_content .site_mapping.json
-
-if [ "$ACTION" = "build" ]; then
-  echo "==> Running mkdocs build --clean"
-  mkdocs build --clean
-elif [ "$ACTION" = "serve" ]; then
-  echo "==> Running mkdocs serve"
-  mkdocs serve
-else
-  echo "Unknown action: $ACTION" >&2
-  echo "Usage: $0 [build|serve]" >&2
-  exit 1
+if [ "$ACTION" = "serve" ] && [ "${WATCH:-1}" != "1" ]; then
+  ARGS+=(--no-watch)
+fi
+if [ -n "${TRACE:-}" ]; then
+  ARGS+=(--trace "$TRACE")
 fi
+exec python3 .scripts/compendium.py "$ACTION" ${ARGS[@]+"${ARGS[@]}"}
@@ -0,0 +1,90 @@
+"""
+Golden-output tests for the streaming preprocessor.
+
+preprocess_content() must give exactly what the whole-document regex
+functions give when run in the order the build used to run them.
+"""
+
+import glob
+import io
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, '.scripts'))
+
+from preprocess_dataviews import (  # noqa: E402
+    fix_list_spacing,
+    iter_file_lines,
+    preprocess_content,
+    preprocess_lines,
+    process_block_tags,
+    process_info_box,
+    remove_wiki_tags,
+    replace_dataview_queries,
+)
+
+
+def reference(content):
+    """The regex chain preprocess_content() replaces."""
+    content = process_block_tags(content)
+    content = process_info_box(content)
+    content = replace_dataview_queries(content)
+    content = remove_wiki_tags(content)
+    return fix_list_spacing(content)
+
+
+def vault_notes():
+    """Every note of the vault (hidden directories, docs and tests skipped)."""
+    notes = []
+    for path in sorted(glob.glob(os.path.join(REPO_DIR, '**', '*.md'), recursive=True)):
+        relative = os.path.relpath(path, REPO_DIR)
+        parts = relative.split(os.sep)
+        if len(parts) > 1 and (parts[0].startswith('.') or parts[0] in ('docs', 'tests')):
+            continue
+        notes.append(relative)
+    return notes
+
+
+EDGE_CASES = {
+    'unclosed block': '# Note\n<block>\nType: NPC\nRace: Elf\n\nSome text\n',
+    'unclosed block at end of file': 'Text\n<block>\n![[portrait.png]]',
+    'block mid-line': 'Before <block>Type: NPC\nAge: 30</block> after\nmore\n',
+    'two blocks on one line': '<block>A: 1</block><block>B: 2</block>\n',
+    'unclosed dataview fence': '# Note\n```dataview\nLIST FROM "NPCs"\n\n- item\n',
+    'dataview fence mid-line': 'See ```dataview\nTABLE Race\n``` here\n',
+    'info box at start': '```\n![[map.png]]\nRegion: North\n```\n# Title\n',
+    'code block not at start': '# Title\n\n```\nRegion: North\n```\n',
+    'wiki on its own line': '# Note\n#wiki\nText\n',
+    'wiki mid-line': 'Some #wiki text\nTags: #wiki #npc\n',
+    'wiki at end of line': 'Text #wiki\nMore text\n',
+    'wiki swallows blank lines': 'Text\n\n\n   \n#wiki\n\n\nAfter\n',
+    'wiki at end of file': 'Text\n\n#wiki',
+    'wiki only': '#wiki',
+    'no trailing newline': '# Note\n- one\n- two\nText',
+    'list spacing': 'Intro\n- one\n- two\nText\n1. first\n2) second\n\n* star\n',
+    'empty': '',
+    'only newlines': '\n\n\n',
+    'windows line endings': '# Note\r\n#wiki\r\n- item\r\nText\r\n',
+}
+
+
+@pytest.mark.parametrize('path', vault_notes())
+def test_vault_note(path):
+    with open(os.path.join(REPO_DIR, path), 'r', encoding='utf-8') as f:
+        content = f.read()
+    assert preprocess_content(content) == reference(content)
+
+
+@pytest.mark.parametrize('content', EDGE_CASES.values(), ids=EDGE_CASES.keys())
+def test_edge_case(content):
+    assert preprocess_content(content) == reference(content)
+
+
+@pytest.mark.parametrize('content', EDGE_CASES.values(), ids=EDGE_CASES.keys())
+def test_file_lines(content):
+    # process_dataview() streams the file instead of reading it whole
+    lines = preprocess_lines(iter_file_lines(io.StringIO(content, newline='')))
+    assert '\n'.join(lines) == reference(content)